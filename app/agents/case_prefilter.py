@@ -0,0 +1,148 @@
+# app/agents/case_prefilter.py
+
+import ipaddress
+import os
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+# Prefix lengths indexed per address family, most specific first, with the
+# structured score a shared prefix of that length is worth
+IPV4_LEVELS = ((32, 1.0), (24, 0.6), (16, 0.3))
+IPV6_LEVELS = ((128, 1.0), (64, 0.6), (48, 0.3))
+
+# Structured score = IP overlap and log-source match, weighted
+IP_MATCH_WEIGHT = float(os.getenv("MEMORY_IP_MATCH_WEIGHT", "0.7"))
+LOG_SOURCE_MATCH_WEIGHT = float(os.getenv("MEMORY_LOG_SOURCE_MATCH_WEIGHT", "0.3"))
+
+def _parse(value: str):
+    """IP or CIDR string -> network, or None for anything unparseable."""
+    try:
+        return ipaddress.ip_network(str(value).strip(), strict=False)
+    except ValueError:
+        return None
+
+def _prefixes(network) -> List[tuple]:
+    """(prefix key, score) for every indexed level no more specific than `network`."""
+    levels = IPV4_LEVELS if network.version == 4 else IPV6_LEVELS
+    keys = []
+    for length, score in levels:
+        if length <= network.prefixlen:
+            keys.append((f"{network.supernet(new_prefix=length)}", score))
+    return keys
+
+def _log_sources(entry: Dict) -> List[str]:
+    if entry.get("log_source"):
+        return [s.strip() for s in str(entry["log_source"]).split(",") if s.strip()]
+    return [str(s) for s in entry.get("log_sources") or []]
+
+class IPPrefixIndex:
+    """
+    Maps network prefixes (/32, /24, /16 for IPv4; /128, /64, /48 for IPv6)
+    to the cases holding an address or CIDR inside them. A lookup costs a
+    few dict probes per query IP, independent of corpus size.
+    """
+
+    def __init__(self):
+        self._cases = defaultdict(set)
+
+    def add(self, case_id: str, ips: Iterable[str]) -> None:
+        for value in ips:
+            network = _parse(value)
+            if network is not None:
+                for key, _ in _prefixes(network):
+                    self._cases[key].add(case_id)
+
+    def remove(self, case_id: str, ips: Iterable[str]) -> None:
+        for value in ips:
+            network = _parse(value)
+            if network is not None:
+                for key, _ in _prefixes(network):
+                    cases = self._cases.get(key)
+                    if cases is not None:
+                        cases.discard(case_id)
+                        if not cases:
+                            del self._cases[key]
+
+    def match(self, ips: Iterable[str]) -> Dict[str, float]:
+        """case id -> score of the most specific prefix shared with any of `ips`."""
+        scores = {}
+        for value in ips:
+            network = _parse(value)
+            if network is None:
+                continue
+            for key, score in _prefixes(network):
+                for case_id in self._cases.get(key, ()):
+                    if scores.get(case_id, 0.0) < score:
+                        scores[case_id] = score
+        return scores
+
+class CasePrefilter:
+    """
+    Structured indexes over the case store: an IP prefix index on source and
+    destination IPs plus inverted indexes on log source and tags. Used to
+    narrow the candidates for semantic scoring and to score structured
+    overlap for hybrid ranking.
+    """
+
+    def __init__(self):
+        self._ips = IPPrefixIndex()
+        self._log_sources = defaultdict(set)
+        self._tags = defaultdict(set)
+        # case id -> (ips, log sources, tags) it was indexed under, for replacement
+        self._ids: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, case_id: str, entry: Dict) -> None:
+        """Index a case; adding an id again replaces what it was indexed under."""
+        ips = list(entry.get("source_ips") or []) + list(entry.get("destination_ips") or [])
+        keys = (ips, _log_sources(entry), list(entry.get("tags") or []))
+        with self._lock:
+            previous = self._ids.get(case_id)
+            if previous == keys:
+                return
+            if previous is not None:
+                self._remove(case_id, *previous)
+            self._ids[case_id] = keys
+            self._ips.add(case_id, ips)
+            for source in keys[1]:
+                self._log_sources[source].add(case_id)
+            for tag in keys[2]:
+                self._tags[tag].add(case_id)
+
+    def _remove(self, case_id: str, ips: list, log_sources: list, tags: list) -> None:
+        self._ips.remove(case_id, ips)
+        for index, values in ((self._log_sources, log_sources), (self._tags, tags)):
+            for value in values:
+                index[value].discard(case_id)
+                if not index[value]:
+                    del index[value]
+
+    def match(self, offense: Dict) -> Dict[str, float]:
+        """case id -> structured score in [0, 1] for every case sharing an IP prefix or log source."""
+        with self._lock:
+            ip_scores = self._ips.match(list(offense.get("source_ips") or []) + list(offense.get("destination_ips") or []))
+            source_matches = set()
+            for source in _log_sources(offense):
+                source_matches |= self._log_sources.get(source, set())
+        return {
+            case_id: IP_MATCH_WEIGHT * ip_scores.get(case_id, 0.0)
+                     + LOG_SOURCE_MATCH_WEIGHT * (case_id in source_matches)
+            for case_id in set(ip_scores) | source_matches
+        }
+
+    def allowed(self, log_sources: Optional[List[str]] = None, tags: Optional[List[str]] = None) -> Optional[Set[str]]:
+        """Case ids passing the log-source/tag filters, or None when unfiltered."""
+        if not log_sources and not tags:
+            return None
+        with self._lock:
+            allowed = None
+            if log_sources:
+                allowed = set().union(*(self._log_sources.get(s, set()) for s in log_sources))
+            if tags:
+                tagged = set().union(*(self._tags.get(t, set()) for t in tags))
+                allowed = tagged if allowed is None else allowed & tagged
+        return allowed
@@ -1,57 +1,46 @@
 # app/agents/decision_agent.py
 
 import datetime
-import os
 
 from app.agents.model_router import generate_dynamic_prompt
+from app.utils.output_writer import get_writer
 
 FALSE_POSITIVE_LOG = "reports/false_positive_notes.txt"  # Updated path
 
-def save_false_positive_note(reasons: list, offense_id: str = "Unknown") -> None:
-    """
-    Save a note to a text file when an offense is marked as a false positive.
-    """
-    # Ensure the reports/ directory exists
-    os.makedirs(os.path.dirname(FALSE_POSITIVE_LOG), exist_ok=True)
-
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+def format_false_positive_note(reasons: list, offense_id: str = "Unknown", timestamp: str = None) -> str:
+    timestamp = timestamp or datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     note = f"[{timestamp}] Offense ID: {offense_id}\nReason(s):\n"
     for r in reasons:
         note += f"- {r}\n"
-    note += "\n"
+    return note + "\n"
 
-    with open(FALSE_POSITIVE_LOG, "a") as f:
-        f.write(note)
-
-def make_decision(reputation_results, similar_cases, offense_id: str = "Unknown") -> dict:
+def save_false_positive_note(reasons: list, offense_id: str = "Unknown"):
     """
-    Given reputation data and memory results, decide whether the offense
-    should be escalated or marked as false positive. Returns decision + reason.
+    Queue a note for the false-positive log when an offense is marked as a
+    false positive. Returns a Future that resolves once it is written.
     """
-    decision = "false_positive"
-    reasons = []
+    return get_writer().append(FALSE_POSITIVE_LOG, format_false_positive_note(reasons, offense_id))
 
-    # Rule 1: Any IOC with high malicious or abuse score
-    for r in reputation_results:
-        if r.get("malicious_votes", 0) > 1:
-            decision = "escalate"
-            reasons.append(f"Malicious score > 1 for {r.get('ioc', r.get('ip', 'unknown'))}")
-        if r.get("abuse_confidence", 0) > 50:
-            decision = "escalate"
-            reasons.append(f"AbuseIPDB confidence > 50 for {r.get('ip', 'unknown')}")
+# Reason recorded for a false positive when its LLM justification is skipped
+NO_INDICATORS_REASON = "No high-risk reputation or memory indicators found."
 
-    # Rule 2: Past cases tagged as critical behavior
-    if similar_cases:
-        tag_matches = [c for c in similar_cases if "Data Exfiltration" in c.get("tags", [])]
-        if tag_matches:
-            decision = "escalate"
-            reasons.append("Similar past cases tagged as Data Exfiltration")
+def decision_from_rules(result: dict) -> dict:
+    """
+    The rule-based decision (see config/triage_rules.json) out of a rule
+    engine result; no LLM call. A false positive comes back with empty
+    reasoning.
+    """
+    return {
+        "decision": result["decision"],
+        "reasoning": result["reasoning"],
+        "fired_rules": result["fired_rules"],
+    }
 
-    # Dynamic reasoning if no strong indicators found
-    if not reasons:
-        reputation_summary = "\n".join([str(r) for r in reputation_results]) or "None"
-        memory_summary = "\n".join([f"Offense ID: {c.get('offense_id', 'N/A')}, Tags: {c.get('tags', [])}" for c in similar_cases]) or "None"
-        prompt = f"""
+async def justify_false_positive(reputation_results, similar_cases) -> str:
+    """Ask the LLM for a short justification of a false-positive decision."""
+    reputation_summary = "\n".join([str(r) for r in reputation_results]) or "None"
+    memory_summary = "\n".join([f"Offense ID: {c.get('offense_id', 'N/A')}, Tags: {c.get('tags', [])}" for c in similar_cases]) or "None"
+    prompt = f"""
 You are a SOC analyst. Based on the following context, no immediate high-risk indicators were found.
 
 Reputation Results:
@@ -64,13 +53,4 @@ Write a brief 1–2 sentence justification explaining why this offense could be
 Frame your response as if you are an L1 SOC analyst reporting to an L2 analyst or client-side security manager. 
 Be clear, professional, and avoid assumptions beyond the provided data.
 """
-        response = generate_dynamic_prompt(prompt).strip()
-        reasons.append(response)
-
-    if decision == "false_positive":
-        save_false_positive_note(reasons, offense_id)
-
-    return {
-        "decision": decision,
-        "reasoning": reasons
-    }
+    return (await generate_dynamic_prompt(prompt, site="decision_justification")).strip()
@@ -0,0 +1,85 @@
+# app/agents/embedding_backends.py
+
+import os
+import re
+import zlib
+from typing import List
+
+import numpy as np
+
+# Backend selection: "sentence-transformers" (best recall, needs torch and a
+# model download) or "hashing" (pure NumPy, no model, tiny footprint)
+MEMORY_EMBEDDING_BACKEND = os.getenv("MEMORY_EMBEDDING_BACKEND", "sentence-transformers").lower()
+EMBEDDING_MODEL_NAME = os.getenv("MEMORY_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+HASHING_DIM = int(os.getenv("MEMORY_HASHING_DIM", "2048"))
+HASHING_NGRAMS = tuple(int(n) for n in os.getenv("MEMORY_HASHING_NGRAMS", "3,5").split(","))
+
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9_.:/-]*")
+
+class SentenceTransformerBackend:
+    """Dense embeddings from a sentence-transformers model (imports torch)."""
+
+    name = "sentence-transformers"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME):
+        self.model_name = model_name
+        self.key = model_name.replace("/", "_")
+        self._model = None
+
+    def load(self) -> None:
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(self.model_name)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        self.load()
+        return self._model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+
+class HashingBackend:
+    """
+    Signed feature hashing of word tokens and character n-grams, with
+    sublinear term frequency and L2 normalization. Stateless: no model, no
+    fitted vocabulary, so vectors for written-back cases stay comparable
+    with the seed corpus and across worker processes.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int = HASHING_DIM, ngrams: tuple = HASHING_NGRAMS):
+        self.dim = dim
+        self.min_n, self.max_n = min(ngrams), max(ngrams)
+        self.key = f"hashing-d{dim}-n{self.min_n}{self.max_n}"
+
+    def load(self) -> None:
+        pass
+
+    def _features(self, text: str) -> List[str]:
+        tokens = _TOKEN.findall(text.lower())
+        features = [f"w:{token}" for token in tokens]
+        for token in tokens:
+            padded = f" {token} "
+            for n in range(self.min_n, self.max_n + 1):
+                features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return features
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            # crc32 is stable across processes, unlike hash()
+            hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in self._features(text)), dtype=np.uint32)
+            if not len(hashes):
+                continue
+            signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+            np.add.at(vectors[row], hashes % self.dim, signs)
+        # Sublinear tf damps repeated tokens (e.g. many identical IPs)
+        vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+def create_backend(name: str = MEMORY_EMBEDDING_BACKEND):
+    """Build the configured embedding backend."""
+    if name == "hashing":
+        return HashingBackend()
+    if name not in ("sentence-transformers", "sentence_transformers"):
+        print(f"[EmbeddingBackends] Unknown backend '{name}', using sentence-transformers")
+    return SentenceTransformerBackend()
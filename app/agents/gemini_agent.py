@@ -1,16 +1,37 @@
 # app/agents/gemini_agent.py
+import asyncio
 import os
-import time
-import google.generativeai as genai
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
 
-# Rate limiting ONLY for Gemini free tier (15 requests per minute)
-last_request_time = 0
-min_request_interval = 4.1  # Slightly over 4 seconds to stay under 15/min
+from app.agents.llm_clients import LLM_TIMEOUT, get_gemini_model
+from app.utils import metrics
 
-def generate_response(prompt: str) -> str:
+MODEL_NAME = "gemini-1.5-flash"
+GENERATION_CONFIG = {
+    "temperature": 0.5,
+    "top_p": 0.9,
+    "top_k": 40,
+    "max_output_tokens": 300,
+}
+# Cybersecurity-optimized safety settings
+SAFETY_SETTINGS = {
+    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_ONLY_HIGH,
+}
+
+def get_model():
+    """Return the shared Gemini model, or None if no API key is configured."""
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        return None
+    return get_gemini_model(api_key, MODEL_NAME, GENERATION_CONFIG, SAFETY_SETTINGS)
+
+async def generate_response(prompt: str) -> str:
     """
-    Generates a response from Google's Gemini model with rate limiting for free tier.
+    Generates a response from Google's Gemini model.
+    Free-tier rate limiting is enforced by the model router's rate limiter.
     
     Args:
         prompt (str): The input prompt for the model.
@@ -18,43 +39,24 @@ def generate_response(prompt: str) -> str:
     Returns:
         str: The generated response or an error message if the query fails.
     """
-    global last_request_time
-    
     try:
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
             return "Error: GEMINI_API_KEY not found in environment variables"
         
-        # Rate limiting ONLY for Gemini (free tier constraint)
-        current_time = time.time()
-        time_since_last = current_time - last_request_time
-        if time_since_last < min_request_interval:
-            sleep_time = min_request_interval - time_since_last
-            print(f"[Gemini] Rate limiting: sleeping for {sleep_time:.1f}s")
-            time.sleep(sleep_time)
+        # Reuse the shared model (and its transport) for this key and config
+        model = get_gemini_model(api_key, MODEL_NAME, GENERATION_CONFIG, SAFETY_SETTINGS)
         
-        genai.configure(api_key=api_key)
-        
-        # Use current Gemini model
-        model = genai.GenerativeModel(
-            model_name="gemini-1.5-flash",
-            generation_config={
-                "temperature": 0.5,
-                "top_p": 0.9,
-                "top_k": 40,
-                "max_output_tokens": 300,
-            },
-            # Cybersecurity-optimized safety settings
-            safety_settings={
-                HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-                HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-                HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-                HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_ONLY_HIGH,
-            }
+        # The gRPC deadline bounds each attempt; wait_for bounds the whole call
+        # (SDK retries included), so an unreachable API cannot hang an offense
+        response = await asyncio.wait_for(
+            model.generate_content_async(prompt, request_options={"timeout": LLM_TIMEOUT}),
+            timeout=LLM_TIMEOUT,
         )
-        
-        last_request_time = time.time()
-        response = model.generate_content(prompt)
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            metrics.LLM_TOKENS.inc(usage.prompt_token_count or 0, provider="gemini", kind="prompt")
+            metrics.LLM_TOKENS.inc(usage.candidates_token_count or 0, provider="gemini", kind="completion")
         
         # Check if response was blocked by safety filters
         if hasattr(response, 'candidates') and response.candidates:
@@ -68,6 +70,9 @@ def generate_response(prompt: str) -> str:
             
         return response.text.strip()
         
+    except asyncio.TimeoutError:
+        print(f"[Gemini] Request timed out after {LLM_TIMEOUT}s")
+        return f"Error: Gemini request timed out after {LLM_TIMEOUT:g}s"
     except Exception as e:
         error_msg = str(e).lower()
         if "quota" in error_msg or "rate" in error_msg:
@@ -2,6 +2,7 @@
 
 import os
 from app.agents.model_router import generate_dynamic_prompt, get_current_provider
+from app.utils.output_writer import TEXT_EXPORT, get_writer
 
 REPORTS_DIR = "reports"
 os.makedirs(REPORTS_DIR, exist_ok=True)
@@ -25,7 +26,7 @@ def select_main_event(events, offense_type):
     
     return events[0]
 
-def generate_analysis_summary(offense, reputation_results):
+async def generate_analysis_summary(offense, reputation_results):
     """
     Generate AI-powered analysis summary.
     Works with both OpenAI and Gemini through the model router.
@@ -50,7 +51,7 @@ Provide a 2-3 sentence analysis of the security implications and risk level.
     try:
         current_provider = get_current_provider()
         print(f"[IncidentReporter] Generating analysis summary using {current_provider}")
-        response = generate_dynamic_prompt(prompt)
+        response = await generate_dynamic_prompt(prompt, site="report_summary")
         
         if response.startswith("Error:"):
             return f"AI analysis failed ({current_provider}): {response}"
@@ -60,7 +61,7 @@ Provide a 2-3 sentence analysis of the security implications and risk level.
         print(f"[IncidentReporter] Error generating analysis summary: {e}")
         return f"Analysis generation failed: {str(e)}"
 
-def generate_recommendations(offense, analysis_summary, reputation_results):
+async def generate_recommendations(offense, analysis_summary, reputation_results):
     """
     Generate AI-powered security recommendations.
     Works with both OpenAI and Gemini through the model router.
@@ -98,7 +99,7 @@ Focus on immediate actions, containment, investigation steps, and prevention.
     try:
         current_provider = get_current_provider()
         print(f"[IncidentReporter] Generating recommendations using {current_provider}")
-        response = generate_dynamic_prompt(prompt)
+        response = await generate_dynamic_prompt(prompt, cache=True, site="report_recommendations")
         
         if response.startswith("Error:"):
             print(f"[IncidentReporter] AI recommendations failed: {response}")
@@ -137,7 +138,7 @@ Focus on immediate actions, containment, investigation steps, and prevention.
             "Document incident details for future reference"
         ]
 
-def generate_incident_report(offense_id, offense, analysis):
+async def generate_incident_report(offense_id, offense, analysis):
     """
     Generates a comprehensive incident report for the given offense.
     Works seamlessly with both OpenAI and Gemini providers.
@@ -165,10 +166,10 @@ def generate_incident_report(offense_id, offense, analysis):
         # Generate AI analysis if not present or use existing summary
         summary = analysis.get("summary")
         if not summary or summary == "No summary" or summary.startswith("Analysis failed"):
-            summary = generate_analysis_summary(offense, ip_reputation)
+            summary = await generate_analysis_summary(offense, ip_reputation)
         
         # Generate recommendations using AI
-        recommendations = generate_recommendations(offense, summary, ip_reputation)
+        recommendations = await generate_recommendations(offense, summary, ip_reputation)
 
         # Select and format main event
         main_event = select_main_event(events, offense_type)
@@ -245,8 +246,10 @@ Risk Assessment: {analysis.get('risk_assessment', 'Not assessed')}
 AI Provider Used: {current_provider.upper()}
 """
 
-        with open(report_path, "w") as f:
-            f.write(content.strip())
+        if TEXT_EXPORT:
+            get_writer().write_file(report_path, content.strip())
+        else:
+            report_path = None
 
         print(f"[IncidentReporter] Successfully generated incident report using {current_provider}")
         return report_path, content.strip()
@@ -0,0 +1,170 @@
+# app/agents/llm_clients.py
+
+import asyncio
+import hashlib
+import os
+import threading
+
+import httpx
+import google.generativeai as genai
+from openai import AsyncOpenAI
+
+# Connection pool configuration for LLM providers
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "16"))
+# Optional gRPC endpoint override for Gemini (e.g. a local stand-in)
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+
+_lock = threading.Lock()
+# OpenAI clients per event loop, since httpx pools are bound to the loop
+# that created them: {loop: {key: (client, transport)}}
+_openai_clients = {}
+_closing = set()
+_gemini_models = {}
+# Fingerprint of the key genai.configure() was last called with
+_gemini_configured_key = None
+_stats = {"builds": 0, "reuses": 0}
+
+def _fingerprint(*parts) -> str:
+    """Stable registry key that never keeps raw API keys in memory as dict keys."""
+    return hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()[:16]
+
+async def _close_quietly(client: AsyncOpenAI) -> None:
+    try:
+        await client.close()
+    except Exception as e:
+        print(f"[LLMClients] Failed to close OpenAI client: {e}")
+
+def _loop_clients() -> dict:
+    """
+    OpenAI clients of the running loop. Clients of loops that have since
+    closed are closed on this one instead of being dropped with open
+    connections.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    clients = _openai_clients.get(loop)
+    if clients is None:
+        if loop is not None:
+            for stale in [other for other in _openai_clients if other is not None and other.is_closed()]:
+                for client, _ in _openai_clients.pop(stale).values():
+                    task = loop.create_task(_close_quietly(client))
+                    _closing.add(task)
+                    task.add_done_callback(_closing.discard)
+        clients = _openai_clients[loop] = {}
+    return clients
+
+class _CountingTransport(httpx.AsyncBaseTransport):
+    """Wraps the pooled transport to count requests, in-flight calls and errors."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.errors = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            return await self.transport.handle_async_request(request)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "errors": self.errors,
+            "max_connections": LLM_MAX_CONNECTIONS,
+        }
+
+def get_openai_client(api_key: str, base_url: str = None) -> AsyncOpenAI:
+    """
+    Return the shared AsyncOpenAI client for this key/base URL, building it
+    with a bounded keep-alive pool on first use.
+    """
+    key = _fingerprint("openai", api_key, base_url)
+    with _lock:
+        clients = _loop_clients()
+        entry = clients.get(key)
+        if entry is not None:
+            _stats["reuses"] += 1
+            return entry[0]
+        transport = _CountingTransport(httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE,
+            ),
+        ))
+        http_client = httpx.AsyncClient(timeout=httpx.Timeout(LLM_TIMEOUT), transport=transport)
+        client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+        clients[key] = (client, transport)
+        _stats["builds"] += 1
+        print("[LLMClients] Built OpenAI client")
+        return client
+
+def get_gemini_model(api_key: str, model_name: str, generation_config: dict, safety_settings: dict):
+    """
+    Return the shared GenerativeModel for this model/config. The SDK's
+    configure() is process-global and every model uses the key it was last
+    given, so only one Gemini key is supported per process: a different
+    key reconfigures the SDK and rebuilds the models.
+    """
+    global _gemini_configured_key
+    key = _fingerprint("gemini", model_name, sorted(generation_config.items()),
+                       sorted((str(k), str(v)) for k, v in safety_settings.items()))
+    with _lock:
+        key_hash = _fingerprint(api_key)
+        if _gemini_configured_key != key_hash:
+            if _gemini_configured_key is not None:
+                print("[LLMClients] Gemini API key changed; reconfiguring (one key per process)")
+            client_options = {"api_endpoint": GEMINI_API_ENDPOINT} if GEMINI_API_ENDPOINT else None
+            genai.configure(api_key=api_key, client_options=client_options)
+            _gemini_configured_key = key_hash
+            _gemini_models.clear()
+        model = _gemini_models.get(key)
+        if model is not None:
+            _stats["reuses"] += 1
+            return model
+        model = genai.GenerativeModel(
+            model_name=model_name,
+            generation_config=generation_config,
+            safety_settings=safety_settings,
+        )
+        _gemini_models[key] = model
+        _stats["builds"] += 1
+        print(f"[LLMClients] Built Gemini model {model_name}")
+        return model
+
+def get_client_stats() -> dict:
+    """Registry and connection pool statistics for monitoring."""
+    with _lock:
+        return {
+            "builds": _stats["builds"],
+            "reuses": _stats["reuses"],
+            "openai_clients": [transport.stats() for clients in _openai_clients.values()
+                               for _, transport in clients.values()],
+            "gemini_models": len(_gemini_models),
+        }
+
+async def close_clients() -> None:
+    """Close pooled HTTP connections (used on application shutdown)."""
+    with _lock:
+        clients = [client for loop_clients in _openai_clients.values() for client, _ in loop_clients.values()]
+        _openai_clients.clear()
+        _gemini_models.clear()
+    for client in clients:
+        await _close_quietly(client)
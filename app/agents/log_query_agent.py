@@ -1,8 +1,12 @@
 # app/agents/log_query_agent.py
 
 from app.agents.model_router import generate_dynamic_prompt, get_current_provider
+from app.utils.event_columns import describe_event_features
 
-def generate_log_instructions(offense_data: dict) -> str:
+# First line of the instructions returned when the AI provider fails
+FALLBACK_HEADER = "MANUAL LOG INVESTIGATION STEPS (AI generation failed):"
+
+async def generate_log_instructions(offense_data: dict) -> str:
     """
     Generate log investigation instructions using the configured AI provider.
     Works seamlessly with both OpenAI and Gemini through the model router.
@@ -24,8 +28,11 @@ def generate_log_instructions(offense_data: dict) -> str:
     
     # Create events context
     events = offense_data.get('events', [])
-    event_types = list(set([e.get('event_type', 'Unknown') for e in events[:5]]))
-    protocols = list(set([e.get('protocol', 'Unknown') for e in events[:5]]))
+    # First-seen order (not set order) keeps the prompt identical across
+    # processes, so prompt-cache and cassette keys match
+    event_types = list(dict.fromkeys(e.get('event_type', 'Unknown') for e in events[:5]))
+    protocols = list(dict.fromkeys(e.get('protocol', 'Unknown') for e in events[:5]))
+    event_profile = describe_event_features(offense_data.get('event_features')) or 'N/A'
     
     prompt = f"""
 You are a Level 1 SOC Analyst using QRadar or a similar SIEM. Based on the offense below, write 6–8 specific log investigation actions that you personally perform to gather evidence and validate the incident.
@@ -43,6 +50,7 @@ OFFENSE DETAILS:
 - Log Sources: {', '.join(log_sources)}
 - Event Types: {', '.join(event_types)}
 - Protocols: {', '.join(protocols)}
+- Event Profile: {event_profile}
 
 Provide 6-8 specific, actionable log investigation steps in bullet point format. Include:
 1. Specific log sources to check
@@ -58,7 +66,7 @@ Format as clear bullet points starting with action verbs (e.g., "Check", "Search
         current_provider = get_current_provider()
         print(f"[LogQueryAgent] Generating log instructions using {current_provider}")
         
-        response = generate_dynamic_prompt(prompt)
+        response = await generate_dynamic_prompt(prompt, cache=True, site="log_instructions")
         
         # Validate response
         if response.startswith("Error:"):
@@ -82,7 +90,7 @@ def generate_fallback_instructions(offense_data: dict) -> str:
     offense_type = offense_data.get('offense_type', 'Unknown')
     
     instructions = f"""
-MANUAL LOG INVESTIGATION STEPS (AI generation failed):
+{FALLBACK_HEADER}
 
 • Check firewall logs for connections from source IPs: {', '.join(map(str, source_ips))}
 • Search proxy/web logs for HTTP/HTTPS traffic to destination IPs: {', '.join(map(str, dest_ips))}
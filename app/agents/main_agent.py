@@ -1,13 +1,87 @@
 # app/agents/main_agent.py
 
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import time
 import uuid
-from app.agents.offense_analyzer import enrich_offense as analyze_offense
-from app.agents.memory_agent import find_similar_cases
-from app.agents.decision_agent import make_decision
+from app.agents.offense_analyzer import format_risk_level, generate_offense_summary
+from app.agents.log_query_agent import FALLBACK_HEADER, generate_log_instructions
+from app.agents.memory_agent import MEMORY_WRITE_BACK, find_similar_cases, remember_case
+from app.agents.decision_agent import (NO_INDICATORS_REASON, decision_from_rules, justify_false_positive,
+                                      save_false_positive_note)
 from app.agents.incident_reporter import generate_incident_report
-from app.agents.model_router import generate_dynamic_prompt
+from app.agents.model_router import generate_dynamic_prompt, get_current_provider
+from app.agents.pipeline import Stage, run_stages
+from app.agents.rule_engine import get_engine
+from app.utils import metrics
+from app.utils.event_columns import EVENT_CHUNK_SIZE, compute_event_features
+from app.utils.executor import run_cpu_bound
+from app.utils.log_writer import save_log_instructions
+from app.utils.output_writer import TEXT_EXPORT
+from app.utils.result_store import RESULT_STORE_ENABLED, get_store as get_result_store
+from app.utils.reputation import get_reputations
+from app.utils.single_flight import SingleFlight
 
-def infer_offense_type(offense: dict) -> str:
+# Coalesce duplicate offenses (same offense_id or same content) that arrive
+# while one copy is running or within OFFENSE_RESULT_TTL seconds after it
+OFFENSE_COALESCING = os.getenv("OFFENSE_COALESCING", "true").lower() == "true"
+OFFENSE_RESULT_TTL = float(os.getenv("OFFENSE_RESULT_TTL", "30"))
+OFFENSE_RESULT_CACHE_SIZE = int(os.getenv("OFFENSE_RESULT_CACHE_SIZE", "1000"))
+
+# Generation stages run after triage, only for the decisions their policy
+# names: "always", "never", "escalate" or "false_positive"
+DEFAULT_STAGE_POLICY = {
+    "offense_type": "escalate",
+    "summary": "escalate",
+    "log_instructions": "escalate",
+    "decision_justification": "false_positive",
+}
+STAGE_POLICY_VALUES = ("always", "never", "escalate", "false_positive")
+
+def parse_stage_policy(text: str) -> dict:
+    """'summary=always,log_instructions=never' on top of DEFAULT_STAGE_POLICY."""
+    policy = dict(DEFAULT_STAGE_POLICY)
+    for item in filter(None, (text or "").split(",")):
+        name, _, value = item.partition("=")
+        name, value = name.strip(), value.strip().lower()
+        if name not in DEFAULT_STAGE_POLICY or value not in STAGE_POLICY_VALUES:
+            print(f"[NuVex] Ignoring invalid stage policy '{item}'")
+            continue
+        policy[name] = value
+    return policy
+
+STAGE_POLICY = parse_stage_policy(os.getenv("PIPELINE_STAGE_POLICY", ""))
+
+def stage_wanted(name: str, decision: str, policy: dict = None) -> bool:
+    rule = (policy or STAGE_POLICY).get(name, "always")
+    return rule == "always" or rule == decision
+
+offense_flight = SingleFlight(ttl=OFFENSE_RESULT_TTL, max_results=OFFENSE_RESULT_CACHE_SIZE)
+
+def offense_fingerprint(offense: dict) -> str:
+    """Content key for an offense: description, IPs, log sources and event types (order-insensitive)."""
+    log_sources = offense.get("log_sources") or [offense.get("log_source", "")]
+    if isinstance(log_sources, str):
+        log_sources = [log_sources]
+    # Streamed offenses carry a random event sample; their aggregates are stable
+    aggregates = offense.get("event_aggregates")
+    if aggregates:
+        event_types = {str(event_type) for event_type, _ in aggregates.get("event_types", [])}
+    else:
+        event_types = {str(e.get("event_type", "")) for e in offense.get("events") or []}
+    payload = json.dumps([
+        (offense.get("description") or "").strip().lower(),
+        sorted(set(map(str, offense.get("source_ips") or []))),
+        sorted(set(map(str, offense.get("destination_ips") or []))),
+        sorted(set(map(str, log_sources))),
+        sorted(event_types),
+    ])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+async def infer_offense_type(offense: dict) -> str:
     prompt = f"""You are a SOC Analyst AI. Based on the following offense description and sample events, infer the offense type.
 
 Offense Description:
@@ -17,43 +91,208 @@ Events:
 {[e.get("event_type", "") for e in offense.get("events", [])]}
 
 Respond with only the offense type in 3-5 words. No explanation."""
-    return generate_dynamic_prompt(prompt).strip()
+    return (await generate_dynamic_prompt(prompt, cache=True, site="offense_type")).strip()
+
+def build_offense_stages(offense: dict, policy: dict = None) -> list:
+    """
+    Describe the offense pipeline as a stage graph in two phases. Triage
+    (reputation, memory search, event features, then one rule evaluation
+    giving the risk score and the decision) never calls an LLM. Generation stages (offense type, summary, log
+    instructions, false-positive justification) wait for the decision and
+    run only if the stage policy wants them for it. The decided offense is
+    then written back to memory as a new case.
+    """
+    offense_id = offense["offense_id"]
+    policy = policy or STAGE_POLICY
+
+    def when(name):
+        return lambda results: stage_wanted(name, results["decision"]["decision"], policy)
+
+    async def reputation():
+        results = await get_reputations(offense.get("source_ips", []))
+        print(f"[NuVex] Got reputation for {len(results)} IPs")
+        return results
+
+    async def similar_cases():
+        return await find_similar_cases(offense)
+
+    async def event_features():
+        # Streamed offenses bring features computed over every event
+        if offense.get("event_features") is None:
+            events = offense.get("events") or []
+            if len(events) > EVENT_CHUNK_SIZE:
+                offense["event_features"] = await run_cpu_bound(compute_event_features, events)
+            else:
+                offense["event_features"] = compute_event_features(events)
+        return offense["event_features"]
+
+    async def triage(reputation, similar_cases, event_features):
+        # One rule evaluation, so risk and decision always come from the same
+        # rules even if they are reloaded mid-offense
+        return get_engine().evaluate(offense, reputation, similar_cases)
+
+    async def risk_assessment(triage):
+        return format_risk_level(triage)
+
+    async def decision(triage):
+        return decision_from_rules(triage)
+
+    async def offense_type(decision):
+        if not offense.get("offense_type"):
+            offense["offense_type"] = await infer_offense_type(offense)
+            print(f"[NuVex] 🏷️ Inferred offense type: {offense['offense_type']}")
+        return offense["offense_type"]
+
+    async def summary(reputation, offense_type):
+        # A failed generation is reported on the analysis, not raised
+        try:
+            return await generate_offense_summary(offense, reputation)
+        except Exception as e:
+            print(f"[NuVex] Summary failed for {offense_id}: {e}")
+            return f"Error: {e}"
+
+    async def log_instructions(offense_type):
+        try:
+            instructions = await generate_log_instructions(offense)
+        except Exception as e:
+            print(f"[NuVex] Log instructions failed for {offense_id}: {e}")
+            return f"Error: {e}"
+        if TEXT_EXPORT:
+            path = save_log_instructions(offense_id, instructions)
+            print(f"[NuVex] Queued log instructions for {offense_id} at {path}")
+        return instructions
+
+    async def decision_justification(decision, reputation, similar_cases):
+        if decision["reasoning"]:
+            return None
+        return await justify_false_positive(reputation, similar_cases)
+
+    async def memory_write(decision, offense_type):
+        # Make this decided offense searchable for future similar-case lookups
+        if not MEMORY_WRITE_BACK:
+            return None
+        offense_type = offense_type or offense.get("offense_type")
+        tags = list(offense.get("tags") or []) + ([offense_type] if offense_type else [])
+        try:
+            return await remember_case(offense, decision["decision"], tags)
+        except Exception as e:
+            print(f"[NuVex] Failed to write offense {offense_id} back to memory: {e}")
+            return None
+
+    return [
+        # Triage
+        Stage("reputation", reputation),
+        Stage("similar_cases", similar_cases),
+        Stage("event_features", event_features),
+        Stage("triage", triage, inputs=("reputation", "similar_cases", "event_features")),
+        Stage("risk_assessment", risk_assessment, inputs=("triage",)),
+        Stage("decision", decision, inputs=("triage",)),
+        # Generation
+        Stage("offense_type", offense_type, inputs=("decision",), when=when("offense_type")),
+        Stage("summary", summary, inputs=("reputation", "offense_type"), when=when("summary")),
+        Stage("log_instructions", log_instructions, inputs=("offense_type",), when=when("log_instructions")),
+        Stage("decision_justification", decision_justification, inputs=("decision", "reputation", "similar_cases"),
+              when=when("decision_justification")),
+        Stage("memory_write", memory_write, inputs=("decision", "offense_type")),
+    ]
 
 async def handle_offense(offense: dict) -> dict:
     """
     Main NuVex Agent handler for incoming offenses.
     Handles analysis, memory recall, decision-making, and escalation simulation.
+    Duplicates of an offense that is running or just finished share its result.
     """
     # Assign or generate a unique offense ID
     offense_id = offense.get("offense_id") or str(uuid.uuid4())
-    print(f"\n[NuVex] 🧠 Handling Offense ID: {offense_id}")
     offense["offense_id"] = offense_id
+    if not OFFENSE_COALESCING:
+        return await _analyze_offense(offense)
+
+    keys = [f"id:{offense_id}", f"content:{offense_fingerprint(offense)}"]
+    role, owner, analysis = await offense_flight.do(keys, str(offense_id), lambda: _analyze_offense(offense))
+    if role == "leader":
+        return analysis
 
-    # STEP 1: Analyze the offense (log pattern, behavior, reputation, etc.)
-    analysis = analyze_offense(offense)
+    via = "in_flight" if role == "joined" else "result_cache"
+    print(f"[NuVex] ♻️ Offense {offense_id} coalesced with {owner} ({via})")
+    metrics.OFFENSES_COALESCED.inc(via=via)
+    # Each caller gets its own copy; the shared result stays untouched
+    analysis = copy.deepcopy(analysis)
+    if owner != str(offense_id):
+        analysis["offense_id"] = offense_id
+        analysis["duplicate_of"] = owner
+        # Record the duplicate under its own ID, pointing at the owner's result
+        if RESULT_STORE_ENABLED:
+            try:
+                await asyncio.to_thread(get_result_store().save, analysis)
+            except Exception as e:
+                print(f"[NuVex] Failed to store duplicate {offense_id} of {owner}: {e}")
+    return analysis
 
-    # STEP 1.5: Dynamically infer offense type if not provided
-    if not offense.get("offense_type"):
-        offense["offense_type"] = infer_offense_type(offense)
-        print(f"[NuVex] 🏷️ Inferred offense type: {offense['offense_type']}")
+def enrichment_errors(results: dict) -> dict:
+    """Generation stages that ran but failed or fell back, by name -> reason."""
+    errors = {}
+    summary = results.get("summary")
+    if isinstance(summary, str) and summary.startswith(("Error:", "Analysis failed:")):
+        errors["summary"] = summary
+    instructions = results.get("log_instructions")
+    if isinstance(instructions, str):
+        if instructions.startswith("Error:"):
+            errors["log_instructions"] = instructions
+        elif FALLBACK_HEADER in instructions:
+            errors["log_instructions"] = "AI generation failed, fallback instructions used"
+    return errors
 
-    # STEP 2: Retrieve similar past offenses from memory
-    similar_cases = find_similar_cases(offense)
-    analysis["similar_cases"] = similar_cases
+async def _analyze_offense(offense: dict) -> dict:
+    offense_id = offense["offense_id"]
+    print(f"\n[NuVex] 🧠 Handling Offense ID: {offense_id}")
+    started = time.perf_counter()
 
-    # STEP 3: Decision engine — escalate or mark false positive
-    decision = make_decision(
-        reputation_results=analysis.get("reputation", []),
-        similar_cases=similar_cases,
-        offense_id=offense_id
-    )
+    # STEPS 1-3: Triage, then the generation stages the decision calls for
+    results = await run_stages(build_offense_stages(offense))
+    print(f"[NuVex] Stage timings for {offense_id}: {results['_timings']} (skipped: {results['_skipped']})")
+
+    decision = dict(results["decision"], reasoning=list(results["decision"]["reasoning"]))
+    if results["decision_justification"]:
+        decision["reasoning"].append(results["decision_justification"])
+    elif not decision["reasoning"]:
+        decision["reasoning"].append(NO_INDICATORS_REASON)
+
+    errors = enrichment_errors(results)
+    analysis = offense.copy()
+    analysis.update({
+        "reputation": results["reputation"],
+        "summary": results["summary"],
+        "risk_assessment": results["risk_assessment"],
+        "log_instructions": results["log_instructions"],
+        "enrichment_status": "failed" if errors else "success",
+        "ai_provider_used": get_current_provider(),
+        "similar_cases": results["similar_cases"],
+        "skipped_stages": results["_skipped"],
+    })
+    if errors:
+        analysis["enrichment_error"] = "; ".join(f"{name}: {error}" for name, error in errors.items())
     analysis.update(decision)
 
     # STEP 4: If escalation is needed, generate full SOC report
-    if decision["decision"] == "escalate":
-        report_path, report_content = generate_incident_report(offense_id, offense, analysis)
+    report_content = None
+    if analysis["decision"] == "escalate":
+        with metrics.STAGE_SECONDS.time(stage="incident_report"):
+            report_path, report_content = await generate_incident_report(offense_id, offense, analysis)
         print("\n=== 🚨 Incident Report ===")
         print(report_content)
-        print(f"[NuVex] ✅ Incident report saved at: {report_path}")
+        if report_path:
+            print(f"[NuVex] ✅ Incident report queued for {report_path}")
+    elif TEXT_EXPORT:
+        save_false_positive_note(decision["reasoning"], offense_id)
+
+    # STEP 5: Keep the structured result queryable
+    if RESULT_STORE_ENABLED:
+        try:
+            await asyncio.to_thread(get_result_store().save, analysis, report_content)
+        except Exception as e:
+            print(f"[NuVex] Failed to store result for {offense_id}: {e}")
 
+    metrics.OFFENSE_SECONDS.observe(time.perf_counter() - started)
+    metrics.OFFENSES.inc(decision=analysis["decision"])
     return analysis
@@ -1,39 +1,493 @@
 # app/agents/memory_agent.py
+import datetime
+import fcntl
+import hashlib
 import json
 import os
-from typing import List, Dict
-from sentence_transformers import SentenceTransformer, util
+import threading
+import time
+from typing import List, Dict, Optional
 
-# Load model once
-model = SentenceTransformer('all-MiniLM-L6-v2')
+import numpy as np
+
+from app.agents.case_prefilter import CasePrefilter
+from app.agents.embedding_backends import create_backend
+from app.agents.memory_index import (MEMORY_ANN_THRESHOLD, MEMORY_INDEX_BACKEND, MEMORY_INDEX_COLLECTION,
+                                     case_metadata, create_index)
+from app.utils.embedding_batcher import EmbeddingBatcher
+from app.utils import metrics
+from app.utils.executor import run_cpu_bound
+
+# Embedding backend is loaded lazily (or by the background warm-up), never at import
+EMBEDDING_CACHE_DIR = os.getenv("MEMORY_EMBEDDING_CACHE_DIR", "cache/embeddings")
 
 # Load memory base JSON
 MEMORY_PATH = os.path.join(os.path.dirname(__file__), '../../dummy_data/memory_base.json')
 with open(MEMORY_PATH, 'r') as f:
     memory_data = json.load(f)
 
+# Decided offenses written back as new cases (append-only JSON lines)
+MEMORY_APPEND_PATH = os.getenv("MEMORY_APPEND_PATH", "cache/memory_cases.jsonl")
+MEMORY_WRITE_BACK = os.getenv("MEMORY_WRITE_BACK", "true").lower() == "true"
+
+# Hybrid retrieval: structured IP/log-source matches narrow the candidates once
+# there are enough of them, and final ranking blends both scores
+MEMORY_PREFILTER = os.getenv("MEMORY_PREFILTER", "true").lower() == "true"
+MEMORY_PREFILTER_MIN_CANDIDATES = int(os.getenv("MEMORY_PREFILTER_MIN_CANDIDATES", "50"))
+MEMORY_PREFILTER_MAX_CANDIDATES = int(os.getenv("MEMORY_PREFILTER_MAX_CANDIDATES", "2000"))
+MEMORY_HYBRID_WEIGHT = float(os.getenv("MEMORY_HYBRID_WEIGHT", "0.3"))
+SEMANTIC_OVERFETCH = 4
+
 # Preprocess and embed memory cases once
 def preprocess_entry(entry):
     return f"{entry['description']} Source: {', '.join(entry['source_ips'])} | Dest: {', '.join(entry['destination_ips'])} | LogSource: {entry['log_source']} | Tags: {', '.join(entry.get('tags', []))}"
 
-corpus_sentences = [preprocess_entry(entry) for entry in memory_data]
-corpus_embeddings = model.encode(corpus_sentences, convert_to_tensor=True)
+def case_id(entry: Dict) -> str:
+    """
+    Written-back cases are keyed by offense_id, so a re-fired offense
+    replaces its case instead of adding a duplicate. Seed cases have no
+    offense_id and get a content-derived ID, so a persistent index
+    recognises cases it already holds.
+    """
+    if entry.get("offense_id"):
+        return f"offense-{entry['offense_id']}"
+    return hashlib.sha1(json.dumps(entry, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+embedding_backend = create_backend()
+_model_lock = threading.Lock()
+_model_status = {"state": "cold", "error": None, "load_seconds": None}
+
+def get_model():
+    """Load the embedding backend on first use; later calls return it immediately."""
+    if _model_status["state"] == "ready":
+        return embedding_backend
+    with _model_lock:
+        if _model_status["state"] != "ready":
+            _model_status["state"] = "loading"
+            started = time.perf_counter()
+            try:
+                embedding_backend.load()
+            except Exception as e:
+                _model_status.update(state="failed", error=str(e))
+                raise
+            _model_status.update(state="ready", error=None, load_seconds=round(time.perf_counter() - started, 2))
+            print(f"[MemoryAgent] Loaded {embedding_backend.key} in {_model_status['load_seconds']}s")
+    return embedding_backend
+
+def encode_texts(texts: List[str]):
+    """Normalized embeddings so cosine similarity is a dot product."""
+    return get_model().encode(texts)
+
+# Query embeddings: concurrent lookups share one forward pass, repeats hit an LRU
+query_embedder = EmbeddingBatcher(lambda texts: encode_texts(texts))
+
+def load_corpus_embeddings(texts: List[str]) -> np.ndarray:
+    """
+    Embeddings for the seed corpus, persisted under a key derived from the
+    embedding backend and the corpus text. A matching file is memory-mapped
+    instead of re-encoding (and without loading the model at all).
+    """
+    digest = hashlib.sha256("\n".join([embedding_backend.key] + texts).encode("utf-8")).hexdigest()[:24]
+    path = os.path.join(EMBEDDING_CACHE_DIR, f"{embedding_backend.key}-{digest}.npy")
+    if os.path.exists(path):
+        try:
+            embeddings = np.load(path, mmap_mode="r")
+            if embeddings.shape[0] == len(texts):
+                return embeddings
+        except (OSError, ValueError) as e:
+            print(f"[MemoryAgent] Ignoring unreadable embedding cache {path}: {e}")
+
+    embeddings = np.asarray(encode_texts(texts), dtype=np.float32)
+    os.makedirs(EMBEDDING_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, embeddings)
+    os.replace(tmp_path, path)
+    return embeddings
+
+def index_cases(entries: List[Dict], embeddings: Optional[np.ndarray] = None, index=None,
+                offsets: Optional[List[int]] = None) -> int:
+    """
+    Upsert cases into the memory index. The last entry for an ID wins; only
+    cases the index does not hold, or whose embedded text or filter
+    metadata changed, are embedded. `embeddings`, if given, holds one
+    precomputed row per entry. `offsets` are the entries' positions in the
+    store: an entry older than the one already indexed for its ID is
+    ignored, whichever thread gets there first. Returns the number of
+    cases embedded.
+    """
+    with _apply_lock:
+        if index is None:
+            index = memory_index
+        rows = {}
+        for row, entry in enumerate(entries):
+            i = case_id(entry)
+            if offsets is not None and offsets[row] < _case_offsets.get(i, -1):
+                continue
+            rows[i] = row
+        missing = index.missing(list(rows))
+        changed = [
+            i for i, row in rows.items()
+            if i in memory_cases and i not in missing and (
+                preprocess_entry(memory_cases[i]) != preprocess_entry(entries[row])
+                or case_metadata(memory_cases[i]) != case_metadata(entries[row]))
+        ]
+        embed = missing + changed
+        if embed:
+            if embeddings is not None:
+                picked = [rows[i] for i in embed]
+                # Every row, in order: hand the (possibly memory-mapped) array
+                # through; indexing with a list would copy it into RAM
+                vectors = embeddings if picked == list(range(len(embeddings))) else embeddings[picked]
+            else:
+                vectors = encode_texts([preprocess_entry(entries[rows[i]]) for i in embed])
+            index.upsert(embed, vectors, [case_metadata(entries[rows[i]]) for i in embed])
+        memory_cases.update({i: entries[row] for i, row in rows.items()})
+        for i, row in rows.items():
+            case_prefilter.add(i, entries[row])
+        if offsets is not None:
+            _case_offsets.update({i: offsets[row] for i, row in rows.items()})
+    return len(embed)
+
+def build_case(offense: Dict, decision: str, tags: Optional[List[str]] = None) -> Dict:
+    """Turn a decided offense into a memory case entry."""
+    log_source = offense.get("log_source") or ", ".join(offense.get("log_sources") or []) or "Unknown"
+    return {
+        "offense_id": str(offense.get("offense_id", "")),
+        "description": offense.get("description", ""),
+        "source_ips": [str(ip) for ip in offense.get("source_ips") or []],
+        "destination_ips": [str(ip) for ip in offense.get("destination_ips") or []],
+        "log_source": log_source,
+        "tags": list(dict.fromkeys(tags or [])),
+        "decision": decision,
+        "added_at": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+
+_store_lock = threading.Lock()
+_store_offset = 0
+_vector_offset = 0
+# Serializes index updates; store offset of the entry indexed for each case ID
+_apply_lock = threading.Lock()
+_case_offsets: Dict[str, int] = {}
+
+def _vectors_path() -> str:
+    """Embeddings of written-back cases, kept next to the store, one file per backend."""
+    return f"{MEMORY_APPEND_PATH}.{embedding_backend.key}.vectors"
+
+def _vector_record(dim: int) -> np.dtype:
+    # The vector file is an int64 dimension header, then (line offset, vector) records
+    return np.dtype([("offset", "<i8"), ("vector", "<f4", (dim,))])
+
+def _write_vectors(offsets: List[int], vectors: np.ndarray) -> None:
+    """Append vector records for store lines; the caller holds the store's flock."""
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(len(offsets), -1)
+    with open(_vectors_path(), "a+b") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size < 8:
+            f.truncate(0)
+            f.write(np.int64(vectors.shape[1]).tobytes())
+            size = 8
+        else:
+            f.seek(0)
+            dim = int(np.frombuffer(f.read(8), dtype="<i8")[0])
+            if dim != vectors.shape[1]:
+                print(f"[MemoryAgent] Not saving {vectors.shape[1]}-d vectors to a {dim}-d vector file")
+                return
+        record = _vector_record(vectors.shape[1])
+        # Drop a record left half-written by a crash so later ones stay aligned
+        torn = (size - 8) % record.itemsize
+        if torn:
+            f.truncate(size - torn)
+        records = np.empty(len(offsets), dtype=record)
+        records["offset"] = offsets
+        records["vector"] = vectors
+        f.write(records.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+
+def _read_vectors(position: int) -> tuple:
+    """Vector records after `position`, as {line offset: vector}, and the new position."""
+    try:
+        with open(_vectors_path(), "rb") as f:
+            header = f.read(8)
+            if len(header) < 8:
+                return {}, position
+            record = _vector_record(int(np.frombuffer(header, dtype="<i8")[0]))
+            position = max(position, 8)
+            f.seek(position)
+            data = f.read()
+    except OSError:
+        return {}, position
+    count = len(data) // record.itemsize
+    records = np.frombuffer(data, dtype=record, count=count)
+    return dict(zip(records["offset"].tolist(), records["vector"])), position + count * record.itemsize
+
+def _save_vectors(offsets: List[int], vectors: np.ndarray) -> None:
+    with open(MEMORY_APPEND_PATH, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            _write_vectors(offsets, vectors)
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
 
-def find_similar_cases(current_offense: Dict, top_k: int = 3) -> List[Dict]:
+def _append_to_store(entry: Dict, vector: Optional[np.ndarray] = None) -> int:
+    """
+    Durably append one case, and its vector if given; flock keeps lines
+    whole across worker processes. Returns the line's offset in the store.
+    """
+    directory = os.path.dirname(MEMORY_APPEND_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    line = json.dumps(entry, default=str) + "\n"
+    with open(MEMORY_APPEND_PATH, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            offset = f.seek(0, os.SEEK_END)
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+            if vector is not None:
+                _write_vectors([offset], vector)
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+    return offset
+
+def _index_store_entries(entries: List[Dict], offsets: List[int], vectors: Dict[int, np.ndarray]) -> int:
+    """Index store lines with their saved vectors, embedding (and saving) any that have none."""
+    unsaved = [n for n, offset in enumerate(offsets) if offset not in vectors]
+    if unsaved:
+        encoded = np.asarray(encode_texts([preprocess_entry(entries[n]) for n in unsaved]), dtype=np.float32)
+        # Written by an older version or lost in a crash; save them so the next start reuses them
+        _save_vectors([offsets[n] for n in unsaved], encoded)
+        vectors.update({offsets[n]: vector for n, vector in zip(unsaved, encoded)})
+    embeddings = np.stack([vectors[offset] for offset in offsets])
+    return index_cases(entries, embeddings, offsets=offsets)
+
+def sync_from_store(wait: bool = True) -> int:
+    """
+    Index cases appended to the store since the last sync, including ones
+    written by other worker processes, with the vectors saved next to it.
+    The read offsets only advance once the cases are indexed, so a failed
+    sync is retried by the next one. With wait=False, returns at once if
+    another thread is already syncing. Returns the number of cases embedded.
+    """
+    global _store_offset, _vector_offset
+    if not _store_lock.acquire(blocking=wait):
+        return 0
+    try:
+        try:
+            if os.path.getsize(MEMORY_APPEND_PATH) <= _store_offset:
+                return 0
+        except OSError:
+            return 0
+        with open(MEMORY_APPEND_PATH, "rb") as f:
+            # Lines and their vectors are appended together under the exclusive lock
+            fcntl.flock(f, fcntl.LOCK_SH)
+            try:
+                f.seek(_store_offset)
+                chunk = f.read()
+                vectors, vector_offset = _read_vectors(_vector_offset)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        # Only consume complete lines; a partial line is picked up next time
+        complete = chunk[:chunk.rfind(b"\n") + 1]
+        entries, offsets, position = [], [], _store_offset
+        for raw in complete.splitlines(keepends=True):
+            try:
+                entries.append(json.loads(raw))
+                offsets.append(position)
+            except ValueError:
+                print("[MemoryAgent] Skipping malformed line in memory store")
+            position += len(raw)
+        added = _index_store_entries(entries, offsets, vectors) if entries else 0
+        _store_offset += len(complete)
+        _vector_offset = vector_offset
+    finally:
+        _store_lock.release()
+    _maybe_migrate_index()
+    return added
+
+def add_case(offense: Dict, decision: str, tags: Optional[List[str]] = None) -> Dict:
+    """
+    Write a decided offense and its embedding to the persistent store, then
+    index just that case. The store is the single source of truth: a crash
+    between the two steps leaves a line that the next sync (or warm-up
+    after a restart) indexes from its saved vector. Re-firing an offense_id
+    replaces its case. Searches running concurrently see either the old
+    index or the index with the new case, never a partial add.
+    """
+    entry = build_case(offense, decision, tags)
+    ensure_index()
+    vector = np.asarray(encode_texts([preprocess_entry(entry)]), dtype=np.float32)
+    offset = _append_to_store(entry, vector)
+    index_cases([entry], vector, offsets=[offset])
+    _maybe_migrate_index()
+    return entry
+
+async def remember_case(offense: Dict, decision: str, tags: Optional[List[str]] = None) -> Dict:
+    """Async wrapper for add_case; embedding runs on the bounded executor."""
+    return await run_cpu_bound(add_case, offense, decision, tags)
+
+memory_cases: Dict[str, Dict] = {}
+case_prefilter = CasePrefilter()
+memory_index = None
+_index_lock = threading.Lock()
+
+# Set once the ANN backend failed to load, so migration is not retried
+_ann_unavailable = False
+
+def _collection() -> str:
+    # Vectors from different backends are not comparable, so each backend
+    # gets its own persistent collection
+    return f"{MEMORY_INDEX_COLLECTION}-{embedding_backend.key}"
+
+def _store_size() -> int:
+    """Lines in the append store (a re-fired offense counts again)."""
+    count = 0
+    try:
+        with open(MEMORY_APPEND_PATH, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                count += block.count(b"\n")
+    except OSError:
+        pass
+    return count
+
+def ensure_index():
+    """
+    Build the memory index on first use, sized for the seed cases plus the
+    written-back store. Seed embeddings come from the on-disk cache when
+    possible; a persistent index skips cases it holds.
+    """
+    global memory_index
+    if memory_index is not None:
+        return memory_index
+    with _index_lock:
+        if memory_index is None:
+            index = create_index(corpus_size=len(memory_data) + _store_size(), collection=_collection())
+            seed_ids = [case_id(entry) for entry in memory_data]
+            embeddings = None
+            if index.missing(seed_ids):
+                embeddings = load_corpus_embeddings([preprocess_entry(entry) for entry in memory_data])
+            added = index_cases(memory_data, embeddings, index)
+            # Publish only once seeded so searches never see a partial index
+            memory_index = index
+            print(f"[MemoryAgent] Indexed {added} seed case(s) with {index.name} backend")
+    return memory_index
+
+def _maybe_migrate_index() -> None:
+    """
+    With MEMORY_INDEX_BACKEND=auto, move every case to the ANN backend once
+    the brute-force index reaches MEMORY_ANN_THRESHOLD. Searches keep using
+    the old index until the new one holds everything.
+    """
+    global memory_index, _ann_unavailable
+    index = memory_index
+    if (MEMORY_INDEX_BACKEND != "auto" or _ann_unavailable or index is None
+            or index.name != "bruteforce" or len(index) < MEMORY_ANN_THRESHOLD):
+        return
+    with _index_lock, _apply_lock:
+        if memory_index is not index:
+            return
+        target = create_index("chroma", collection=_collection())
+        if target.name == "bruteforce":
+            _ann_unavailable = True
+            return
+        started = time.perf_counter()
+        ids, vectors, metadatas = index.export()
+        for start in range(0, len(ids), 1000):
+            target.upsert(ids[start:start + 1000], vectors[start:start + 1000], metadatas[start:start + 1000])
+        memory_index = target
+        print(f"[MemoryAgent] Moved {len(ids)} case(s) to the {target.name} backend "
+              f"in {time.perf_counter() - started:.1f}s")
+
+def warm_up() -> None:
+    """Build the index, load the model and catch up on written-back cases."""
+    try:
+        ensure_index()
+        get_model()
+        sync_from_store()
+    except Exception as e:
+        print(f"[MemoryAgent] Warm-up failed: {e}")
+
+def start_warm_up() -> threading.Thread:
+    """Run warm_up() in a background thread so the app can bind its port first."""
+    thread = threading.Thread(target=warm_up, name="memory-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+def readiness() -> Dict:
+    """Whether semantic search can serve queries without a cold model load."""
+    return {
+        "semantic_search": memory_index is not None and _model_status["state"] == "ready",
+        "embedding_backend": embedding_backend.name,
+        "model": embedding_backend.key,
+        "model_state": _model_status["state"],
+        "model_error": _model_status["error"],
+        "model_load_seconds": _model_status["load_seconds"],
+        "index_backend": memory_index.name if memory_index is not None else None,
+        "indexed_cases": len(memory_index) if memory_index is not None else 0,
+    }
+
+def build_query_text(current_offense: Dict) -> str:
     # Handle both 'log_source' and 'log_sources' keys for consistency
     log_source = current_offense.get('log_source') or ', '.join(current_offense.get('log_sources', []))
+    return f"{current_offense['description']} Source: {', '.join(current_offense['source_ips'])} | Dest: {', '.join(current_offense['destination_ips'])} | LogSource: {log_source}"
+
+async def find_similar_cases(current_offense: Dict, top_k: int = 3, log_sources: Optional[List[str]] = None,
+                             tags: Optional[List[str]] = None) -> List[Dict]:
+    """
+    Find the top_k most similar memory cases, optionally restricted to cases
+    from the given log sources and/or carrying any of the given tags.
+    The query is embedded through the micro-batcher; scoring is CPU-bound,
+    so it runs on the bounded executor off the event loop.
+    """
+    query_embedding = await query_embedder.embed(build_query_text(current_offense))
+    return await run_cpu_bound(search_similar_cases, current_offense, top_k, log_sources, tags, query_embedding)
+
+def search_similar_cases(current_offense: Dict, top_k: int = 3, log_sources: Optional[List[str]] = None,
+                         tags: Optional[List[str]] = None, query_embedding=None) -> List[Dict]:
+    # Pick up cases other workers have written back since the last search
+    # (skipped if another thread is mid-sync; the search uses the current index)
+    ensure_index()
+    sync_from_store(wait=False)
+
+    if query_embedding is None:
+        query_embedding = encode_texts([build_query_text(current_offense)])[0]
+
+    started = time.perf_counter()
+    structured = case_prefilter.match(current_offense) if MEMORY_PREFILTER else {}
+    allowed = case_prefilter.allowed(log_sources, tags)
+    if allowed is not None:
+        structured = {i: score for i, score in structured.items() if i in allowed}
+    candidates = sorted(structured, key=structured.get, reverse=True)[:MEMORY_PREFILTER_MAX_CANDIDATES]
 
-    query_text = f"{current_offense['description']} Source: {', '.join(current_offense['source_ips'])} | Dest: {', '.join(current_offense['destination_ips'])} | LogSource: {log_source}"
-    query_embedding = model.encode(query_text, convert_to_tensor=True)
+    if len(candidates) >= max(top_k, MEMORY_PREFILTER_MIN_CANDIDATES):
+        # Enough structured matches: score only those, no corpus-wide scan
+        semantic = dict(memory_index.score(query_embedding, candidates))
+        path = "prefiltered"
+    else:
+        semantic = dict(memory_index.search(query_embedding, top_k * SEMANTIC_OVERFETCH,
+                                            log_sources=log_sources, tags=tags))
+        semantic.update(memory_index.score(query_embedding, [i for i in candidates if i not in semantic]))
+        path = "full"
+    metrics.MEMORY_SEARCH_SECONDS.observe(time.perf_counter() - started, path=path)
 
-    # Compute cosine similarities
-    scores = util.pytorch_cos_sim(query_embedding, corpus_embeddings)[0]
-    top_results = scores.topk(k=top_k)
+    ranked = sorted(
+        ((i, (1 - MEMORY_HYBRID_WEIGHT) * score + MEMORY_HYBRID_WEIGHT * structured.get(i, 0.0), score)
+         for i, score in semantic.items()),
+        key=lambda hit: hit[1], reverse=True,
+    )
 
     similar_cases = []
-    for score, idx in zip(top_results.values, top_results.indices):
-        case = memory_data[idx].copy()  # Prevent modifying the global memory
-        case["similarity_score"] = round(score.item(), 3)
+    for matched_id, hybrid, score in ranked:
+        if matched_id not in memory_cases:
+            continue
+        case = memory_cases[matched_id].copy()  # Prevent modifying the global memory
+        case["similarity_score"] = round(hybrid, 3)
+        case["semantic_score"] = round(score, 3)
+        case["structured_score"] = round(structured.get(matched_id, 0.0), 3)
         similar_cases.append(case)
+        if len(similar_cases) == top_k:
+            break
 
     return similar_cases
@@ -0,0 +1,240 @@
+# app/agents/memory_index.py
+
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Index backend selection: "bruteforce", "chroma", or "auto" (Chroma once
+# the corpus outgrows MEMORY_ANN_THRESHOLD and chromadb is installed)
+MEMORY_INDEX_BACKEND = os.getenv("MEMORY_INDEX_BACKEND", "auto").lower()
+MEMORY_INDEX_PATH = os.getenv("MEMORY_INDEX_PATH", "cache/memory_index")
+MEMORY_INDEX_COLLECTION = os.getenv("MEMORY_INDEX_COLLECTION", "nuvex_memory")
+MEMORY_ANN_THRESHOLD = int(os.getenv("MEMORY_ANN_THRESHOLD", "5000"))
+
+def case_metadata(entry: Dict) -> Dict:
+    """Filterable metadata for a memory case."""
+    return {
+        "log_source": entry.get("log_source") or ", ".join(entry.get("log_sources", [])) or "Unknown",
+        "tags": list(entry.get("tags", [])),
+    }
+
+class BruteForceIndex:
+    """
+    Exact cosine search over an in-memory matrix of normalized embeddings.
+    Cheapest option for small corpora.
+    """
+
+    name = "bruteforce"
+
+    def __init__(self):
+        self._ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._log_sources: List[str] = []
+        self._tags: List[set] = []
+        self._buffer = None
+        self._size = 0
+        self._matrix = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def missing(self, ids: Iterable[str]) -> List[str]:
+        return [i for i in ids if i not in self._positions]
+
+    def add(self, ids: List[str], embeddings: np.ndarray, metadatas: List[Dict]) -> None:
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        embeddings = embeddings.reshape(len(ids), -1)
+        with self._lock:
+            new_rows = []
+            for case_id, vector, meta in zip(ids, embeddings, metadatas):
+                if case_id in self._positions:
+                    continue
+                self._positions[case_id] = len(self._ids)
+                self._ids.append(case_id)
+                self._log_sources.append(meta["log_source"])
+                self._tags.append(set(meta["tags"]))
+                new_rows.append(vector)
+            if len(new_rows) == len(embeddings):
+                self._append_rows(embeddings)
+            elif new_rows:
+                self._append_rows(np.vstack(new_rows))
+
+    def upsert(self, ids: List[str], embeddings: np.ndarray, metadatas: List[Dict]) -> None:
+        """add(), but ids already indexed get their vector and metadata replaced in place."""
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        with self._lock:
+            existing = [n for n, case_id in enumerate(ids) if case_id in self._positions]
+            if existing and not self._buffer.flags.writeable:
+                # Seeded from a read-only memory map: take a private copy first
+                self._buffer = np.array(self._buffer[:self._size])
+                self._matrix = self._buffer
+            for n in existing:
+                row = self._positions[ids[n]]
+                self._buffer[row] = embeddings[n]
+                self._log_sources[row] = metadatas[n]["log_source"]
+                self._tags[row] = set(metadatas[n]["tags"])
+        if not existing:
+            self.add(ids, embeddings, metadatas)
+            return
+        replaced = set(existing)
+        fresh = [n for n in range(len(ids)) if n not in replaced]
+        if fresh:
+            self.add([ids[n] for n in fresh], embeddings[fresh], [metadatas[n] for n in fresh])
+
+    def export(self) -> Tuple[List[str], np.ndarray, List[Dict]]:
+        """Every case's ID, vector and metadata (a copy), e.g. to move them to another backend."""
+        with self._lock:
+            matrix = np.empty((0, 0), dtype=np.float32) if self._matrix is None else np.array(self._matrix)
+            metadatas = [{"log_source": source, "tags": sorted(tags)}
+                         for source, tags in zip(self._log_sources, self._tags)]
+            return list(self._ids), matrix, metadatas
+
+    def _append_rows(self, block: np.ndarray) -> None:
+        # Grow the backing buffer geometrically so appends are amortized O(1)
+        needed = self._size + len(block)
+        if self._buffer is None and block.dtype == np.float32:
+            # First load: use the block as-is (e.g. a memory-mapped embedding
+            # file); the first later append copies it into a growable buffer
+            self._buffer = block
+        else:
+            if self._buffer is None or needed > len(self._buffer):
+                capacity = max(needed, 64, 2 * (0 if self._buffer is None else len(self._buffer)))
+                buffer = np.empty((capacity, block.shape[1]), dtype=np.float32)
+                if self._buffer is not None:
+                    buffer[:self._size] = self._buffer[:self._size]
+                self._buffer = buffer
+            self._buffer[self._size:needed] = block
+        self._size = needed
+        self._matrix = self._buffer[:needed]
+
+    def search(self, query: np.ndarray, top_k: int, log_sources: Optional[List[str]] = None,
+               tags: Optional[List[str]] = None) -> List[Tuple[str, float]]:
+        with self._lock:
+            if self._matrix is None or top_k <= 0:
+                return []
+            scores = self._matrix @ np.asarray(query, dtype=np.float32).ravel()
+            if log_sources or tags:
+                mask = np.ones(len(self._ids), dtype=bool)
+                if log_sources:
+                    wanted = set(log_sources)
+                    mask &= np.fromiter((s in wanted for s in self._log_sources), dtype=bool, count=len(self._ids))
+                if tags:
+                    wanted = set(tags)
+                    mask &= np.fromiter((bool(t & wanted) for t in self._tags), dtype=bool, count=len(self._ids))
+                scores = np.where(mask, scores, -np.inf)
+            k = min(top_k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self._ids[i], float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def score(self, query: np.ndarray, ids: List[str]) -> List[Tuple[str, float]]:
+        """Cosine similarity of `query` to just the given cases."""
+        with self._lock:
+            rows = [self._positions[i] for i in ids if i in self._positions]
+            if not rows:
+                return []
+            scores = self._matrix[rows] @ np.asarray(query, dtype=np.float32).ravel()
+            return [(self._ids[r], float(score)) for r, score in zip(rows, scores)]
+
+class ChromaIndex:
+    """
+    Approximate nearest-neighbour search on a persistent local Chroma
+    collection (HNSW, cosine space). Embeddings persist across restarts, so
+    only cases missing from the collection are ever embedded.
+    """
+
+    name = "chroma"
+
+    def __init__(self, path: str = MEMORY_INDEX_PATH, collection: str = MEMORY_INDEX_COLLECTION):
+        import chromadb
+        from chromadb.config import Settings
+
+        os.makedirs(path, exist_ok=True)
+        self._client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+        self._collection = self._client.get_or_create_collection(
+            name=collection, metadata={"hnsw:space": "cosine"}
+        )
+
+    def __len__(self):
+        return self._collection.count()
+
+    def missing(self, ids: Iterable[str]) -> List[str]:
+        ids = list(ids)
+        if not ids:
+            return []
+        existing = set(self._collection.get(ids=ids, include=[])["ids"])
+        return [i for i in ids if i not in existing]
+
+    @staticmethod
+    def _flatten(meta: Dict) -> Dict:
+        # Chroma metadata values must be scalars, so tags become boolean keys
+        flat = {"log_source": meta["log_source"]}
+        for tag in meta["tags"]:
+            flat[f"tag:{tag}"] = True
+        return flat
+
+    @staticmethod
+    def _where(log_sources: Optional[List[str]], tags: Optional[List[str]]) -> Optional[Dict]:
+        clauses = []
+        if log_sources:
+            clauses.append({"log_source": {"$in": list(log_sources)}})
+        if tags:
+            tag_clauses = [{f"tag:{tag}": True} for tag in tags]
+            clauses.append(tag_clauses[0] if len(tag_clauses) == 1 else {"$or": tag_clauses})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    def add(self, ids: List[str], embeddings: np.ndarray, metadatas: List[Dict]) -> None:
+        if not ids:
+            return
+        # Chroma's upsert already replaces ids it holds
+        self._collection.upsert(
+            ids=list(ids),
+            embeddings=np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1).tolist(),
+            metadatas=[self._flatten(m) for m in metadatas],
+        )
+
+    upsert = add
+
+    def search(self, query: np.ndarray, top_k: int, log_sources: Optional[List[str]] = None,
+               tags: Optional[List[str]] = None) -> List[Tuple[str, float]]:
+        if top_k <= 0 or len(self) == 0:
+            return []
+        result = self._collection.query(
+            query_embeddings=[np.asarray(query, dtype=np.float32).ravel().tolist()],
+            n_results=min(top_k, len(self)),
+            where=self._where(log_sources, tags),
+            include=["distances"],
+        )
+        # Cosine distance -> cosine similarity
+        return [(case_id, 1.0 - float(distance))
+                for case_id, distance in zip(result["ids"][0], result["distances"][0])]
+
+    def score(self, query: np.ndarray, ids: List[str]) -> List[Tuple[str, float]]:
+        """Cosine similarity of `query` to just the given cases."""
+        if not ids:
+            return []
+        result = self._collection.get(ids=list(ids), include=["embeddings"])
+        if not result["ids"]:
+            return []
+        matrix = np.asarray(result["embeddings"], dtype=np.float32)
+        scores = matrix @ np.asarray(query, dtype=np.float32).ravel()
+        return [(case_id, float(score)) for case_id, score in zip(result["ids"], scores)]
+
+def create_index(backend: str = MEMORY_INDEX_BACKEND, corpus_size: int = 0,
+                 collection: str = MEMORY_INDEX_COLLECTION):
+    """Build the configured memory index backend."""
+    if backend == "auto":
+        backend = "chroma" if corpus_size >= MEMORY_ANN_THRESHOLD else "bruteforce"
+    if backend == "chroma":
+        try:
+            return ChromaIndex(collection=collection)
+        except ImportError:
+            print("[MemoryIndex] chromadb not installed, falling back to brute-force search")
+    elif backend != "bruteforce":
+        print(f"[MemoryIndex] Unknown backend '{backend}', using brute-force search")
+    return BruteForceIndex()
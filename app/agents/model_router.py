@@ -1,33 +1,50 @@
 # app/agents/model_router.py
+import asyncio
 import os
+import time
 from dotenv import load_dotenv
 load_dotenv()
 
+from app.agents import openai_agent, gemini_agent
 from app.agents.openai_agent import generate_response as openai_response
 from app.agents.gemini_agent import generate_response as gemini_response
+from app.utils import cassette, metrics, prompt_cache
+from app.utils.rate_limiter import estimate_tokens, get_limiter
 
 # Configuration from environment
 MODEL_PROVIDER = os.getenv("MODEL_PROVIDER", "openai").lower()
 ENABLE_FALLBACK = os.getenv("ENABLE_MODEL_FALLBACK", "true").lower() == "true"
 
-def generate_dynamic_prompt(prompt: str) -> str:
+PROVIDER_AGENTS = {
+    "openai": openai_agent,
+    "gemini": gemini_agent,
+}
+
+async def generate_dynamic_prompt(prompt: str, cache: bool = False, site: str = "other") -> str:
     """
     Generate response using the configured model provider.
-    Handles both OpenAI (no rate limiting) and Gemini (with rate limiting).
+    Handles both OpenAI and Gemini; per-provider request and token budgets
+    are enforced by the shared rate limiter.
     Fallback support between providers if enabled.
+
+    Call sites that can tolerate a reused answer pass cache=True to serve
+    near-identical prompts from the prompt cache. Error responses are
+    never cached. `site` names the call site in the LLM metrics.
     """
     primary_provider = MODEL_PROVIDER
     
     print(f"[ModelRouter] Using primary provider: {primary_provider}")
     
     # Try primary provider first
-    response = try_provider(primary_provider, prompt)
+    response = await cached_try_provider(primary_provider, prompt, cache, site)
     
     # If primary failed and fallback is enabled, try alternative
     if ENABLE_FALLBACK and response.startswith("Error:"):
         fallback_provider = "openai" if primary_provider == "gemini" else "gemini"
         print(f"[ModelRouter] Primary provider ({primary_provider}) failed, trying fallback ({fallback_provider})")
-        fallback_response = try_provider(fallback_provider, prompt)
+        fallback_response = await cached_try_provider(fallback_provider, prompt, cache, site)
+        metrics.LLM_FALLBACKS.inc(from_provider=primary_provider, to_provider=fallback_provider,
+                                  outcome="error" if fallback_response.startswith("Error:") else "ok")
         
         # Use fallback response if it's successful
         if not fallback_response.startswith("Error:"):
@@ -38,7 +55,43 @@ def generate_dynamic_prompt(prompt: str) -> str:
     
     return response
 
-def try_provider(provider: str, prompt: str) -> str:
+def prompt_cache_key(provider: str, prompt: str) -> str:
+    """Cache key for a prompt on a provider's current model, generation config and system prompt."""
+    agent = PROVIDER_AGENTS.get(provider)
+    model = getattr(agent, "MODEL_NAME", provider)
+    params = getattr(agent, "GENERATION_CONFIG", {})
+    system = getattr(agent, "SYSTEM_PROMPT", "")
+    return prompt_cache.make_key(provider, model, params, prompt, system)
+
+async def cached_try_provider(provider: str, prompt: str, cache: bool = False, site: str = "other") -> str:
+    """
+    try_provider() with an optional prompt-cache lookup in front of it.
+    """
+    if not (cache and prompt_cache.CACHE_ENABLED and provider in PROVIDER_AGENTS):
+        return await timed_try_provider(provider, prompt, site)
+
+    store = prompt_cache.get_cache()
+    key = prompt_cache_key(provider, prompt)
+    cached = await asyncio.to_thread(store.get, key)
+    if cached is not None:
+        print(f"[ModelRouter] Prompt cache hit for {provider}")
+        metrics.LLM_CALLS.inc(provider=provider, site=site, outcome="cache_hit")
+        return cached
+
+    response = await timed_try_provider(provider, prompt, site)
+    if not response.startswith("Error:"):
+        await asyncio.to_thread(store.put, key, response)
+    return response
+
+async def timed_try_provider(provider: str, prompt: str, site: str = "other") -> str:
+    """try_provider() with latency and outcome recorded per provider and call site."""
+    started = time.perf_counter()
+    response = await try_provider(provider, prompt)
+    metrics.LLM_SECONDS.observe(time.perf_counter() - started, provider=provider, site=site)
+    metrics.LLM_CALLS.inc(provider=provider, site=site, outcome="error" if response.startswith("Error:") else "ok")
+    return response
+
+async def try_provider(provider: str, prompt: str) -> str:
     """
     Try a specific model provider.
     
@@ -50,18 +103,50 @@ def try_provider(provider: str, prompt: str) -> str:
         str: Response or error message
     """
     try:
-        if provider == "gemini":
-            # Gemini has built-in rate limiting in its agent
-            return gemini_response(prompt)
-        elif provider == "openai":
-            # OpenAI has no rate limiting (paid tier)
-            return openai_response(prompt)
-        else:
+        if provider not in PROVIDER_AGENTS:
             return f"Error: Unknown provider '{provider}'. Use 'openai' or 'gemini'"
+
+        if cassette.enabled():
+            # Record or replay keyed on provider, model, config and prompt
+            return await cassette.through_cassette(
+                "llm", prompt_cache_key(provider, prompt), {"provider": provider, "prompt_chars": len(prompt)},
+                lambda: call_provider(provider, prompt),
+            )
+        return await call_provider(provider, prompt)
             
     except Exception as e:
         return f"Error: {provider} provider failed - {str(e)}"
 
+async def call_provider(provider: str, prompt: str) -> str:
+    """Rate-limited live call to a provider's agent."""
+    # An unconfigured provider fails at once instead of waiting for budget
+    # it will never use (e.g. every openai -> gemini fallback without a key)
+    key_name = f"{provider.upper()}_API_KEY"
+    if not os.getenv(key_name):
+        return f"Error: {key_name} not found in environment variables"
+
+    # Wait for request and token budget (shared across worker processes)
+    await acquire_rate_limit(provider, prompt)
+
+    if provider == "gemini":
+        return await gemini_response(prompt)
+    else:
+        return await openai_response(prompt)
+
+async def acquire_rate_limit(provider: str, prompt: str) -> float:
+    """
+    Take one request plus the estimated prompt and completion tokens from
+    the provider's bucket, waiting asynchronously if over budget.
+    """
+    agent = PROVIDER_AGENTS[provider]
+    config = getattr(agent, "GENERATION_CONFIG", {})
+    max_output = config.get("max_tokens") or config.get("max_output_tokens") or 0
+    api_key = os.getenv(f"{provider.upper()}_API_KEY", "")
+    return await get_limiter().acquire(
+        provider, getattr(agent, "MODEL_NAME", provider), api_key,
+        tokens=estimate_tokens(prompt) + max_output
+    )
+
 def get_current_provider() -> str:
     """Get the currently configured primary provider"""
     return MODEL_PROVIDER
@@ -69,3 +154,20 @@ def get_current_provider() -> str:
 def is_fallback_enabled() -> bool:
     """Check if fallback is enabled"""
     return ENABLE_FALLBACK
+
+def warm_up_providers() -> None:
+    """
+    Build the shared clients for the primary (and fallback) provider at
+    startup so the first offense does not pay client setup cost.
+    """
+    providers = [MODEL_PROVIDER]
+    if ENABLE_FALLBACK:
+        providers.append("openai" if MODEL_PROVIDER == "gemini" else "gemini")
+    for provider in providers:
+        try:
+            if provider == "openai":
+                openai_agent.get_client()
+            elif provider == "gemini":
+                gemini_agent.get_model()
+        except Exception as e:
+            print(f"[ModelRouter] Could not warm up {provider} client: {e}")
@@ -1,8 +1,25 @@
 # app/agents/openai_agent.py
 import os
-from openai import OpenAI
+from openai import AsyncOpenAI
 
-def generate_response(prompt: str) -> str:
+from app.agents.llm_clients import get_openai_client
+from app.utils import metrics
+
+MODEL_NAME = "gpt-4o-mini"
+SYSTEM_PROMPT = "You are a cybersecurity L1 SOC anlayst specializing in SOC analysis and incident response."
+GENERATION_CONFIG = {
+    "temperature": 0.5,
+    "max_tokens": 300,
+}
+
+def get_client() -> AsyncOpenAI:
+    """Return the shared OpenAI client, or None if no API key is configured."""
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        return None
+    return get_openai_client(api_key, base_url=os.getenv("OPENAI_BASE_URL"))
+
+async def generate_response(prompt: str) -> str:
     """
     Generates a response from OpenAI's GPT model (no rate limiting needed for paid tier).
     
@@ -13,22 +30,22 @@ def generate_response(prompt: str) -> str:
         str: The generated response or an error message if the query fails.
     """
     try:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            return "Error: OPENAI_API_KEY not found in environment variables"
-
         # No rate limiting needed for OpenAI (paid tier)
-        client = OpenAI(api_key=api_key)
+        client = get_client()
+        if client is None:
+            return "Error: OPENAI_API_KEY not found in environment variables"
 
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
+        response = await client.chat.completions.create(
+            model=MODEL_NAME,
             messages=[
-                {"role": "system", "content": "You are a cybersecurity L1 SOC anlayst specializing in SOC analysis and incident response."},
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ],
-            temperature=0.5,
-            max_tokens=300
+            **GENERATION_CONFIG
         )
+        if response.usage is not None:
+            metrics.LLM_TOKENS.inc(response.usage.prompt_tokens or 0, provider="openai", kind="prompt")
+            metrics.LLM_TOKENS.inc(response.usage.completion_tokens or 0, provider="openai", kind="completion")
         
         return response.choices[0].message.content.strip()
         
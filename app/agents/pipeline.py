@@ -0,0 +1,107 @@
+# app/agents/pipeline.py
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from app.utils import metrics
+
+class Stage:
+    """
+    One unit of work in the offense pipeline.
+
+    `func` is awaited with one keyword argument per name in `inputs`; each
+    input is either another stage's name or a key of the initial context.
+    If `when` is given it is called with the results so far once the inputs
+    are ready; when it returns False the stage is skipped and its result is
+    None.
+    """
+
+    def __init__(self, name: str, func: Callable[..., Awaitable], inputs: Iterable[str] = (),
+                 when: Optional[Callable[[Dict], bool]] = None):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.when = when
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, inputs={self.inputs})"
+
+def _topological_order(stages: List[Stage], context: Dict) -> List[Stage]:
+    by_name = {}
+    for stage in stages:
+        if stage.name in by_name or stage.name in context:
+            raise ValueError(f"Duplicate stage name '{stage.name}'")
+        by_name[stage.name] = stage
+
+    for stage in stages:
+        for dep in stage.inputs:
+            if dep not in by_name and dep not in context:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown input '{dep}'")
+
+    ordered, visiting, visited = [], set(), set()
+
+    def visit(stage: Stage):
+        if stage.name in visited:
+            return
+        if stage.name in visiting:
+            raise ValueError(f"Dependency cycle through stage '{stage.name}'")
+        visiting.add(stage.name)
+        for dep in stage.inputs:
+            if dep in by_name:
+                visit(by_name[dep])
+        visiting.discard(stage.name)
+        visited.add(stage.name)
+        ordered.append(stage)
+
+    for stage in stages:
+        visit(stage)
+    return ordered
+
+async def run_stages(stages: List[Stage], context: Optional[Dict] = None) -> Dict:
+    """
+    Run stages as a dependency graph. Every stage starts as soon as its
+    inputs are available, so independent stages run concurrently and total
+    latency follows the critical path. Returns the context updated with
+    each stage's result, plus per-stage wall time under "_timings" and the
+    names of skipped stages under "_skipped".
+    """
+    results = dict(context or {})
+    timings = {}
+    skipped = []
+    tasks: Dict[str, asyncio.Task] = {}
+
+    async def run(stage: Stage):
+        deps = [tasks[dep] for dep in stage.inputs if dep in tasks]
+        if deps:
+            await asyncio.gather(*deps)
+        if stage.when is not None and not stage.when(results):
+            metrics.STAGE_SKIPPED.inc(stage=stage.name)
+            skipped.append(stage.name)
+            results[stage.name] = None
+            return None
+        started = time.perf_counter()
+        try:
+            value = await stage.func(**{dep: results[dep] for dep in stage.inputs})
+        except Exception:
+            metrics.STAGE_ERRORS.inc(stage=stage.name)
+            raise
+        elapsed = time.perf_counter() - started
+        metrics.STAGE_SECONDS.observe(elapsed, stage=stage.name)
+        timings[stage.name] = round(elapsed, 3)
+        results[stage.name] = value
+        return value
+
+    for stage in _topological_order(stages, results):
+        tasks[stage.name] = asyncio.create_task(run(stage), name=f"stage:{stage.name}")
+
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        raise
+
+    results["_timings"] = timings
+    results["_skipped"] = skipped
+    return results
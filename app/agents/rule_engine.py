@@ -0,0 +1,324 @@
+# app/agents/rule_engine.py
+
+import json
+import os
+import string
+import threading
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Relative paths are taken from the repository root, not the working directory
+TRIAGE_RULES_PATH = os.path.join(REPO_ROOT, os.getenv("TRIAGE_RULES_PATH", os.path.join("config", "triage_rules.json")))
+# How often (seconds) to check the rules file for changes; 0 disables hot reload
+TRIAGE_RULES_RELOAD_INTERVAL = float(os.getenv("TRIAGE_RULES_RELOAD_INTERVAL", "2"))
+
+OPERATORS = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+
+def _reputation(result: dict, provider: str, field: str):
+    # Reputation results nest provider data; flat dicts are accepted too
+    return (result.get(provider) or {}).get(field, result.get(field))
+
+def _event_feature(offense: dict, name: str):
+    # Vectorized event features (app/utils/event_columns.py) set by the pipeline
+    return (offense.get("event_features") or {}).get(name)
+
+# Numeric features per scope. Offense features see the offense and its
+# similar cases; IOC features see one reputation result.
+OFFENSE_FEATURES = {
+    "magnitude": lambda offense, cases: offense.get("magnitude"),
+    "event_count": lambda offense, cases: offense.get("event_count"),
+    "source_ip_count": lambda offense, cases: len(offense.get("source_ips") or []),
+    "destination_ip_count": lambda offense, cases: len(offense.get("destination_ips") or []),
+    "similar_case_count": lambda offense, cases: len(cases or []),
+    "unique_source_ips": lambda offense, cases: _event_feature(offense, "unique_source_ips"),
+    "unique_destination_ips": lambda offense, cases: _event_feature(offense, "unique_destination_ips"),
+    "unique_destination_ports": lambda offense, cases: _event_feature(offense, "unique_destination_ports"),
+    "max_port_fanout": lambda offense, cases: _event_feature(offense, "max_port_fanout"),
+    "burst_events_per_minute": lambda offense, cases: _event_feature(offense, "burst_events_per_minute"),
+    "events_per_minute": lambda offense, cases: _event_feature(offense, "events_per_minute"),
+}
+IOC_FEATURES = {
+    "abuse_confidence": lambda r: _reputation(r, "abuseipdb", "abuse_confidence"),
+    "abuse_reports": lambda r: _reputation(r, "abuseipdb", "reports"),
+    "malicious_votes": lambda r: _reputation(r, "virustotal", "malicious_votes"),
+    "suspicious_votes": lambda r: _reputation(r, "virustotal", "suspicious_votes"),
+}
+# Set-valued offense features, tested with "contains"
+OFFENSE_SETS = {
+    "similar_case_tags": lambda offense, cases: {t for c in cases or [] for t in c.get("tags") or []},
+    "log_sources": lambda offense, cases: set(offense.get("log_sources") or []),
+    "event_types": lambda offense, cases: {e.get("event_type") for e in offense.get("events") or []},
+}
+
+class RuleError(ValueError):
+    """The rules file is malformed."""
+
+def _number(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _plain(value: float):
+    return int(value) if float(value).is_integer() else round(float(value), 3)
+
+class CompiledRules:
+    """
+    A rules file compiled into column predicates. Each condition becomes a
+    function of a dict of NumPy columns returning a boolean mask, so one
+    call evaluates a rule for every offense (or IOC) in a batch.
+    """
+
+    def __init__(self, spec: dict, source: str = "<rules>"):
+        self.source = source
+        # Only the features some rule or message uses are extracted
+        self.features = set()
+        self.contains = set()
+        try:
+            self.escalation_rules = [self._compile_rule(rule) for rule in spec.get("escalation_rules", [])]
+            self.risk_rules = [self._compile_risk_rule(rule) for rule in spec.get("risk_rules", [])]
+            levels = sorted(spec.get("risk_levels", []), key=lambda level: -float(level["min_score"]))
+            self.risk_levels = [(str(level["level"]), float(level["min_score"])) for level in levels]
+            self.default_risk_level = str(spec.get("default_risk_level", "LOW"))
+        except (KeyError, TypeError) as e:
+            raise RuleError(f"{source}: malformed rule ({e!r})") from e
+
+    def _scope(self, rule: dict) -> str:
+        scope = rule.get("scope", "offense")
+        if scope not in ("offense", "ioc"):
+            raise RuleError(f"{self.source}: rule '{rule.get('name')}' has unknown scope '{scope}'")
+        return scope
+
+    def _compile_rule(self, rule: dict) -> dict:
+        scope = self._scope(rule)
+        return {
+            "name": rule["name"],
+            "scope": scope,
+            "when": self._compile_condition(rule["when"], scope),
+            "reason": self._compile_message(rule.get("reason", rule["name"]), scope),
+        }
+
+    def _compile_risk_rule(self, rule: dict) -> dict:
+        scope = self._scope(rule)
+        tiers = [{
+            "name": tier.get("name", rule["name"]),
+            "when": self._compile_condition(tier["when"], scope),
+            "points": float(tier["points"]),
+            "factor": self._compile_message(tier.get("factor", tier.get("name", rule["name"])), scope),
+        } for tier in rule["tiers"]]
+        return {"name": rule["name"], "scope": scope, "tiers": tiers}
+
+    def _check_feature(self, feature: str, scope: str) -> None:
+        known = OFFENSE_FEATURES if scope == "offense" else {**OFFENSE_FEATURES, **IOC_FEATURES}
+        if feature not in known:
+            raise RuleError(f"{self.source}: unknown {scope} feature '{feature}'")
+        self.features.add(feature)
+
+    def _compile_message(self, template: str, scope: str) -> tuple:
+        """(template, field names); fields are features, 'ioc' or 'offense_id'."""
+        fields = [field for _, field, _, _ in string.Formatter().parse(template) if field]
+        for field in fields:
+            if field == "ioc" and scope == "ioc" or field == "offense_id":
+                continue
+            self._check_feature(field, scope)
+        return template, tuple(fields)
+
+    def _compile_condition(self, spec, scope: str):
+        if isinstance(spec, dict):
+            if len(spec) != 1 or next(iter(spec)) not in ("all", "any", "not"):
+                raise RuleError(f"{self.source}: a condition object needs exactly one of all/any/not, got {spec}")
+            key, value = next(iter(spec.items()))
+            if key == "not":
+                inner = self._compile_condition(value, scope)
+                return lambda cols: ~inner(cols)
+            parts = [self._compile_condition(part, scope) for part in value]
+            if not parts:
+                raise RuleError(f"{self.source}: empty '{key}' condition")
+            combine = np.logical_and if key == "all" else np.logical_or
+            return lambda cols: combine.reduce([part(cols) for part in parts])
+
+        if not isinstance(spec, (list, tuple)) or len(spec) != 3:
+            raise RuleError(f"{self.source}: a condition must be [feature, op, value], got {spec}")
+        feature, op, value = spec
+        if op == "contains":
+            if feature not in OFFENSE_SETS:
+                raise RuleError(f"{self.source}: '{feature}' is not a set feature ({', '.join(OFFENSE_SETS)})")
+            column = ("contains", feature, value)
+            self.contains.add(column)
+            return lambda cols: cols[column]
+        if op not in OPERATORS:
+            raise RuleError(f"{self.source}: unknown operator '{op}'")
+        self._check_feature(feature, scope)
+        compare, threshold = OPERATORS[op], float(value)
+        return lambda cols: compare(cols[feature], threshold)
+
+def load_rules(path: str) -> CompiledRules:
+    with open(path) as f:
+        try:
+            spec = json.load(f)
+        except json.JSONDecodeError as e:
+            raise RuleError(f"{path}: {e}") from e
+    return CompiledRules(spec, source=path)
+
+class RuleEngine:
+    """
+    Triage rules from a JSON file, compiled once and recompiled when the
+    file changes. A file that fails to load or compile on reload is
+    reported and the previous rules stay in force.
+    """
+
+    def __init__(self, path: str = TRIAGE_RULES_PATH, reload_interval: float = TRIAGE_RULES_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._signature = self._stat()
+        self._rules = load_rules(path)
+        self._checked_at = time.monotonic()
+        self.stats = {"reloads": 0, "reload_errors": 0, "offenses_scored": 0}
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def rules(self) -> CompiledRules:
+        """Current compiled rules, reloading first if the file changed."""
+        if self.reload_interval > 0 and time.monotonic() - self._checked_at >= self.reload_interval:
+            self.reload()
+        return self._rules
+
+    def reload(self, force: bool = False) -> bool:
+        """Recompile if the file changed (or always with force); True when new rules were installed."""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            signature = self._stat()
+            if signature == self._signature and not force:
+                return False
+            self._signature = signature
+            try:
+                rules = load_rules(self.path)
+            except (OSError, RuleError) as e:
+                self.stats["reload_errors"] += 1
+                print(f"[RuleEngine] Keeping previous rules, reload failed: {e}")
+                return False
+            self._rules = rules
+            self.stats["reloads"] += 1
+        print(f"[RuleEngine] Reloaded triage rules from {self.path}")
+        return True
+
+    def evaluate(self, offense: dict = None, reputation_results: list = None, similar_cases: list = None) -> dict:
+        return self.evaluate_batch([(offense or {}, reputation_results or [], similar_cases or [])])[0]
+
+    def evaluate_batch(self, items: list) -> list:
+        """
+        Score (offense, reputation_results, similar_cases) triples in one
+        vectorized pass. Each result has decision, reasoning, risk_score,
+        risk_level, risk_factors and fired_rules.
+        """
+        rules = self.rules()
+        n = len(items)
+        offense_cols = {
+            name: np.fromiter((_number(feature(o, c)) for o, _, c in items), dtype=np.float64, count=n)
+            for name, feature in OFFENSE_FEATURES.items() if name in rules.features
+        }
+        for column in rules.contains:
+            _, feature, value = column
+            extract = OFFENSE_SETS[feature]
+            offense_cols[column] = np.fromiter((value in extract(o, c) for o, _, c in items), dtype=bool, count=n)
+
+        rows = [(i, r) for i, (_, reputation, _) in enumerate(items) for r in reputation]
+        owner = np.fromiter((i for i, _ in rows), dtype=np.intp, count=len(rows))
+        # IOC rows also see their offense's columns
+        ioc_cols = {name: column[owner] for name, column in offense_cols.items()}
+        for name, feature in IOC_FEATURES.items():
+            if name in rules.features:
+                ioc_cols[name] = np.fromiter((_number(feature(r)) for _, r in rows), dtype=np.float64, count=len(rows))
+        offense_index = np.arange(n)
+
+        def message(compiled: tuple, scope: str, cols: dict, row: int) -> str:
+            template, fields = compiled
+            if not fields:
+                return template
+            values = {}
+            for field in fields:
+                if field == "ioc":
+                    result = rows[row][1]
+                    values[field] = result.get("ioc") or result.get("ip") or "unknown"
+                elif field == "offense_id":
+                    index = rows[row][0] if scope == "ioc" else row
+                    values[field] = items[index][0].get("offense_id", "unknown")
+                else:
+                    values[field] = _plain(cols[field][row])
+            return template.format_map(values)
+
+        results = [{"reasoning": [], "risk_factors": [], "fired_rules": []} for _ in range(n)]
+        escalate = np.zeros(n, dtype=bool)
+
+        for rule in rules.escalation_rules:
+            cols, owners = (offense_cols, offense_index) if rule["scope"] == "offense" else (ioc_cols, owner)
+            if not len(owners):
+                continue
+            for row in np.flatnonzero(rule["when"](cols)):
+                index = owners[row]
+                escalate[index] = True
+                results[index]["reasoning"].append(message(rule["reason"], rule["scope"], cols, row))
+                if rule["name"] not in results[index]["fired_rules"]:
+                    results[index]["fired_rules"].append(rule["name"])
+
+        score = np.zeros(n, dtype=np.float64)
+        for rule in rules.risk_rules:
+            cols, owners = (offense_cols, offense_index) if rule["scope"] == "offense" else (ioc_cols, owner)
+            if not len(owners):
+                continue
+            tiers = rule["tiers"]
+            # First matching tier per row (-1 when none): apply tiers last to first
+            chosen = np.full(len(owners), -1, dtype=np.intp)
+            for position in range(len(tiers) - 1, -1, -1):
+                chosen[tiers[position]["when"](cols)] = position
+            points = np.array([tier["points"] for tier in tiers] + [0.0])[chosen]
+            np.add.at(score, owners, points)
+            for row in np.flatnonzero(chosen >= 0):
+                tier, index = tiers[chosen[row]], owners[row]
+                results[index]["risk_factors"].append(message(tier["factor"], rule["scope"], cols, row))
+                if tier["name"] not in results[index]["fired_rules"]:
+                    results[index]["fired_rules"].append(tier["name"])
+
+        levels = np.full(n, rules.default_risk_level, dtype=object)
+        for level, min_score in reversed(rules.risk_levels):
+            levels[score >= min_score] = level
+
+        for index, result in enumerate(results):
+            result["decision"] = "escalate" if escalate[index] else "false_positive"
+            result["risk_score"] = _plain(score[index])
+            result["risk_level"] = levels[index]
+        self.stats["offenses_scored"] += n
+        return results
+
+    def get_stats(self) -> dict:
+        rules = self._rules
+        return {
+            "path": self.path,
+            "escalation_rules": len(rules.escalation_rules),
+            "risk_rules": len(rules.risk_rules),
+            **self.stats,
+        }
+
+_engine = None
+
+def get_engine() -> RuleEngine:
+    """Return the process-wide rule engine."""
+    global _engine
+    if _engine is None:
+        _engine = RuleEngine()
+    return _engine
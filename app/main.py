@@ -1,10 +1,96 @@
 # nuvex-mvp/app/main.py
 from fastapi import FastAPI, Request
-from app.offense_router import router as offense_router
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.offense_router import router as offense_router, job_queue
+from app.agents.main_agent import offense_flight
+from app.agents.memory_agent import query_embedder, readiness, start_warm_up
+from app.agents.llm_clients import close_clients as close_llm_clients, get_client_stats
+from app.agents.model_router import warm_up_providers
+from app.utils import cassette, metrics
+from app.utils.executor import shutdown_executor
+from app.utils.output_writer import close_writer, get_writer
+from app.utils.reputation import close_client as close_reputation_client
+from app.utils.reputation_cache import get_cache as get_reputation_cache
+from app.utils.prompt_cache import get_cache as get_prompt_cache
+from app.utils.rate_limiter import get_limiter
+from app.utils.result_store import get_store as get_result_store
 
 app = FastAPI(title="NuVex SOC Copilot")
 app.include_router(offense_router)
 
+def _cache_metrics():
+    """Hit/miss counts the caches already keep, exposed at scrape time."""
+    reputation = get_reputation_cache().get_stats()
+    prompts = get_prompt_cache().get_stats()
+    queries = query_embedder.get_stats()
+    lookups = [
+        ("reputation", reputation["memory_hits"] + reputation["disk_hits"], reputation["misses"]),
+        ("prompt", prompts["memory_hits"] + prompts["disk_hits"], prompts["misses"]),
+        ("query_embedding", queries["hits"], queries["misses"]),
+    ]
+    return [
+        ("nuvex_cache_lookups_total", "counter", "Cache lookups by cache and result.",
+         [({"cache": name, "result": "hit"}, hits) for name, hits, _ in lookups]
+         + [({"cache": name, "result": "miss"}, misses) for name, _, misses in lookups]),
+        ("nuvex_cache_hit_ratio", "gauge", "Cache hit ratio since start-up.",
+         [({"cache": name}, round(hits / (hits + misses), 4) if hits + misses else 0.0) for name, hits, misses in lookups]),
+    ]
+
+metrics.register_collector(_cache_metrics)
+
+@app.on_event("startup")
+async def warm_up():
+    warm_up_providers()
+    # Embedding model loads in the background so the port binds immediately
+    start_warm_up()
+    await job_queue.start()
+
+@app.on_event("shutdown")
+async def release_resources():
+    await job_queue.stop()
+    await query_embedder.close()
+    shutdown_executor()
+    await close_reputation_client()
+    await close_llm_clients()
+    get_reputation_cache().close()
+    get_prompt_cache().close()
+    cassette.get_store().close()
+    close_writer()
+    get_result_store().close()
+
 @app.get("/")
 def read_root():
     return {"message": "NuVex AI Agent is running."}
+
+@app.get("/ready")
+def ready():
+    """503 until semantic search is warm; offenses are still accepted meanwhile."""
+    status = readiness()
+    return JSONResponse(status_code=200 if status["semantic_search"] else 503, content=status)
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {
+        "reputation": get_reputation_cache().get_stats(),
+        "prompts": get_prompt_cache().get_stats(),
+        "query_embeddings": query_embedder.get_stats(),
+        "cassette": cassette.get_store().get_stats(),
+        "offenses": offense_flight.get_stats(),
+    }
+
+@app.get("/llm/clients")
+def llm_client_stats():
+    return get_client_stats()
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus text format. Each worker process exposes its own counters."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/output/stats")
+def output_stats():
+    return {"writer": get_writer().get_stats(), "result_store": get_result_store().get_stats()}
+
+@app.get("/llm/rate-limits")
+def rate_limit_stats():
+    return get_limiter().get_stats()
@@ -1,13 +1,32 @@
 # app/offense_router.py
 
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+import asyncio
+import json
+import os
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, ValidationError
 from typing import List, Optional
+from app.agents.decision_agent import format_false_positive_note
 from app.agents.main_agent import handle_offense
+from app.utils.event_stream import read_offense_stream
+from app.utils.job_queue import JobQueue
+from app.utils.result_store import get_store as get_result_store
 
 router = APIRouter()
 
+# Background worker pool for ?mode=async submissions
+job_queue = JobQueue(lambda offense: handle_offense(offense))
+
+# Batch ingestion limits
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "64"))
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/json-lines")
+
 class OffenseRequest(BaseModel):
+    # SIEM exports carry numeric offense IDs
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
     offense_id: str
     source_ips: List[str]
     description: str
@@ -19,10 +38,175 @@ class OffenseRequest(BaseModel):
     event_count: Optional[int] = 0
     events: Optional[List[dict]] = []
 
-@router.post("/ingest-offense")
-async def ingest_offense(data: OffenseRequest):
+async def _dispatch(offense: dict, mode: str, callback_url: Optional[str]):
+    if mode == "async":
+        if callback_url and not callback_url.startswith(("http://", "https://")):
+            raise HTTPException(status_code=400, detail="callback_url must be an http(s) URL")
+        job = await job_queue.submit(offense, callback_url)
+        return JSONResponse(status_code=202, content={
+            "job_id": job["job_id"],
+            "offense_id": job["offense_id"],
+            "status": job["status"],
+            "status_url": f"/jobs/{job['job_id']}",
+        })
+    if mode != "sync":
+        raise HTTPException(status_code=400, detail="mode must be 'sync' or 'async'")
+
     try:
-        result = await handle_offense(data.dict())
+        result = await handle_offense(offense)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing offense: {str(e)}")
+
+@router.post("/ingest-offense")
+async def ingest_offense(data: OffenseRequest, mode: str = "sync", callback_url: Optional[str] = None):
+    return await _dispatch(data.dict(), mode, callback_url)
+
+@router.post("/ingest-offense/stream")
+async def ingest_offense_stream(request: Request, mode: str = "sync", callback_url: Optional[str] = None):
+    """
+    Same as /ingest-offense for offenses with very many events. The body is
+    parsed as it arrives; only a stratified sample of EVENT_SAMPLE_SIZE
+    events is kept, plus aggregates and features over all of them
+    (event_aggregates, event_features).
+    """
+    try:
+        fields = await read_offense_stream(request.stream())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    aggregates = fields.pop("event_aggregates")
+    features = fields.pop("event_features")
+    try:
+        offense = OffenseRequest(**fields).dict()
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    offense["event_aggregates"] = aggregates
+    offense["event_features"] = features
+    return await _dispatch(offense, mode, callback_url)
+
+def _split_payloads(body: bytes, content_type: str) -> list:
+    """
+    Split a batch body into raw offense payloads. NDJSON lines are kept as
+    bytes and parsed per offense, so one bad line only fails that offense;
+    anything else must be a JSON array (or a single JSON object).
+    """
+    if content_type in NDJSON_TYPES:
+        return [line for line in body.split(b"\n") if line.strip()]
+    try:
+        payload = json.loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+    return payload if isinstance(payload, list) else [payload]
+
+def _parse_offense(raw) -> dict:
+    if isinstance(raw, (bytes, str)):
+        raw = json.loads(raw)
+    return OffenseRequest(**raw).dict()
+
+async def _stream_batch(payloads, concurrency: int):
+    """
+    Run handle_offense on each payload with at most `concurrency` in flight
+    and yield one NDJSON line per offense in completion order.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    results = asyncio.Queue()
+
+    async def process(index: int, raw):
+        try:
+            try:
+                offense = _parse_offense(raw)
+            except (ValueError, ValidationError, TypeError) as e:
+                await results.put({"index": index, "status": "invalid", "error": str(e)})
+                return
+            try:
+                analysis = await handle_offense(offense)
+                await results.put({"index": index, "offense_id": offense["offense_id"], "status": "ok", "result": analysis})
+            except Exception as e:
+                await results.put({"index": index, "offense_id": offense["offense_id"], "status": "error",
+                                   "error": f"Error processing offense: {str(e)}"})
+        finally:
+            semaphore.release()
+
+    async def feed():
+        tasks = []
+        try:
+            index = 0
+            for raw in payloads:
+                # Backpressure: stop reading input while the pool is full
+                await semaphore.acquire()
+                tasks.append(asyncio.create_task(process(index, raw)))
+                index += 1
+            await asyncio.gather(*tasks)
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            raise
+        finally:
+            await results.put(None)
+
+    feeder = asyncio.create_task(feed())
+    try:
+        while True:
+            record = await results.get()
+            if record is None:
+                break
+            yield json.dumps(record, default=str) + "\n"
+    finally:
+        if not feeder.done():
+            feeder.cancel()
+
+@router.post("/ingest-offenses")
+async def ingest_offenses(request: Request, concurrency: int = BATCH_CONCURRENCY):
+    """
+    Batch ingestion: accepts a JSON array or NDJSON of offenses and streams
+    back one NDJSON result line per offense as soon as it finishes.
+    """
+    concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+    # Read the body up front: the streaming response owns the receive channel
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    payloads = _split_payloads(await request.body(), content_type)
+    return StreamingResponse(_stream_batch(payloads, concurrency), media_type="application/x-ndjson")
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+@router.get("/results")
+async def list_results(decision: Optional[str] = None, risk_level: Optional[str] = None,
+                       source_ip: Optional[str] = None, log_source: Optional[str] = None,
+                       since: Optional[str] = None, until: Optional[str] = None,
+                       limit: int = 50, cursor: Optional[str] = None, full: bool = False):
+    """
+    Stored results, newest first. since/until take ISO 8601 or epoch
+    seconds; follow next_cursor for the next page.
+    """
+    try:
+        return await asyncio.to_thread(
+            get_result_store().query, decision=decision, risk_level=risk_level, source_ip=source_ip,
+            log_source=log_source, since=since, until=until, limit=limit, cursor=cursor, full=full,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/results/{offense_id}")
+async def get_result(offense_id: str):
+    stored = await asyncio.to_thread(get_result_store().get, offense_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail=f"No result for offense {offense_id}")
+    return dict(stored["analysis"], processed_at=stored["processed_at"], incident_report=stored["report"])
+
+@router.get("/results/{offense_id}/export", response_class=PlainTextResponse)
+async def export_result(offense_id: str):
+    """The text file the service would have written: incident report or false-positive note."""
+    stored = await asyncio.to_thread(get_result_store().get, offense_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail=f"No result for offense {offense_id}")
+    if stored["report"]:
+        return stored["report"]
+    analysis = stored["analysis"]
+    if analysis.get("decision") != "false_positive":
+        raise HTTPException(status_code=404, detail=f"No incident report stored for offense {offense_id}")
+    return format_false_positive_note(analysis.get("reasoning", []), analysis["offense_id"], stored["processed_at"])
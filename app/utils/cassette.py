@@ -0,0 +1,128 @@
+# app/utils/cassette.py
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# Record/replay of external calls: "off", "record" (call live, store each
+# response) or "replay" (serve stored responses, no network)
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off").lower()
+CASSETTE_PATH = os.getenv("CASSETTE_PATH", "cache/cassette.db")
+# Replay sleeps for the recorded latency times this factor (0 = instant)
+CASSETTE_LATENCY_SCALE = float(os.getenv("CASSETTE_LATENCY_SCALE", "0"))
+# On a replay miss: "error" fails the call, "live" falls through to the network
+CASSETTE_ON_MISS = os.getenv("CASSETTE_ON_MISS", "error").lower()
+
+class CassetteMiss(Exception):
+    """Replay found no recording for a request."""
+
+def fingerprint(kind: str, *parts) -> str:
+    """Stable key for a request; never includes API keys."""
+    payload = json.dumps([kind, *parts], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class CassetteStore:
+    """
+    Recorded responses in one SQLite file: request fingerprint -> zlib
+    compressed JSON response plus the latency observed while recording.
+    A fingerprint recorded twice keeps the latest response.
+    """
+
+    def __init__(self, path: str = CASSETTE_PATH):
+        self.path = path
+        self._db = None
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "recorded": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS recordings ("
+                "key TEXT PRIMARY KEY, kind TEXT NOT NULL, request TEXT NOT NULL, "
+                "response BLOB NOT NULL, latency REAL NOT NULL, recorded_at REAL NOT NULL)"
+            )
+            db.commit()
+            self._db = db
+        return self._db
+
+    def get(self, key: str):
+        """(response, latency) for a recorded request, or None."""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT response, latency FROM recordings WHERE key = ?", (key,)
+            ).fetchone()
+            self.stats["hits" if row else "misses"] += 1
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0])), row[1]
+
+    def put(self, key: str, kind: str, request: dict, response, latency: float) -> None:
+        blob = zlib.compress(json.dumps(response, default=str).encode("utf-8"))
+        with self._lock:
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO recordings (key, kind, request, response, latency, recorded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, kind, json.dumps(request, default=str), blob, latency, time.time()),
+            )
+            db.commit()
+            self.stats["recorded"] += 1
+
+    def count(self) -> dict:
+        with self._lock:
+            rows = self._connect().execute("SELECT kind, COUNT(*) FROM recordings GROUP BY kind").fetchall()
+        return dict(rows)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {"mode": CASSETTE_MODE, "path": self.path, **self.stats}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+_store = None
+
+def get_store() -> CassetteStore:
+    """Return the process-wide cassette store."""
+    global _store
+    if _store is None:
+        _store = CassetteStore()
+    return _store
+
+def enabled() -> bool:
+    return CASSETTE_MODE in ("record", "replay")
+
+async def through_cassette(kind: str, key: str, request: dict, call):
+    """
+    Await call() according to CASSETTE_MODE. Replay returns the recorded
+    response (after the scaled recorded latency) or raises CassetteMiss;
+    record calls live and stores the response with its latency.
+    """
+    if CASSETTE_MODE == "replay":
+        hit = await asyncio.to_thread(get_store().get, key)
+        if hit is not None:
+            response, latency = hit
+            if CASSETTE_LATENCY_SCALE > 0:
+                await asyncio.sleep(latency * CASSETTE_LATENCY_SCALE)
+            return response
+        if CASSETTE_ON_MISS != "live":
+            raise CassetteMiss(f"no {kind} recording for {request}")
+
+    started = time.perf_counter()
+    response = await call()
+    if CASSETTE_MODE == "record":
+        await asyncio.to_thread(get_store().put, key, kind, request, response, time.perf_counter() - started)
+    return response
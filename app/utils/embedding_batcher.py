@@ -0,0 +1,131 @@
+# app/utils/embedding_batcher.py
+
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from app.utils.executor import run_cpu_bound
+
+# Micro-batching configuration from environment
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", "5"))
+EMBED_QUERY_CACHE_SIZE = int(os.getenv("EMBED_QUERY_CACHE_SIZE", "1024"))
+
+class EmbeddingBatcher:
+    """
+    Collects concurrent embedding requests for up to `max_wait_ms` (or until
+    `max_batch` texts are waiting) and encodes them in one call on the CPU
+    executor. Recent results are kept in a bounded LRU, so repeated offense
+    templates skip the model entirely.
+    """
+
+    def __init__(self, encode, max_batch: int = EMBED_BATCH_MAX_SIZE,
+                 max_wait_ms: float = EMBED_BATCH_WAIT_MS, cache_size: int = EMBED_QUERY_CACHE_SIZE):
+        self.encode = encode
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._pending = {}
+        self._timer = None
+        self._loop = None
+        # In-flight encodes, referenced until done so they are not collected
+        self._tasks = set()
+        self.stats = {"hits": 0, "misses": 0, "batches": 0, "encoded": 0, "largest_batch": 0}
+
+    def _cached(self, text: str):
+        with self._cache_lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+            return vector
+
+    def _remember(self, text: str, vector: np.ndarray) -> None:
+        if self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._cache[text] = vector
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Embedding for one text, batched with whatever else arrives meanwhile."""
+        vector = self._cached(text)
+        if vector is not None:
+            self.stats["hits"] += 1
+            return vector
+        self.stats["misses"] += 1
+
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Futures belong to one loop; start afresh if the loop changed
+            self._loop, self._pending, self._timer, self._tasks = loop, {}, None, set()
+
+        future = self._pending.get(text)
+        if future is None:
+            # Identical texts in the same window share one encode
+            future = self._pending[text] = loop.create_future()
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.max_wait, self._flush)
+        return await asyncio.shield(future)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = self._loop.create_task(self._encode_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _encode_batch(self, batch: dict) -> None:
+        texts = list(batch)
+        try:
+            vectors = np.asarray(await run_cpu_bound(self.encode, texts), dtype=np.float32)
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.stats["batches"] += 1
+        self.stats["encoded"] += len(texts)
+        self.stats["largest_batch"] = max(self.stats["largest_batch"], len(texts))
+        for text, vector in zip(texts, vectors):
+            # Shared between callers and the cache, so make it read-only
+            vector.setflags(write=False)
+            self._remember(text, vector)
+            future = batch[text]
+            if not future.done():
+                future.set_result(vector)
+
+    async def close(self) -> None:
+        """Encode whatever is still waiting and wait for in-flight batches (used on shutdown)."""
+        if self._loop is not asyncio.get_running_loop():
+            return
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def clear(self) -> None:
+        with self._cache_lock:
+            self._cache.clear()
+
+    def get_stats(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        with self._cache_lock:
+            size = len(self._cache)
+        return {
+            **self.stats,
+            "cached": size,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+            "avg_batch": round(self.stats["encoded"] / self.stats["batches"], 2) if self.stats["batches"] else 0.0,
+        }
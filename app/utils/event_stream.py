@@ -0,0 +1,313 @@
+# app/utils/event_stream.py
+
+import codecs
+import json
+import os
+import random
+from collections import Counter
+
+from app.utils.event_columns import EVENT_CHUNK_SIZE, EventColumns, EventFeatures, new_categories
+
+# Events kept per offense, and strata tracked before the rest share one bucket
+EVENT_SAMPLE_SIZE = int(os.getenv("EVENT_SAMPLE_SIZE", "20"))
+EVENT_SAMPLE_MAX_STRATA = int(os.getenv("EVENT_SAMPLE_MAX_STRATA", "64"))
+# Largest single JSON value (one event, or any other field) the stream parser buffers
+STREAM_MAX_VALUE_BYTES = int(os.getenv("STREAM_MAX_VALUE_BYTES", str(2 ** 20)))
+# Distinct keys kept per aggregate counter / IP set before counting the rest as overflow
+AGGREGATE_MAX_KEYS = int(os.getenv("AGGREGATE_MAX_KEYS", "1000"))
+AGGREGATE_MAX_IPS = int(os.getenv("AGGREGATE_MAX_IPS", "65536"))
+
+_WHITESPACE = " \t\n\r"
+
+class OffenseStreamParser:
+    """
+    Incremental parser for one offense JSON object. feed() takes raw bytes
+    and returns the items completed so far: ("field", name, value) for each
+    top-level field and ("event", event) for each element of "events". Only
+    the value being parsed is buffered, so memory does not grow with the
+    number of events.
+    """
+
+    def __init__(self, events_key: str = "events", max_value_bytes: int = STREAM_MAX_VALUE_BYTES):
+        self.events_key = events_key
+        self.max_value_bytes = max_value_bytes
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._state = "start"
+        self._key = None
+
+    def feed(self, data: bytes) -> list:
+        self._buf += self._text.decode(data)
+        return self._parse(final=False)
+
+    def close(self) -> list:
+        self._buf += self._text.decode(b"", final=True)
+        items = self._parse(final=True)
+        if self._state != "done":
+            raise ValueError("Offense JSON ended early")
+        return items
+
+    def _skip(self, pos: int) -> int:
+        while pos < len(self._buf) and self._buf[pos] in _WHITESPACE:
+            pos += 1
+        return pos
+
+    def _value(self, pos: int, final: bool):
+        """Decode one complete JSON value at pos, or None if more input is needed."""
+        try:
+            value, end = self._decoder.raw_decode(self._buf, pos)
+        except json.JSONDecodeError as e:
+            if final:
+                raise ValueError(f"Invalid offense JSON: {e}") from e
+            if len(self._buf) - pos > self.max_value_bytes:
+                raise ValueError(f"A JSON value exceeds {self.max_value_bytes} bytes")
+            return None
+        # A number is only complete once a delimiter follows ("12" may become "12.5e3")
+        if not final and not isinstance(value, (dict, list, str)):
+            if end == len(self._buf) or self._buf[end] not in _WHITESPACE + ",]}":
+                return None
+        return value, end
+
+    def _parse(self, final: bool) -> list:
+        items, pos = [], 0
+        while True:
+            pos = self._skip(pos)
+            if pos >= len(self._buf):
+                break
+            char, state = self._buf[pos], self._state
+            if state == "start":
+                if char != "{":
+                    raise ValueError("Offense body must be a JSON object")
+                pos, self._state = pos + 1, "key"
+            elif state in ("key", "next_key"):
+                if char == "}" and state == "key":
+                    pos, self._state = pos + 1, "done"
+                    continue
+                if char != '"':
+                    raise ValueError(f"Expected a field name at '{self._buf[pos:pos + 20]}'")
+                decoded = self._value(pos, final)
+                if decoded is None:
+                    break
+                self._key, pos = decoded
+                self._state = "colon"
+            elif state == "colon":
+                if char != ":":
+                    raise ValueError(f"Expected ':' after '{self._key}'")
+                pos, self._state = pos + 1, "value"
+            elif state == "value":
+                if self._key == self.events_key and char == "[":
+                    pos, self._state = pos + 1, "event"
+                    continue
+                decoded = self._value(pos, final)
+                if decoded is None:
+                    break
+                value, pos = decoded
+                items.append(("field", self._key, value))
+                self._state = "after_value"
+            elif state == "after_value":
+                if char == ",":
+                    pos, self._state = pos + 1, "next_key"
+                elif char == "}":
+                    pos, self._state = pos + 1, "done"
+                else:
+                    raise ValueError(f"Expected ',' or '}}' after '{self._key}'")
+            elif state in ("event", "next_event"):
+                if char == "]" and state == "event":
+                    pos, self._state = pos + 1, "after_value"
+                    continue
+                decoded = self._value(pos, final)
+                if decoded is None:
+                    break
+                event, pos = decoded
+                if not isinstance(event, dict):
+                    raise ValueError("Each event must be a JSON object")
+                items.append(("event", event))
+                self._state = "after_event"
+            elif state == "after_event":
+                if char == ",":
+                    pos, self._state = pos + 1, "next_event"
+                elif char == "]":
+                    pos, self._state = pos + 1, "after_value"
+                else:
+                    raise ValueError("Expected ',' or ']' between events")
+            else:
+                raise ValueError("Unexpected data after the offense object")
+        self._buf = self._buf[pos:]
+        return items
+
+class EventReservoir:
+    """
+    Stratified reservoir sample of a stream of events. Each (event_type,
+    destination_port) stratum keeps its own uniform reservoir; sample()
+    gives every stratum at least one slot (largest strata first), splits
+    the rest in proportion to stratum size, and interleaves strata so the
+    first few events are already diverse.
+    """
+
+    def __init__(self, size: int = EVENT_SAMPLE_SIZE, max_strata: int = EVENT_SAMPLE_MAX_STRATA,
+                 keys=("event_type", "destination_port"), seed=None):
+        self.size = max(1, size)
+        self.max_strata = max(1, max_strata)
+        self.keys = tuple(keys)
+        self._random = random.Random(seed)
+        self._reservoirs = {}
+        self._seen = Counter()
+
+    def add(self, event: dict) -> None:
+        stratum = tuple(str(event.get(key, "Unknown")) for key in self.keys)
+        if stratum not in self._reservoirs and len(self._reservoirs) >= self.max_strata:
+            stratum = ("(other)",) * len(self.keys)
+        reservoir = self._reservoirs.setdefault(stratum, [])
+        self._seen[stratum] += 1
+        if len(reservoir) < self.size:
+            reservoir.append(event)
+        else:
+            slot = self._random.randrange(self._seen[stratum])
+            if slot < self.size:
+                reservoir[slot] = event
+
+    def sample(self) -> list:
+        strata = [stratum for stratum, _ in self._seen.most_common()]
+        if not strata:
+            return []
+        if len(strata) >= self.size:
+            quota = {stratum: 1 for stratum in strata[:self.size]}
+        else:
+            quota = {stratum: 1 for stratum in strata}
+            total, spare = sum(self._seen.values()), self.size - len(strata)
+            for stratum in strata:
+                quota[stratum] += int(spare * self._seen[stratum] / total)
+            # Hand out what rounding left over, largest strata first
+            left = self.size - sum(quota.values())
+            for stratum in strata:
+                if left <= 0:
+                    break
+                quota[stratum] += 1
+                left -= 1
+        quota = {stratum: min(count, len(self._reservoirs[stratum])) for stratum, count in quota.items()}
+
+        sample, round_ = [], 0
+        while len(sample) < sum(quota.values()):
+            for stratum in quota:
+                if round_ < quota[stratum]:
+                    sample.append(self._reservoirs[stratum][round_])
+            round_ += 1
+        return sample
+
+    def strata(self) -> int:
+        return len(self._seen)
+
+class _CappedCounter:
+    """Counter that stops adding new keys after max_keys and counts those under overflow."""
+
+    def __init__(self, max_keys: int = AGGREGATE_MAX_KEYS):
+        self.max_keys = max_keys
+        self.counts = Counter()
+        self.overflow = 0
+
+    def add(self, key) -> None:
+        if key in self.counts or len(self.counts) < self.max_keys:
+            self.counts[key] += 1
+        else:
+            self.overflow += 1
+
+    def top(self, n: int = 10) -> list:
+        return [[key, count] for key, count in self.counts.most_common(n)]
+
+class EventAggregates:
+    """Whole-offense statistics computed in one pass with bounded memory."""
+
+    def __init__(self, max_keys: int = AGGREGATE_MAX_KEYS, max_ips: int = AGGREGATE_MAX_IPS):
+        self.max_ips = max_ips
+        self.count = 0
+        self.event_types = _CappedCounter(max_keys)
+        self.destination_ports = _CappedCounter(max_keys)
+        self.protocols = _CappedCounter(max_keys)
+        self.usernames = _CappedCounter(max_keys)
+        self.source_ips, self.destination_ips = set(), set()
+        self.ips_capped = False
+        self.first_seen = self.last_seen = None
+
+    def _add_ip(self, ips: set, ip) -> None:
+        if ip is None or ip in ips:
+            return
+        if len(ips) < self.max_ips:
+            ips.add(ip)
+        else:
+            self.ips_capped = True
+
+    def add(self, event: dict) -> None:
+        self.count += 1
+        self.event_types.add(str(event.get("event_type", "Unknown")))
+        self.destination_ports.add(str(event.get("destination_port", "Unknown")))
+        self.protocols.add(str(event.get("protocol", "Unknown")))
+        if event.get("username"):
+            self.usernames.add(str(event["username"]))
+        self._add_ip(self.source_ips, event.get("source_ip") or event.get("source_address"))
+        self._add_ip(self.destination_ips, event.get("destination_ip") or event.get("destination_address"))
+        seen = event.get("start_time") or event.get("timestamp")
+        if isinstance(seen, str) and seen:
+            # ISO 8601 strings order correctly as text
+            if self.first_seen is None or seen < self.first_seen:
+                self.first_seen = seen
+            if self.last_seen is None or seen > self.last_seen:
+                self.last_seen = seen
+
+    def summary(self, top: int = 10) -> dict:
+        return {
+            "event_count": self.count,
+            "event_types": self.event_types.top(top),
+            "distinct_event_types": len(self.event_types.counts) + (1 if self.event_types.overflow else 0),
+            "destination_ports": self.destination_ports.top(top),
+            "protocols": self.protocols.top(top),
+            "usernames": self.usernames.top(top),
+            "unique_source_ips": len(self.source_ips),
+            "unique_destination_ips": len(self.destination_ips),
+            "unique_ips_capped": self.ips_capped,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+        }
+
+async def read_offense_stream(chunks, sample_size: int = EVENT_SAMPLE_SIZE, seed=None) -> dict:
+    """
+    Consume an async iterable of byte chunks holding one offense JSON object.
+    Returns the top-level fields with "events" replaced by a stratified
+    sample, and "event_aggregates" and "event_features" computed over every
+    event.
+    """
+    parser = OffenseStreamParser()
+    reservoir = EventReservoir(sample_size, seed=seed)
+    aggregates = EventAggregates()
+    features, categories, pending = EventFeatures(), new_categories(), []
+    fields = {}
+
+    def consume(items):
+        for item in items:
+            if item[0] == "event":
+                reservoir.add(item[1])
+                aggregates.add(item[1])
+                pending.append(item[1])
+                if len(pending) >= EVENT_CHUNK_SIZE:
+                    features.update(EventColumns.from_events(pending, categories))
+                    pending.clear()
+            else:
+                fields[item[1]] = item[2]
+
+    async for chunk in chunks:
+        consume(parser.feed(chunk))
+    consume(parser.close())
+    features.update(EventColumns.from_events(pending, categories))
+
+    fields["events"] = reservoir.sample()
+    fields["event_features"] = features.summary()
+    fields["event_aggregates"] = aggregates.summary()
+    fields["event_aggregates"]["sampled_events"] = len(fields["events"])
+    fields["event_aggregates"]["strata"] = reservoir.strata()
+    # Trust the SIEM's own count if it is larger (it may have truncated the export)
+    try:
+        reported = int(fields.get("event_count") or 0)
+    except (TypeError, ValueError):
+        reported = 0
+    fields["event_count"] = max(reported, aggregates.count)
+    return fields
@@ -0,0 +1,38 @@
+# app/utils/executor.py
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+# Bounded pool for CPU-bound work (embeddings, similarity search) so it never
+# runs on the event loop and never oversubscribes the host.
+CPU_WORKERS = int(os.getenv("NUVEX_CPU_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the shared CPU executor, creating it on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="nuvex-cpu")
+    return _executor
+
+async def run_cpu_bound(func, *args, **kwargs):
+    """
+    Run a CPU-bound callable on the bounded executor and await its result.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), partial(func, *args, **kwargs))
+
+def shutdown_executor() -> None:
+    """Release the executor threads (used on application shutdown)."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
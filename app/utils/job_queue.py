@@ -0,0 +1,288 @@
+# app/utils/job_queue.py
+
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+import httpx
+
+# Background job configuration
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "cache/jobs.db")
+JOB_CALLBACK_TIMEOUT = float(os.getenv("JOB_CALLBACK_TIMEOUT", "10"))
+# Each worker process holds a lease on the jobs it owns and renews it every
+# third of JOB_LEASE_SECONDS; jobs whose lease lapsed are taken over
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+class JobStore:
+    """
+    SQLite-backed job table so queued and running offenses survive a
+    restart. Every job has an owner (one JobQueue) and a lease; jobs are
+    claimed with conditional UPDATEs, so with several worker processes
+    sharing the file each job runs once, and only jobs whose owner stopped
+    renewing its lease are recovered by another.
+    """
+
+    def __init__(self, path: str = JOB_DB_PATH):
+        self.path = path
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, offense_id TEXT, status TEXT NOT NULL, "
+                "payload TEXT NOT NULL, result TEXT, error TEXT, callback_url TEXT, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            columns = {row[1] for row in db.execute("PRAGMA table_info(jobs)")}
+            for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):
+                if column not in columns:
+                    db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_owner ON jobs (owner, status)")
+            db.commit()
+            self._db = db
+        return self._db
+
+    def create(self, offense: dict, callback_url: str = None, owner: str = None,
+               lease: float = JOB_LEASE_SECONDS) -> dict:
+        now = time.time()
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "offense_id": str(offense.get("offense_id")),
+            "status": "queued",
+            "callback_url": callback_url,
+            "created_at": now,
+            "updated_at": now,
+        }
+        with self._lock:
+            db = self._connect()
+            db.execute(
+                "INSERT INTO jobs (job_id, offense_id, status, payload, callback_url, created_at, updated_at, "
+                "owner, lease_until) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job["job_id"], job["offense_id"], "queued", json.dumps(offense, default=str),
+                 callback_url, now, now, owner, now + lease if owner else None),
+            )
+            db.commit()
+        return job
+
+    def update(self, job_id: str, status: str, result=None, error: str = None, owner: str = None) -> bool:
+        """
+        Set a job's status. With an owner, only if that owner still holds
+        the job; returns False if it was taken over.
+        """
+        sql = "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE job_id = ?"
+        params = [status, None if result is None else json.dumps(result, default=str), error, time.time(), job_id]
+        if owner is not None:
+            sql += " AND owner = ?"
+            params.append(owner)
+        with self._lock:
+            db = self._connect()
+            updated = db.execute(sql, params).rowcount
+            db.commit()
+        return updated == 1
+
+    def claim(self, job_id: str, owner: str, lease: float = JOB_LEASE_SECONDS) -> bool:
+        """Atomically move one of owner's queued jobs to running; False if someone else has it."""
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            claimed = db.execute(
+                "UPDATE jobs SET status = 'running', lease_until = ?, updated_at = ? "
+                "WHERE job_id = ? AND status = 'queued' AND owner = ?",
+                (now + lease, now, job_id, owner),
+            ).rowcount
+            db.commit()
+        return claimed == 1
+
+    def renew(self, owner: str, lease: float = JOB_LEASE_SECONDS) -> int:
+        """Extend the lease on every unfinished job owner holds."""
+        with self._lock:
+            db = self._connect()
+            renewed = db.execute(
+                "UPDATE jobs SET lease_until = ? WHERE owner = ? AND status IN ('queued', 'running')",
+                (time.time() + lease, owner),
+            ).rowcount
+            db.commit()
+        return renewed
+
+    def release(self, owner: str) -> int:
+        """Give up owner's unfinished jobs (on shutdown) so another worker recovers them at once."""
+        with self._lock:
+            db = self._connect()
+            released = db.execute(
+                "UPDATE jobs SET status = 'queued', lease_until = 0 WHERE owner = ? AND status IN ('queued', 'running')",
+                (owner,),
+            ).rowcount
+            db.commit()
+        return released
+
+    def recover(self, owner: str, lease: float = JOB_LEASE_SECONDS) -> list:
+        """
+        Take over unfinished jobs whose lease has expired (their owner died
+        or shut down), oldest first. They are re-queued under `owner`.
+        """
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            # IMMEDIATE takes the write lock before reading, so two workers
+            # recovering at once cannot both take the same job
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = db.execute(
+                    "SELECT job_id, payload, callback_url FROM jobs WHERE status IN ('queued', 'running') "
+                    "AND (lease_until IS NULL OR lease_until < ?) ORDER BY created_at", (now,)
+                ).fetchall()
+                db.executemany(
+                    "UPDATE jobs SET status = 'queued', owner = ?, lease_until = ?, updated_at = ? WHERE job_id = ?",
+                    [(owner, now + lease, now, row[0]) for row in rows],
+                )
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+        return [(job_id, json.loads(payload), callback_url) for job_id, payload, callback_url in rows]
+
+    def get(self, job_id: str) -> dict:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT job_id, offense_id, status, result, error, callback_url, created_at, updated_at "
+                "FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row[0],
+            "offense_id": row[1],
+            "status": row[2],
+            "result": json.loads(row[3]) if row[3] else None,
+            "error": row[4],
+            "callback_url": row[5],
+            "created_at": row[6],
+            "updated_at": row[7],
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+class JobQueue:
+    """
+    Bounded background worker pool for asynchronous offense processing.
+    Jobs are persisted (owned and leased by this queue) before they are
+    queued. A heartbeat renews the lease and takes over jobs from queues
+    that stopped renewing theirs, so neither a restart nor a dead worker
+    loses in-flight offenses, and a live worker's jobs are never run twice.
+    """
+
+    def __init__(self, handler, store: JobStore = None, workers: int = JOB_WORKERS,
+                 lease: float = JOB_LEASE_SECONDS):
+        self.handler = handler
+        self.store = store or JobStore()
+        self.workers = workers
+        self.lease = lease
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue = None
+        self._tasks = []
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        await self._recover()
+        self._tasks = [asyncio.create_task(self._worker(), name=f"job-worker-{i}") for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._heartbeat(), name="job-heartbeat"))
+
+    async def _recover(self) -> None:
+        recovered = await asyncio.to_thread(self.store.recover, self.owner, self.lease)
+        for job in recovered:
+            self._queue.put_nowait(job)
+        if recovered:
+            print(f"[JobQueue] Recovered {len(recovered)} unfinished job(s) with expired leases")
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await asyncio.to_thread(self.store.renew, self.owner, self.lease)
+                await self._recover()
+            except sqlite3.Error as e:
+                print(f"[JobQueue] Heartbeat failed: {e}")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._tasks:
+            released = self.store.release(self.owner)
+            if released:
+                print(f"[JobQueue] Released {released} unfinished job(s) for other workers")
+        self._tasks = []
+        self.store.close()
+
+    async def submit(self, offense: dict, callback_url: str = None) -> dict:
+        if not self._tasks:
+            await self.start()
+        job = await asyncio.to_thread(self.store.create, offense, callback_url, self.owner, self.lease)
+        await self._queue.put((job["job_id"], offense, callback_url))
+        job["queue_depth"] = self._queue.qsize()
+        return job
+
+    async def get(self, job_id: str) -> dict:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def join(self) -> None:
+        """Wait until every queued job has been processed."""
+        await self._queue.join()
+
+    async def _worker(self) -> None:
+        while True:
+            job_id, offense, callback_url = await self._queue.get()
+            try:
+                await self._run(job_id, offense, callback_url)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str, offense: dict, callback_url: str) -> None:
+        if not await asyncio.to_thread(self.store.claim, job_id, self.owner, self.lease):
+            print(f"[JobQueue] Job {job_id} is owned by another worker, skipping")
+            return
+        try:
+            result = await self.handler(offense)
+            status, error = "completed", None
+        except Exception as e:
+            print(f"[JobQueue] Job {job_id} failed: {e}")
+            result, status, error = None, "failed", f"Error processing offense: {str(e)}"
+        if not await asyncio.to_thread(self.store.update, job_id, status, result, error, self.owner):
+            # Our lease lapsed and another worker took the job over; it reports instead
+            print(f"[JobQueue] Lost the lease on job {job_id}, dropping its result")
+            return
+
+        if callback_url:
+            await self._notify(callback_url, {"job_id": job_id, "status": status, "result": result, "error": error})
+
+    async def _notify(self, callback_url: str, body: dict) -> None:
+        try:
+            async with httpx.AsyncClient(timeout=JOB_CALLBACK_TIMEOUT) as client:
+                response = await client.post(
+                    callback_url,
+                    content=json.dumps(body, default=str),
+                    headers={"Content-Type": "application/json"},
+                )
+                response.raise_for_status()
+        except httpx.HTTPError as e:
+            print(f"[JobQueue] Callback to {callback_url} failed: {e}")
@@ -1,28 +1,21 @@
 # app/utils/log_writer.py
 
 import os
+from app.utils.output_writer import get_writer
 
 def save_log_instructions(offense_id: str, instructions: str, base_dir: str = "logs/instructions") -> str:
     """
-    Saves the given log investigation instructions into a .txt file.
-    
+    Queues the given log investigation instructions for writing to a .txt file.
+    The file is replaced atomically by the background output writer.
+
     Args:
         offense_id (str): Unique offense ID or timestamp.
         instructions (str): Plaintext instructions generated by the model.
         base_dir (str): Directory to save the logs (default: logs/instructions).
 
     Returns:
-        str: Path to the saved file or None if an error occurs.
+        str: Path the file will be written to.
     """
-    try:
-        os.makedirs(base_dir, exist_ok=True)
-        filename = f"offense_{offense_id}.txt"
-        filepath = os.path.join(base_dir, filename)
-
-        with open(filepath, "w") as f:
-            f.write(instructions)
-
-        return filepath
-    except OSError as e:
-        print(f"Error writing log instructions for offense {offense_id}: {e}")
-        return None
+    filepath = os.path.join(base_dir, f"offense_{offense_id}.txt")
+    get_writer().write_file(filepath, instructions)
+    return filepath
@@ -0,0 +1,169 @@
+# app/utils/metrics.py
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+# Latency buckets (seconds) sized for sub-ms cache hits up to slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_metrics = []
+_collectors: List[Callable] = []
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in items]
+
+class Histogram(Counter):
+    """Cumulative-bucket latency histogram with optional labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series["buckets"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of the enclosed block (also when it raises)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._values.get(self._key(labels))
+            return series["count"] if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, dict(series, buckets=list(series["buckets"]))) for key, series in self._values.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            bounds = [_number(bound) for bound in self.buckets] + ["+Inf"]
+            counts = series["buckets"] + [series["count"] - sum(series["buckets"])]
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(series['sum'])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {series['count']}")
+        return lines
+
+def register_collector(func: Callable) -> None:
+    """
+    Register a callable evaluated at scrape time. It returns a list of
+    (name, type, help, [(labels dict, value), ...]) for stats that already
+    live elsewhere, such as cache hit counts.
+    """
+    _collectors.append(func)
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (0.0.4)."""
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    for collector in _collectors:
+        try:
+            families = collector()
+        except Exception as e:
+            print(f"[Metrics] Collector failed: {e}")
+            continue
+        for name, kind, help_text, samples in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                names = tuple(labels)
+                lines.append(f"{name}{_labels(names, tuple(labels[n] for n in names))} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+# Offense pipeline
+OFFENSE_SECONDS = Histogram("nuvex_offense_duration_seconds", "End-to-end handle_offense latency.")
+OFFENSES = Counter("nuvex_offenses_total", "Offenses handled, by decision.", ("decision",))
+STAGE_SECONDS = Histogram("nuvex_stage_duration_seconds", "Latency of each offense pipeline stage.", ("stage",))
+STAGE_ERRORS = Counter("nuvex_stage_errors_total", "Pipeline stages that raised.", ("stage",))
+STAGE_SKIPPED = Counter("nuvex_stage_skipped_total", "Pipeline stages skipped by their stage policy.", ("stage",))
+OFFENSES_COALESCED = Counter("nuvex_offenses_coalesced_total",
+                             "Duplicate offenses answered by another run (in_flight or result_cache).", ("via",))
+
+# Threat intelligence
+REPUTATION_SECONDS = Histogram("nuvex_reputation_request_duration_seconds",
+                               "Latency of reputation provider API calls (cache misses only).", ("provider",))
+REPUTATION_LOOKUPS = Counter("nuvex_reputation_lookups_total",
+                             "Reputation lookups by provider and outcome (hit, negative_hit, ok, error, no_key).",
+                             ("provider", "outcome"))
+
+# LLM calls
+LLM_SECONDS = Histogram("nuvex_llm_request_duration_seconds",
+                        "LLM call latency by provider and call site, including rate-limit wait.", ("provider", "site"))
+LLM_CALLS = Counter("nuvex_llm_calls_total", "LLM calls by provider, call site and outcome (ok, error, cache_hit).",
+                    ("provider", "site", "outcome"))
+LLM_FALLBACKS = Counter("nuvex_llm_fallbacks_total", "Fallbacks to the secondary provider, by outcome.",
+                        ("from_provider", "to_provider", "outcome"))
+LLM_TOKENS = Counter("nuvex_llm_tokens_total", "Tokens reported by the providers, by kind (prompt, completion).",
+                     ("provider", "kind"))
+RATE_LIMIT_WAIT_SECONDS = Histogram("nuvex_rate_limit_wait_seconds",
+                                    "Time spent waiting for LLM request/token budget.", ("provider",))
+
+# Memory search
+MEMORY_SEARCH_SECONDS = Histogram("nuvex_memory_search_duration_seconds",
+                                  "Similar-case scoring latency, by path (prefiltered or full scan).", ("path",))
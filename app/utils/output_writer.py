@@ -0,0 +1,242 @@
+# app/utils/output_writer.py
+
+import atexit
+import datetime
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+# Render reports, log instructions and false-positive notes as text files
+# (the result store always has them)
+TEXT_EXPORT = os.getenv("RESULT_TEXT_EXPORT", "true").lower() == "true"
+# "always": fsync data and the directory entry before a record counts as written;
+# "batch": fsync each file's data once per batch; "never": leave it to the OS
+OUTPUT_FSYNC = os.getenv("OUTPUT_FSYNC", "batch").lower()
+OUTPUT_BATCH_MAX = int(os.getenv("OUTPUT_BATCH_MAX", "256"))
+# How long the writer waits for more records before writing a batch
+OUTPUT_BATCH_WAIT_MS = float(os.getenv("OUTPUT_BATCH_WAIT_MS", "20"))
+# Rotate append-only files (false-positive notes) past this size (0 disables) and/or at midnight
+NOTES_ROTATE_BYTES = int(os.getenv("NOTES_ROTATE_BYTES", str(10 * 2 ** 20)))
+NOTES_ROTATE_DAILY = os.getenv("NOTES_ROTATE_DAILY", "false").lower() == "true"
+
+class _Lock:
+    """Exclusive flock on `<path>.lock`, so appends and rotation are atomic across workers."""
+
+    def __init__(self, path: str):
+        self.path = path + ".lock"
+        self._fd = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+def _fsync_dir(directory: str) -> None:
+    try:
+        fd = os.open(directory or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+class OutputWriter:
+    """
+    Single background thread that owns report, note and instruction files.
+    Callers hand over records without blocking and get a Future that
+    resolves once the record is written (and fsynced, per policy). The
+    thread drains records into batches: whole files are written to a temp
+    file and renamed into place, appends to the same file are joined into
+    one write under a cross-process lock, with size/date rotation.
+    """
+
+    def __init__(self, fsync: str = OUTPUT_FSYNC, batch_max: int = OUTPUT_BATCH_MAX,
+                 batch_wait_ms: float = OUTPUT_BATCH_WAIT_MS, rotate_bytes: int = NOTES_ROTATE_BYTES,
+                 rotate_daily: bool = NOTES_ROTATE_DAILY):
+        if fsync not in ("always", "batch", "never"):
+            raise ValueError(f"fsync policy must be always, batch or never, not '{fsync}'")
+        self.fsync = fsync
+        self.batch_max = max(1, batch_max)
+        self.batch_wait = batch_wait_ms / 1000
+        self.rotate_bytes = rotate_bytes
+        self.rotate_daily = rotate_daily
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {"records": 0, "batches": 0, "bytes": 0, "errors": 0, "rotations": 0}
+
+    def _submit(self, kind: str, path: str, text: str) -> Future:
+        future = Future()
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="nuvex-output-writer", daemon=True)
+                self._thread.start()
+            self._queue.put((kind, path, text, future))
+        return future
+
+    def write_file(self, path: str, content: str) -> Future:
+        """Replace `path` atomically with `content`."""
+        return self._submit("file", path, content)
+
+    def append(self, path: str, text: str) -> Future:
+        """Append `text` to `path` (rotated by size/date)."""
+        return self._submit("append", path, text)
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until every record submitted so far is written; False on timeout."""
+        marker = Future()
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                return True
+            self._queue.put(("flush", None, None, marker))
+        try:
+            marker.result(timeout)
+            return True
+        except FutureTimeout:
+            return False
+
+    def close(self, timeout: float = 10) -> None:
+        """Flush pending records and stop the writer thread."""
+        with self._lock:
+            thread = self._thread
+            if thread is None or not thread.is_alive():
+                return
+            self._queue.put(None)
+        thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            record = self._queue.get()
+            if record is None:
+                return
+            batch = [record]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_max:
+                try:
+                    record = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if record is None:
+                    self._write_batch(batch)
+                    return
+                batch.append(record)
+            self._write_batch(batch)
+
+    def _write_batch(self, batch: list) -> None:
+        files, appends, markers = {}, {}, []
+        for kind, path, text, future in batch:
+            if kind == "file":
+                # A later write to the same file supersedes earlier ones
+                files.setdefault(path, []).append((text, future))
+            elif kind == "append":
+                appends.setdefault(path, []).append((text, future))
+            else:
+                markers.append(future)
+
+        for path, records in files.items():
+            self._finish(records, self._replace, path, records[-1][0])
+        for path, records in appends.items():
+            self._finish(records, self._append, path, "".join(text for text, _ in records))
+        self.stats["batches"] += 1
+        for marker in markers:
+            marker.set_result(True)
+
+    def _finish(self, records: list, write, path: str, text: str) -> None:
+        try:
+            write(path, text)
+        except Exception as e:
+            self.stats["errors"] += len(records)
+            print(f"[OutputWriter] Failed to write {path}: {e}")
+            for _, future in records:
+                future.set_exception(e)
+            return
+        self.stats["records"] += len(records)
+        self.stats["bytes"] += len(text.encode("utf-8"))
+        for _, future in records:
+            future.set_result(path)
+
+    def _replace(self, path: str, content: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(content)
+            if self.fsync != "never":
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        if self.fsync == "always":
+            _fsync_dir(directory)
+
+    def _append(self, path: str, text: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with _Lock(path):
+            self._maybe_rotate(path, len(text.encode("utf-8")))
+            with open(path, "a") as f:
+                f.write(text)
+                if self.fsync != "never":
+                    f.flush()
+                    os.fsync(f.fileno())
+
+    def _maybe_rotate(self, path: str, incoming: int) -> None:
+        # Caller holds the file lock, so only one worker rotates
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return
+        if not stat.st_size:
+            return
+        modified = datetime.date.fromtimestamp(stat.st_mtime)
+        if self.rotate_daily and modified != datetime.date.today():
+            suffix = modified.strftime("%Y%m%d")
+        elif self.rotate_bytes and stat.st_size + incoming > self.rotate_bytes:
+            suffix = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        else:
+            return
+        base, ext = os.path.splitext(path)
+        target, n = f"{base}.{suffix}{ext}", 1
+        while os.path.exists(target):
+            target, n = f"{base}.{suffix}-{n}{ext}", n + 1
+        os.replace(path, target)
+        self.stats["rotations"] += 1
+        print(f"[OutputWriter] Rotated {path} -> {target}")
+
+    def get_stats(self) -> dict:
+        return {"fsync": self.fsync, "pending": self._queue.qsize(), **self.stats}
+
+_writer = None
+
+def get_writer() -> OutputWriter:
+    """Return the process-wide output writer."""
+    global _writer
+    if _writer is None:
+        _writer = OutputWriter()
+    return _writer
+
+def close_writer() -> None:
+    """Flush and stop the writer (used on application shutdown)."""
+    if _writer is not None:
+        _writer.close()
+
+# Scripts and benchmarks exit without the app's shutdown hook
+atexit.register(close_writer)
@@ -0,0 +1,144 @@
+# app/utils/prompt_cache.py
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Cache configuration from environment
+CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "true").lower() == "true"
+CACHE_PATH = os.getenv("PROMPT_CACHE_PATH", "cache/prompt_cache.db")
+MEMORY_SIZE = int(os.getenv("PROMPT_CACHE_SIZE", "2000"))
+MAX_ENTRIES = int(os.getenv("PROMPT_CACHE_MAX_ENTRIES", "50000"))
+CACHE_TTL = int(os.getenv("PROMPT_CACHE_TTL", "86400"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so formatting-only differences share an entry."""
+    return _WHITESPACE.sub(" ", prompt).strip()
+
+def make_key(provider: str, model: str, params: dict, prompt: str, system: str = "") -> str:
+    """Hash of provider, model, generation parameters, system prompt and normalized prompt."""
+    payload = json.dumps([provider, model, params, system, normalize_prompt(prompt)], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class PromptCache:
+    """
+    LLM response cache: an in-process LRU in front of a SQLite file shared
+    by every worker. Entries expire after `ttl` seconds and the disk tier is
+    trimmed to `max_entries`, oldest first.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, memory_size: int = MEMORY_SIZE,
+                 max_entries: int = MAX_ENTRIES, ttl: int = CACHE_TTL):
+        self.path = path
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._puts_since_trim = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS prompt_cache ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                "created_at REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS idx_prompt_cache_created ON prompt_cache (created_at)")
+            db.commit()
+            self._db = db
+        return self._db
+
+    def _remember(self, key: str, response: str, expires_at: float) -> None:
+        self._memory[key] = (response, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str):
+        """Return the cached response for key, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return entry[0]
+                del self._memory[key]
+
+            row = self._connect().execute(
+                "SELECT response, expires_at FROM prompt_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[1] > now:
+                self._remember(key, row[0], row[1])
+                self.stats["disk_hits"] += 1
+                return row[0]
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: str, response: str) -> None:
+        if response.startswith("Error:"):
+            return
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._remember(key, response, expires_at)
+            self.stats["stores"] += 1
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO prompt_cache (key, response, created_at, expires_at) VALUES (?, ?, ?, ?)",
+                (key, response, now, expires_at),
+            )
+            self._puts_since_trim += 1
+            if self._puts_since_trim >= 100:
+                self._trim(db, now)
+            db.commit()
+
+    def _trim(self, db: sqlite3.Connection, now: float) -> None:
+        self._puts_since_trim = 0
+        db.execute("DELETE FROM prompt_cache WHERE expires_at <= ?", (now,))
+        db.execute(
+            "DELETE FROM prompt_cache WHERE key IN ("
+            "SELECT key FROM prompt_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 3) if lookups else 0.0
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+_cache = None
+
+def get_cache() -> PromptCache:
+    """Return the process-wide prompt cache."""
+    global _cache
+    if _cache is None:
+        _cache = PromptCache()
+    return _cache
@@ -0,0 +1,193 @@
+# app/utils/rate_limiter.py
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from app.utils import metrics
+
+# Shared state backend: "sqlite" coordinates every worker process on this
+# host through one file; "memory" limits each process on its own.
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "sqlite").lower()
+RATE_LIMIT_PATH = os.getenv("RATE_LIMIT_PATH", "cache/rate_limits.db")
+
+# Per-provider budgets. A rate of 0 disables that budget.
+PROVIDER_LIMITS = {
+    "gemini": {
+        "rpm": float(os.getenv("GEMINI_RPM", "15")),
+        "tpm": float(os.getenv("GEMINI_TPM", "1000000")),
+        "request_burst": float(os.getenv("GEMINI_REQUEST_BURST", "1")),
+    },
+    "openai": {
+        "rpm": float(os.getenv("OPENAI_RPM", "0")),
+        "tpm": float(os.getenv("OPENAI_TPM", "0")),
+        "request_burst": float(os.getenv("OPENAI_REQUEST_BURST", "10")),
+    },
+}
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token) used for the token budget."""
+    return max(1, len(text) // 4)
+
+def _budgets(limits: dict) -> dict:
+    """Map budget name -> (capacity, refill per second) for the enabled budgets."""
+    budgets = {}
+    if limits.get("rpm", 0) > 0:
+        capacity = max(1.0, min(limits.get("request_burst", 1), limits["rpm"]))
+        budgets["requests"] = (capacity, limits["rpm"] / 60.0)
+    if limits.get("tpm", 0) > 0:
+        budgets["tokens"] = (limits["tpm"], limits["tpm"] / 60.0)
+    return budgets
+
+def _take(state: dict, budgets: dict, costs: dict, now: float) -> float:
+    """
+    Refill each bucket in `state` (name -> [level, updated_at]) and take
+    `costs` if every bucket can afford it. Returns 0 on success, otherwise
+    the seconds until the scarcest bucket will have refilled enough.
+    """
+    wait = 0.0
+    for name, (capacity, rate) in budgets.items():
+        level, updated_at = state.get(name, (capacity, now))
+        level = min(capacity, level + max(0.0, now - updated_at) * rate)
+        state[name] = [level, now]
+        cost = min(costs.get(name, 0), capacity)
+        if level < cost:
+            wait = max(wait, (cost - level) / rate)
+    if wait == 0.0:
+        for name in budgets:
+            state[name][0] -= min(costs.get(name, 0), budgets[name][0])
+    return wait
+
+class MemoryBackend:
+    """Token buckets held in this process only."""
+
+    def __init__(self):
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, budgets: dict, costs: dict) -> float:
+        with self._lock:
+            state = self._state.setdefault(key, {})
+            return _take(state, budgets, costs, time.time())
+
+class SQLiteBackend:
+    """
+    Token buckets stored in a SQLite file so all worker processes draw from
+    the same budget. Each take runs in one IMMEDIATE transaction.
+    """
+
+    def __init__(self, path: str = RATE_LIMIT_PATH):
+        self.path = path
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS rate_buckets ("
+                "bucket TEXT NOT NULL, budget TEXT NOT NULL, level REAL NOT NULL, "
+                "updated_at REAL NOT NULL, PRIMARY KEY (bucket, budget))"
+            )
+            self._db = db
+        return self._db
+
+    def take(self, key: str, budgets: dict, costs: dict) -> float:
+        with self._lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = db.execute(
+                    "SELECT budget, level, updated_at FROM rate_buckets WHERE bucket = ?", (key,)
+                ).fetchall()
+                state = {budget: [level, updated_at] for budget, level, updated_at in rows}
+                wait = _take(state, budgets, costs, time.time())
+                db.executemany(
+                    "INSERT OR REPLACE INTO rate_buckets (bucket, budget, level, updated_at) VALUES (?, ?, ?, ?)",
+                    [(key, name, level, updated_at) for name, (level, updated_at) in state.items()],
+                )
+                db.execute("COMMIT")
+                return wait
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+class RateLimiter:
+    """
+    Async token-bucket limiter with separate request and token budgets per
+    provider, model and API key. Waiters for one bucket queue on a FIFO
+    asyncio lock, so they are served in arrival order without blocking the
+    event loop.
+    """
+
+    def __init__(self, backend=None, limits: dict = None):
+        self.backend = backend or (SQLiteBackend() if RATE_LIMIT_BACKEND == "sqlite" else MemoryBackend())
+        self.limits = limits if limits is not None else PROVIDER_LIMITS
+        self._locks = {}
+        self._stats = {}
+
+    @staticmethod
+    def bucket_key(provider: str, model: str, api_key: str = "") -> str:
+        key_hash = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:12]
+        return f"{provider}:{model}:{key_hash}"
+
+    def _queue_lock(self, key: str) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        lock_key = (id(loop), key)
+        lock = self._locks.get(lock_key)
+        if lock is None:
+            lock = self._locks[lock_key] = asyncio.Lock()
+        return lock
+
+    async def acquire(self, provider: str, model: str, api_key: str = "", tokens: int = 0) -> float:
+        """
+        Wait until the bucket for provider/model/key can afford one request
+        and `tokens` tokens, then take them. Returns the seconds spent waiting.
+        """
+        budgets = _budgets(self.limits.get(provider, {}))
+        if not budgets:
+            return 0.0
+
+        key = self.bucket_key(provider, model, api_key)
+        costs = {"requests": 1, "tokens": tokens}
+        started = time.perf_counter()
+        async with self._queue_lock(key):
+            while True:
+                wait = await asyncio.to_thread(self.backend.take, key, budgets, costs)
+                if wait <= 0:
+                    break
+                print(f"[RateLimiter] {provider}/{model} over budget, waiting {wait:.1f}s")
+                await asyncio.sleep(wait)
+        waited = time.perf_counter() - started
+        metrics.RATE_LIMIT_WAIT_SECONDS.observe(waited, provider=provider)
+
+        stats = self._stats.setdefault(f"{provider}:{model}", {"acquired": 0, "total_wait": 0.0, "max_wait": 0.0})
+        stats["acquired"] += 1
+        stats["total_wait"] = round(stats["total_wait"] + waited, 3)
+        stats["max_wait"] = round(max(stats["max_wait"], waited), 3)
+        return waited
+
+    def get_stats(self) -> dict:
+        return {name: dict(values) for name, values in self._stats.items()}
+
+_limiter = None
+
+def get_limiter() -> RateLimiter:
+    """Return the process-wide rate limiter."""
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter()
+    return _limiter
@@ -1,15 +1,76 @@
 # app/utils/reputation.py
-import requests
+import asyncio
+import httpx
 import os
 
-def check_ip_abuseipdb(ip: str) -> dict:
+from app.utils import cassette, metrics
+from app.utils.reputation_cache import cached_lookup
+
+# Connection pool and fan-out limits for threat-intel lookups
+REPUTATION_TIMEOUT = float(os.getenv("REPUTATION_TIMEOUT", "5"))
+REPUTATION_DEADLINE = float(os.getenv("REPUTATION_DEADLINE", "10"))
+REPUTATION_CONCURRENCY = int(os.getenv("REPUTATION_CONCURRENCY", "16"))
+REPUTATION_MAX_CONNECTIONS = int(os.getenv("REPUTATION_MAX_CONNECTIONS", "32"))
+ABUSEIPDB_BASE_URL = os.getenv("ABUSEIPDB_BASE_URL", "https://api.abuseipdb.com/api/v2")
+VIRUSTOTAL_BASE_URL = os.getenv("VIRUSTOTAL_BASE_URL", "https://www.virustotal.com/api/v3")
+
+# One keep-alive client and concurrency semaphore per event loop, since
+# httpx connections are bound to the loop that opened them
+_clients = {}
+_closing = set()
+
+async def _close_quietly(client: httpx.AsyncClient) -> None:
     try:
-        api_key = os.getenv("ABUSEIPDB_API_KEY")
-        if not api_key:
-            return {"ip": ip, "abuse_confidence": 0, "reports": 0, "country": "N/A", "isp": "N/A"}
-        url = f"https://api.abuseipdb.com/api/v2/check?ipAddress={ip}"
+        await client.aclose()
+    except Exception as e:
+        print(f"[Reputation] Failed to close HTTP client: {e}")
+
+def _get_client() -> tuple:
+    """
+    Return the shared client and semaphore for the running event loop,
+    creating them on first use. Clients of loops that have since closed
+    are closed on this one instead of being dropped with open connections.
+    """
+    loop = asyncio.get_running_loop()
+    entry = _clients.get(loop)
+    if entry is None:
+        for stale in [other for other in _clients if other.is_closed()]:
+            task = loop.create_task(_close_quietly(_clients.pop(stale)[0]))
+            _closing.add(task)
+            task.add_done_callback(_closing.discard)
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(REPUTATION_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=REPUTATION_MAX_CONNECTIONS,
+                max_keepalive_connections=REPUTATION_MAX_CONNECTIONS,
+            ),
+        )
+        entry = _clients[loop] = (client, asyncio.Semaphore(REPUTATION_CONCURRENCY))
+    return entry
+
+async def close_client() -> None:
+    """Close every pooled client (used on application shutdown)."""
+    clients = [client for client, _ in _clients.values()]
+    _clients.clear()
+    for client in clients:
+        await _close_quietly(client)
+
+async def _get(url: str, headers: dict) -> httpx.Response:
+    client, semaphore = _get_client()
+    async with semaphore:
+        return await client.get(url, headers=headers)
+
+async def check_ip_abuseipdb(ip: str) -> dict:
+    fallback = {"ip": ip, "abuse_confidence": 0, "reports": 0, "country": "N/A", "isp": "N/A"}
+    api_key = os.getenv("ABUSEIPDB_API_KEY")
+    if not api_key:
+        metrics.REPUTATION_LOOKUPS.inc(provider="abuseipdb", outcome="no_key")
+        return fallback
+
+    async def fetch() -> dict:
+        url = f"{ABUSEIPDB_BASE_URL}/check?ipAddress={ip}"
         headers = {"Key": api_key, "Accept": "application/json"}
-        response = requests.get(url, headers=headers)
+        response = await _get(url, headers)
         response.raise_for_status()
         data = response.json().get("data", {})
         return {
@@ -19,17 +80,20 @@ def check_ip_abuseipdb(ip: str) -> dict:
             "country": data.get("countryCode", "N/A"),
             "isp": data.get("isp", "N/A")
         }
-    except requests.RequestException:
-        return {"ip": ip, "abuse_confidence": 0, "reports": 0, "country": "N/A", "isp": "N/A"}
 
-def check_virustotal(ioc: str) -> dict:
-    try:
-        api_key = os.getenv("VIRUSTOTAL_API_KEY")
-        if not api_key:
-            return {"ioc": ioc, "malicious_votes": 0, "suspicious_votes": 0}
-        url = f"https://www.virustotal.com/api/v3/urls" if "http" in ioc else f"https://www.virustotal.com/api/v3/ip_addresses/{ioc}"
+    return await cached_lookup("abuseipdb", ip, fetch, fallback, (httpx.HTTPError, ValueError))
+
+async def check_virustotal(ioc: str) -> dict:
+    fallback = {"ioc": ioc, "malicious_votes": 0, "suspicious_votes": 0}
+    api_key = os.getenv("VIRUSTOTAL_API_KEY")
+    if not api_key:
+        metrics.REPUTATION_LOOKUPS.inc(provider="virustotal", outcome="no_key")
+        return fallback
+
+    async def fetch() -> dict:
+        url = f"{VIRUSTOTAL_BASE_URL}/urls" if "http" in ioc else f"{VIRUSTOTAL_BASE_URL}/ip_addresses/{ioc}"
         headers = {"x-apikey": api_key}
-        response = requests.get(url, headers=headers)
+        response = await _get(url, headers)
         response.raise_for_status()
         data = response.json().get("data", {}).get("attributes", {})
         return {
@@ -37,15 +101,72 @@ def check_virustotal(ioc: str) -> dict:
             "malicious_votes": data.get("last_analysis_stats", {}).get("malicious", 0),
             "suspicious_votes": data.get("last_analysis_stats", {}).get("suspicious", 0)
         }
-    except requests.RequestException:
-        return {"ioc": ioc, "malicious_votes": 0, "suspicious_votes": 0}
 
-def get_reputation(ioc: str) -> dict:
-    """Combines reputation data from AbuseIPDB and VirusTotal for an IP or URL."""
-    abuseipdb_result = check_ip_abuseipdb(ioc) if not ioc.startswith("http") else {}
-    virustotal_result = check_virustotal(ioc)
+    return await cached_lookup("virustotal", ioc, fetch, fallback, (httpx.HTTPError, ValueError))
+
+def empty_reputation(ioc: str) -> dict:
+    """Placeholder result used when a lookup fails or misses the deadline."""
     return {
         "ioc": ioc,
-        "abuseipdb": abuseipdb_result,
-        "virustotal": virustotal_result
+        "abuseipdb": {"abuse_confidence": 0, "reports": 0},
+        "virustotal": {"malicious_votes": 0, "suspicious_votes": 0}
     }
+
+async def get_reputation(ioc: str, partial: dict = None) -> dict:
+    """
+    Combines reputation data from AbuseIPDB and VirusTotal for an IP or URL.
+    Each provider's result is also stored in `partial` as soon as it arrives.
+    """
+    if cassette.enabled():
+        return await cassette.through_cassette(
+            "reputation", cassette.fingerprint("reputation", ioc), {"ioc": ioc},
+            lambda: lookup_reputation(ioc, partial)
+        )
+    return await lookup_reputation(ioc, partial)
+
+async def lookup_reputation(ioc: str, partial: dict = None) -> dict:
+    """Live (cached) lookup against both providers."""
+    results = partial if partial is not None else {}
+
+    async def run(provider: str, check) -> None:
+        results[provider] = await check(ioc)
+
+    if ioc.startswith("http"):
+        results["abuseipdb"] = {}
+        await run("virustotal", check_virustotal)
+    else:
+        await asyncio.gather(run("abuseipdb", check_ip_abuseipdb), run("virustotal", check_virustotal))
+    return {
+        "ioc": ioc,
+        "abuseipdb": results["abuseipdb"],
+        "virustotal": results["virustotal"]
+    }
+
+async def get_reputations(iocs: list, deadline: float = REPUTATION_DEADLINE) -> list:
+    """
+    Look up every IOC concurrently (bounded by REPUTATION_CONCURRENCY) and
+    return results in input order. Lookups still pending when the deadline
+    expires are cancelled; they keep the providers that already answered,
+    with placeholders for the rest.
+    """
+    unique_iocs = list(dict.fromkeys(iocs))
+    partial = {ioc: {} for ioc in unique_iocs}
+    tasks = {ioc: asyncio.create_task(get_reputation(ioc, partial[ioc])) for ioc in unique_iocs}
+    if not tasks:
+        return []
+
+    done, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+    for task in pending:
+        task.cancel()
+    if pending:
+        print(f"[Reputation] Deadline of {deadline}s reached, {len(pending)} lookup(s) cancelled")
+
+    results = {}
+    for ioc, task in tasks.items():
+        if task in done and task.exception() is None:
+            results[ioc] = task.result()
+        else:
+            if task in done:
+                print(f"[Reputation] Failed to get reputation for {ioc}: {task.exception()}")
+            results[ioc] = {**empty_reputation(ioc), **partial[ioc]}
+    return [results[ioc] for ioc in iocs]
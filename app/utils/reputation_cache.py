@@ -0,0 +1,181 @@
+# app/utils/reputation_cache.py
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from app.utils import metrics
+
+# Cache configuration from environment
+CACHE_ENABLED = os.getenv("REPUTATION_CACHE_ENABLED", "true").lower() == "true"
+CACHE_PATH = os.getenv("REPUTATION_CACHE_PATH", "cache/reputation_cache.db")
+MEMORY_SIZE = int(os.getenv("REPUTATION_CACHE_SIZE", "10000"))
+NEGATIVE_TTL = int(os.getenv("REPUTATION_NEGATIVE_TTL", "300"))
+PROVIDER_TTLS = {
+    "abuseipdb": int(os.getenv("REPUTATION_TTL_ABUSEIPDB", "21600")),
+    "virustotal": int(os.getenv("REPUTATION_TTL_VIRUSTOTAL", "86400")),
+}
+DEFAULT_TTL = 3600
+
+class ReputationCache:
+    """
+    Two-tier TTL cache for threat-intel lookups: an in-process LRU in front of
+    a SQLite file shared by every worker process. Failed lookups are cached
+    for NEGATIVE_TTL seconds so a flapping provider is not hammered.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, memory_size: int = MEMORY_SIZE):
+        self.path = path
+        self.memory_size = memory_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "negative_hits": 0, "errors_cached": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS reputation_cache ("
+                "provider TEXT NOT NULL, ioc TEXT NOT NULL, value TEXT, "
+                "negative INTEGER NOT NULL, expires_at REAL NOT NULL, "
+                "PRIMARY KEY (provider, ioc))"
+            )
+            db.commit()
+            self._db = db
+        return self._db
+
+    def _remember(self, key: tuple, entry: tuple) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, provider: str, ioc: str):
+        """
+        Return (found, negative, value). Checks memory first, then disk,
+        promoting disk hits into memory.
+        """
+        key = (provider, ioc)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[2] > now:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    if entry[0]:
+                        self.stats["negative_hits"] += 1
+                    return True, entry[0], entry[1]
+                del self._memory[key]
+
+            row = self._connect().execute(
+                "SELECT value, negative, expires_at FROM reputation_cache WHERE provider = ? AND ioc = ?",
+                key,
+            ).fetchone()
+            if row is not None and row[2] > now:
+                negative = bool(row[1])
+                value = json.loads(row[0]) if row[0] else None
+                self._remember(key, (negative, value, row[2]))
+                self.stats["disk_hits"] += 1
+                if negative:
+                    self.stats["negative_hits"] += 1
+                return True, negative, value
+
+            self.stats["misses"] += 1
+            return False, False, None
+
+    def put(self, provider: str, ioc: str, value, negative: bool = False) -> None:
+        ttl = NEGATIVE_TTL if negative else PROVIDER_TTLS.get(provider, DEFAULT_TTL)
+        expires_at = time.time() + ttl
+        key = (provider, ioc)
+        with self._lock:
+            self._remember(key, (negative, value, expires_at))
+            if negative:
+                self.stats["errors_cached"] += 1
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO reputation_cache (provider, ioc, value, negative, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (provider, ioc, None if negative else json.dumps(value), int(negative), expires_at),
+            )
+            db.commit()
+
+    def purge_expired(self) -> int:
+        """Drop expired rows from the disk tier. Returns the number removed."""
+        with self._lock:
+            db = self._connect()
+            cursor = db.execute("DELETE FROM reputation_cache WHERE expires_at <= ?", (time.time(),))
+            db.commit()
+            return cursor.rowcount
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 3) if lookups else 0.0
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+_cache = None
+
+def get_cache() -> ReputationCache:
+    """Return the process-wide reputation cache."""
+    global _cache
+    if _cache is None:
+        _cache = ReputationCache()
+    return _cache
+
+async def cached_lookup(provider: str, ioc: str, fetch, fallback: dict, errors: tuple) -> dict:
+    """
+    Serve provider/ioc from the cache, or await fetch() and cache the result.
+    Exceptions listed in `errors` are cached negatively and answered with
+    `fallback`, matching the providers' existing error behaviour.
+    """
+    async def timed_fetch() -> dict:
+        started = time.perf_counter()
+        try:
+            result = await fetch()
+        except errors:
+            metrics.REPUTATION_LOOKUPS.inc(provider=provider, outcome="error")
+            raise
+        finally:
+            metrics.REPUTATION_SECONDS.observe(time.perf_counter() - started, provider=provider)
+        metrics.REPUTATION_LOOKUPS.inc(provider=provider, outcome="ok")
+        return result
+
+    if not CACHE_ENABLED:
+        try:
+            return await timed_fetch()
+        except errors:
+            return fallback
+
+    cache = get_cache()
+    found, negative, value = await asyncio.to_thread(cache.get, provider, ioc)
+    if found:
+        metrics.REPUTATION_LOOKUPS.inc(provider=provider, outcome="negative_hit" if negative else "hit")
+        return fallback if negative else value
+
+    try:
+        value = await timed_fetch()
+    except errors as e:
+        print(f"[ReputationCache] {provider} lookup failed for {ioc}, caching error for {NEGATIVE_TTL}s: {e}")
+        await asyncio.to_thread(cache.put, provider, ioc, None, True)
+        return fallback
+
+    await asyncio.to_thread(cache.put, provider, ioc, value)
+    return value
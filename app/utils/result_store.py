@@ -0,0 +1,245 @@
+# app/utils/result_store.py
+
+import base64
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+RESULT_STORE_ENABLED = os.getenv("RESULT_STORE_ENABLED", "true").lower() == "true"
+RESULT_STORE_PATH = os.getenv("RESULT_STORE_PATH", "cache/results.db")
+RESULT_PAGE_MAX = int(os.getenv("RESULT_PAGE_MAX", "500"))
+
+# Columns returned for each row of a listing (the full analysis is opt-in)
+SUMMARY_COLUMNS = ("offense_id", "decision", "risk_level", "risk_score", "offense_type", "description",
+                   "magnitude", "processed_at", "duplicate_of")
+
+def parse_time(value) -> float:
+    """Epoch seconds from epoch seconds or an ISO 8601 string (naive means UTC)."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parsed = datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+def _iso(epoch: float) -> str:
+    return datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc).isoformat()
+
+def _encode_cursor(processed_at: float, offense_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([processed_at, offense_id]).encode("utf-8")).decode("ascii")
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        processed_at, offense_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return float(processed_at), str(offense_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def _risk(analysis: dict) -> tuple:
+    """(level, score) from a risk_assessment string like 'HIGH (Score: 4, Factors: ...)'."""
+    text = analysis.get("risk_assessment") or ""
+    level = text.split(" ", 1)[0] or None
+    score = None
+    if "Score:" in text:
+        try:
+            score = float(text.split("Score:", 1)[1].split(",", 1)[0])
+        except ValueError:
+            pass
+    return level, score
+
+def _log_sources(analysis: dict) -> list:
+    sources = analysis.get("log_sources") or analysis.get("log_source") or []
+    return [sources] if isinstance(sources, str) else list(sources)
+
+class ResultStore:
+    """
+    Every analysis handle_offense returns, in one SQLite file shared by all
+    workers. The full analysis (and incident report, if any) is stored as
+    zlib-compressed JSON; the fields people filter on are columns, and
+    source IPs and log sources get their own indexed tables. Processing an
+    offense again replaces its row. A duplicate answered with another
+    offense's result (duplicate_of) gets a row of its own that points to
+    that offense's analysis and report instead of copying them.
+    """
+
+    def __init__(self, path: str = RESULT_STORE_PATH):
+        self.path = path
+        self._db = None
+        self._lock = threading.Lock()
+        self.stats = {"saved": 0, "queries": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "offense_id TEXT PRIMARY KEY, decision TEXT, risk_level TEXT, risk_score REAL, "
+                "offense_type TEXT, description TEXT, magnitude INTEGER, processed_at REAL NOT NULL, "
+                "analysis BLOB NOT NULL, report BLOB);"
+                "CREATE INDEX IF NOT EXISTS idx_results_time ON results (processed_at, offense_id);"
+                "CREATE INDEX IF NOT EXISTS idx_results_decision ON results (decision, processed_at);"
+                "CREATE INDEX IF NOT EXISTS idx_results_risk ON results (risk_level, processed_at);"
+                "CREATE TABLE IF NOT EXISTS result_source_ips (offense_id TEXT NOT NULL, ip TEXT NOT NULL, "
+                "PRIMARY KEY (ip, offense_id));"
+                "CREATE INDEX IF NOT EXISTS idx_result_source_ips_offense ON result_source_ips (offense_id);"
+                "CREATE TABLE IF NOT EXISTS result_log_sources (offense_id TEXT NOT NULL, log_source TEXT NOT NULL, "
+                "PRIMARY KEY (log_source, offense_id));"
+                "CREATE INDEX IF NOT EXISTS idx_result_log_sources_offense ON result_log_sources (offense_id);"
+            )
+            if "duplicate_of" not in {row[1] for row in db.execute("PRAGMA table_info(results)")}:
+                db.execute("ALTER TABLE results ADD COLUMN duplicate_of TEXT")
+            db.commit()
+            self._db = db
+        return self._db
+
+    def save(self, analysis: dict, report: str = None, processed_at: float = None) -> None:
+        offense_id = str(analysis["offense_id"])
+        processed_at = processed_at or time.time()
+        level, score = _risk(analysis)
+        duplicate_of = analysis.get("duplicate_of")
+        stored = analysis
+        if duplicate_of is not None:
+            # Filterable columns are kept; the analysis and report stay with the owner
+            duplicate_of = str(duplicate_of)
+            stored, report = {"offense_id": offense_id, "duplicate_of": duplicate_of}, None
+        blob = zlib.compress(json.dumps(stored, default=str).encode("utf-8"))
+        report_blob = zlib.compress(report.encode("utf-8")) if report else None
+        source_ips = sorted({str(ip) for ip in analysis.get("source_ips") or []})
+        log_sources = sorted({str(source) for source in _log_sources(analysis)})
+        with self._lock:
+            db = self._connect()
+            with db:
+                db.execute(
+                    "INSERT OR REPLACE INTO results (offense_id, decision, risk_level, risk_score, offense_type, "
+                    "description, magnitude, processed_at, analysis, report, duplicate_of) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (offense_id, analysis.get("decision"), level, score, analysis.get("offense_type"),
+                     analysis.get("description"), analysis.get("magnitude"), processed_at, blob, report_blob,
+                     duplicate_of),
+                )
+                db.execute("DELETE FROM result_source_ips WHERE offense_id = ?", (offense_id,))
+                db.execute("DELETE FROM result_log_sources WHERE offense_id = ?", (offense_id,))
+                db.executemany("INSERT INTO result_source_ips (offense_id, ip) VALUES (?, ?)",
+                               [(offense_id, ip) for ip in source_ips])
+                db.executemany("INSERT INTO result_log_sources (offense_id, log_source) VALUES (?, ?)",
+                               [(offense_id, source) for source in log_sources])
+            self.stats["saved"] += 1
+
+    def _row(self, offense_id: str):
+        return self._connect().execute(
+            "SELECT analysis, report, processed_at, duplicate_of FROM results WHERE offense_id = ?", (offense_id,)
+        ).fetchone()
+
+    def get(self, offense_id: str):
+        """
+        The stored analysis plus processed_at and report, or None if never
+        processed. A duplicate returns its owner's analysis and report under
+        its own offense_id, with duplicate_of set.
+        """
+        offense_id = str(offense_id)
+        with self._lock:
+            row = self._row(offense_id)
+            if row is None:
+                return None
+            processed_at, duplicate_of = row[2], row[3]
+            if duplicate_of is not None:
+                row = self._row(duplicate_of)
+                if row is None:
+                    return None
+        analysis = json.loads(zlib.decompress(row[0]))
+        if duplicate_of is not None:
+            analysis.update(offense_id=offense_id, duplicate_of=duplicate_of)
+        return {
+            "analysis": analysis,
+            "report": zlib.decompress(row[1]).decode("utf-8") if row[1] else None,
+            "processed_at": _iso(processed_at),
+        }
+
+    def query(self, decision: str = None, risk_level: str = None, source_ip: str = None, log_source: str = None,
+              since=None, until=None, limit: int = 50, cursor: str = None, full: bool = False) -> dict:
+        """
+        Newest-first page of results matching every given filter. Pass the
+        returned next_cursor back to get the following page.
+        """
+        columns = [f"r.{column}" for column in SUMMARY_COLUMNS] + (["r.analysis"] if full else [])
+        sql = [f"SELECT {', '.join(columns)} FROM results r"]
+        where, params = [], []
+        if source_ip:
+            sql.append("JOIN result_source_ips s ON s.offense_id = r.offense_id AND s.ip = ?")
+            params.append(source_ip)
+        if log_source:
+            sql.append("JOIN result_log_sources l ON l.offense_id = r.offense_id AND l.log_source = ?")
+            params.append(log_source)
+        if decision:
+            where.append("r.decision = ?")
+            params.append(decision)
+        if risk_level:
+            where.append("r.risk_level = ?")
+            params.append(risk_level.upper())
+        if since is not None:
+            where.append("r.processed_at >= ?")
+            params.append(parse_time(since))
+        if until is not None:
+            where.append("r.processed_at < ?")
+            params.append(parse_time(until))
+        if cursor:
+            processed_at, offense_id = _decode_cursor(cursor)
+            where.append("(r.processed_at < ? OR (r.processed_at = ? AND r.offense_id < ?))")
+            params.extend([processed_at, processed_at, offense_id])
+        if where:
+            sql.append("WHERE " + " AND ".join(where))
+        limit = max(1, min(int(limit), RESULT_PAGE_MAX))
+        sql.append("ORDER BY r.processed_at DESC, r.offense_id DESC LIMIT ?")
+        params.append(limit + 1)
+
+        with self._lock:
+            rows = self._connect().execute(" ".join(sql), params).fetchall()
+            self.stats["queries"] += 1
+        more = len(rows) > limit
+        rows = rows[:limit]
+        items = []
+        for row in rows:
+            item = dict(zip(SUMMARY_COLUMNS, row))
+            item["processed_at"] = _iso(item["processed_at"])
+            if full:
+                item["analysis"] = json.loads(zlib.decompress(row[len(SUMMARY_COLUMNS)]))
+                if item["duplicate_of"] is not None:
+                    owner = self.get(item["duplicate_of"])
+                    if owner is not None:
+                        item["analysis"] = dict(owner["analysis"], **item["analysis"])
+            items.append(item)
+        next_cursor = _encode_cursor(rows[-1][SUMMARY_COLUMNS.index("processed_at")], rows[-1][0]) if more else None
+        return {"results": items, "count": len(items), "next_cursor": next_cursor}
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            total = self._connect().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            return {"path": self.path, "results": total, **self.stats}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+_store = None
+
+def get_store() -> ResultStore:
+    """Return the process-wide result store."""
+    global _store
+    if _store is None:
+        _store = ResultStore()
+    return _store
@@ -0,0 +1,96 @@
+# app/utils/single_flight.py
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable, Tuple
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share any key: the first caller runs the
+    work, later callers await its result. Successful results are then kept
+    for `ttl` seconds so repeats right after completion are answered
+    without running again. Failures are never cached.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_results: int = 1000):
+        self.ttl = ttl
+        self.max_results = max_results
+        self._inflight = {}
+        self._results = OrderedDict()
+        self.stats = {"leaders": 0, "joined": 0, "cached": 0}
+
+    def _cached(self, keys: Tuple[str, ...]):
+        now = time.monotonic()
+        for key in keys:
+            entry = self._results.get(key)
+            if entry is None:
+                continue
+            expires_at, owner, value = entry
+            if expires_at > now:
+                return owner, value
+            del self._results[key]
+        return None
+
+    def _remember(self, keys: Tuple[str, ...], owner: str, value) -> None:
+        if self.ttl <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl
+        for key in keys:
+            self._results[key] = (expires_at, owner, value)
+            self._results.move_to_end(key)
+        while len(self._results) > self.max_results:
+            self._results.popitem(last=False)
+
+    async def do(self, keys: Iterable[str], owner: str, func: Callable[[], Awaitable]):
+        """
+        Run func() once for all concurrent callers sharing a key. Returns
+        (role, owner, value): role is "leader", "joined" or "cached", and
+        owner is the `owner` label of the call that produced the value.
+        """
+        keys = tuple(keys)
+        loop = asyncio.get_running_loop()
+        while True:
+            cached = self._cached(keys)
+            if cached is not None:
+                self.stats["cached"] += 1
+                return ("cached",) + cached
+
+            running = next((self._inflight[(id(loop), key)] for key in keys if (id(loop), key) in self._inflight), None)
+            if running is None:
+                break
+            try:
+                leader, value = await asyncio.shield(running)
+            except asyncio.CancelledError:
+                if running.cancelled():
+                    # The leader was cancelled, not us: try again (maybe as leader)
+                    continue
+                raise
+            self.stats["joined"] += 1
+            return "joined", leader, value
+
+        future = loop.create_future()
+        # Nobody may be waiting; retrieve the exception so it is not logged
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        for key in keys:
+            self._inflight[(id(loop), key)] = future
+        self.stats["leaders"] += 1
+        try:
+            value = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result((owner, value))
+            self._remember(keys, owner, value)
+        finally:
+            for key in keys:
+                if self._inflight.get((id(loop), key)) is future:
+                    del self._inflight[(id(loop), key)]
+        return "leader", owner, value
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "in_flight": len(set(map(id, self._inflight.values()))), "cached_results": len(self._results)}
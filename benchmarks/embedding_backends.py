@@ -0,0 +1,118 @@
+# benchmarks/embedding_backends.py
+"""
+Compare memory-search embedding backends on the sample memory base.
+
+    python -m benchmarks.embedding_backends [--backends hashing,sentence-transformers] [--repeat 200]
+
+Each backend runs in its own subprocess so import time and peak RSS are not
+polluted by the other backend (torch alone is several hundred MB). Reports
+load time, corpus/query encode throughput, peak RSS, leave-one-out recall
+and top-k agreement with the first backend that loaded successfully.
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+BACKENDS = ["sentence-transformers", "hashing"]
+TOP_K = 3
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20, 1)
+
+def run_backend(name: str, repeat: int) -> dict:
+    """Benchmark one backend in this process."""
+    started = time.perf_counter()
+    from app.agents.embedding_backends import create_backend
+    from app.agents.memory_agent import build_query_text, memory_data, preprocess_entry
+    backend = create_backend(name)
+    backend.load()
+    load_seconds = time.perf_counter() - started
+
+    corpus = [preprocess_entry(entry) for entry in memory_data]
+    started = time.perf_counter()
+    matrix = np.asarray(backend.encode(corpus), dtype=np.float32)
+    corpus_seconds = time.perf_counter() - started
+
+    # Queries are built the way find_similar_cases builds them (no tags)
+    queries = [build_query_text(entry) for entry in memory_data]
+    started = time.perf_counter()
+    for i in range(repeat):
+        backend.encode([queries[i % len(queries)]])
+    single_qps = repeat / (time.perf_counter() - started)
+    started = time.perf_counter()
+    query_matrix = np.asarray(backend.encode(queries), dtype=np.float32)
+    batch_qps = len(queries) / (time.perf_counter() - started)
+
+    scores = query_matrix @ matrix.T
+    ranked = np.argsort(-scores, axis=1)
+    self_hits = float(np.mean(ranked[:, 0] == np.arange(len(queries))))
+    # Neighbours other than the case itself that share at least one tag
+    shared = []
+    neighbours = []
+    for i, row in enumerate(ranked):
+        others = [int(j) for j in row if j != i][:TOP_K]
+        neighbours.append(others)
+        tags = set(memory_data[i].get("tags", []))
+        shared.extend(bool(tags & set(memory_data[j].get("tags", []))) for j in others)
+
+    return {
+        "backend": name,
+        "key": backend.key,
+        "dim": int(matrix.shape[1]),
+        "load_seconds": round(load_seconds, 3),
+        "corpus_encode_ms": round(corpus_seconds * 1000, 2),
+        "single_query_qps": round(single_qps, 1),
+        "batched_query_qps": round(batch_qps, 1),
+        "peak_rss_mb": _peak_rss_mb(),
+        "torch_imported": "torch" in sys.modules,
+        "self_recall_at_1": round(self_hits, 3),
+        f"tag_precision_at_{TOP_K}": round(float(np.mean(shared)), 3) if shared else 0.0,
+        "neighbours": neighbours,
+    }
+
+def _agreement(result: dict, reference: dict) -> float:
+    overlaps = [len(set(a) & set(b)) / TOP_K for a, b in zip(result["neighbours"], reference["neighbours"])]
+    return round(float(np.mean(overlaps)), 3)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--repeat", type=int, default=200, help="single-query encodes per backend")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_backend(args.child, args.repeat)))
+        return
+
+    results = []
+    for name in args.backends.split(","):
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.embedding_backends", "--child", name, "--repeat", str(args.repeat)],
+            capture_output=True, text=True, env=os.environ.copy(),
+        )
+        lines = [line for line in proc.stdout.splitlines() if line.startswith("{")]
+        if proc.returncode != 0 or not lines:
+            error = (proc.stderr.strip().splitlines() or ["no output"])[-1]
+            results.append({"backend": name, "error": error})
+            continue
+        results.append(json.loads(lines[-1]))
+
+    loaded = [r for r in results if "error" not in r]
+    for result in loaded:
+        result[f"agreement_at_{TOP_K}_vs_{loaded[0]['backend']}"] = _agreement(result, loaded[0])
+    for result in results:
+        result.pop("neighbours", None)
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
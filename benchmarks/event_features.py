@@ -0,0 +1,69 @@
+# benchmarks/event_features.py
+"""
+Columnar event features vs. the list-of-dicts representation.
+
+    python -m benchmarks.event_features [--events 200000] [--sources 500] [--chunk 1024]
+
+Synthesizes events shaped like dummy_data/offense_samples.json, then
+reports the memory the dicts hold (tracemalloc) against EventColumns.nbytes,
+and the time to build the columns and compute the features as JSON.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def synthesize(count: int, sources: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [{
+        "event_type": rng.choice(["Firewall Deny", "Port Scan", "Authentication Failure", "DNS Query"]),
+        "source_ip": f"10.{rng.randrange(4)}.{rng.randrange(256)}.{rng.randrange(sources) % 256}",
+        "destination_ip": f"192.168.1.{rng.randrange(32)}",
+        "source_port": rng.randrange(1024, 65536),
+        "destination_port": rng.choice([22, 53, 80, 443, 3389, rng.randrange(1, 1024)]),
+        "protocol": rng.choice(["TCP", "TCP", "UDP", "ICMP"]),
+        "qid": 5000000 + rng.randrange(50),
+        "username": rng.choice([None, "admin", "svc_backup"]),
+        "start_time": f"2025-07-04T{i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}",
+    } for i in range(count)]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="NuVex columnar event feature benchmark")
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--sources", type=int, default=500)
+    parser.add_argument("--chunk", type=int, default=1024)
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_ROOT)
+    from app.utils.event_columns import EventColumns, compute_event_features
+
+    tracemalloc.start()
+    events = synthesize(args.events, args.sources)
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    columns = EventColumns.from_events(events)
+    build_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    features = compute_event_features(events, args.chunk)
+    feature_seconds = time.perf_counter() - started
+
+    print(json.dumps({
+        "events": args.events,
+        "dict_bytes_per_event": round(dict_bytes / args.events, 1),
+        "column_bytes_per_event": round(columns.nbytes / args.events, 1),
+        "build_us_per_event": round(build_seconds / args.events * 1e6, 2),
+        "features_us_per_event": round(feature_seconds / args.events * 1e6, 2),
+        "features": features,
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+# benchmarks/offense_throughput.py
+"""
+End-to-end throughput and latency benchmark for the offense pipeline.
+
+    python -m benchmarks.offense_throughput [--mode direct|http] [--concurrency 8] [--requests 40] \\
+        [--provider openai|gemini] [--latency openai=0.8,...] [--jitter 0.25] [--error-rate openai=0.02] \\
+        [--cache] [--record CASSETTE | --replay CASSETTE [--replay-latency 1.0]] [--output results.json]
+
+Replays dummy_data/offense_samples.json through handle_offense ("direct")
+or through POST /ingest-offense on a local uvicorn server ("http"), with
+every external provider answered by benchmarks.stub_providers running in a
+separate process. Each request gets a unique offense_id. Prompt and
+reputation caches are disabled unless --cache is given, so runs measure the
+full path; --cache also lets repeated samples coalesce. Everything the service writes goes to a throwaway working
+directory.
+
+--record stores every LLM and reputation response in a cassette (see
+app/utils/cassette.py); --replay serves them back with no stand-ins and no
+network, sleeping for the recorded latency times --replay-latency. Replay
+with the same --provider and --requests as the recording. Memory
+write-back is off for both, so every prompt is reproducible.
+
+Output is JSON: throughput, end-to-end and per-stage p50/p95/p99, error
+counts, stand-in call counts and the benchmark process's peak RSS (which
+includes the HTTP client in "http" mode, but not the stand-ins). Service
+logs go to stderr.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLES_PATH = os.path.join(REPO_ROOT, "dummy_data", "offense_samples.json")
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20, 1)
+
+def summarize(samples) -> dict:
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples, dtype=np.float64)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "count": int(len(values)),
+        "mean": round(float(values.mean()), 4),
+        "p50": round(float(p50), 4),
+        "p95": round(float(p95), 4),
+        "p99": round(float(p99), 4),
+        "max": round(float(values.max()), 4),
+    }
+
+def start_stubs(args, workdir: str):
+    """Launch the provider stand-ins and wait until they are listening."""
+    http_port, grpc_port = _free_port(), _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.stub_providers", "--http-port", str(http_port),
+         "--grpc-port", str(grpc_port), "--cert-dir", workdir, "--latency", args.latency,
+         "--jitter", str(args.jitter), "--error-rate", args.error_rate, "--seed", str(args.seed)],
+        cwd=REPO_ROOT, stdout=subprocess.PIPE, text=True,
+    )
+    line = proc.stdout.readline()
+    if not line:
+        proc.kill()
+        raise RuntimeError("provider stand-ins failed to start")
+    return proc, json.loads(line)
+
+def configure_environment(args, stubs: dict, workdir: str) -> None:
+    """Point the service at the stand-ins (or a cassette); must run before any app import."""
+    os.environ.update({
+        "MODEL_PROVIDER": args.provider,
+        "ENABLE_MODEL_FALLBACK": "true",
+        "PROMPT_CACHE_ENABLED": "true" if args.cache else "false",
+        "REPUTATION_CACHE_ENABLED": "true" if args.cache else "false",
+        # Repeated samples share content; only coalesce them when caching
+        "OFFENSE_COALESCING": "true" if args.cache else "false",
+        # The stand-ins have no quota; measure the service, not the free tier
+        "RATE_LIMIT_BACKEND": "memory",
+        "GEMINI_RPM": "0",
+        "GEMINI_TPM": "0",
+    })
+    if args.record or args.replay:
+        os.environ.update({
+            "CASSETTE_MODE": "record" if args.record else "replay",
+            "CASSETTE_PATH": os.path.abspath(args.record or args.replay),
+            "CASSETTE_LATENCY_SCALE": str(args.replay_latency),
+            # Write-back order varies with concurrency and would change the
+            # memory matches in later prompts, so keep memory fixed
+            "MEMORY_WRITE_BACK": "false",
+        })
+    # No model download needed unless the caller asks for it
+    os.environ.setdefault("MEMORY_EMBEDDING_BACKEND", "hashing")
+    os.chdir(workdir)
+    if stubs is None:
+        return
+
+    base = f"http://127.0.0.1:{stubs['http_port']}"
+    os.environ.update({
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": f"{base}/openai/v1",
+        "GEMINI_API_KEY": "benchmark",
+        "GEMINI_API_ENDPOINT": f"localhost:{stubs['grpc_port']}",
+        "GRPC_DEFAULT_SSL_ROOTS_FILE_PATH": stubs["cert_path"],
+        "ABUSEIPDB_API_KEY": "benchmark",
+        "ABUSEIPDB_BASE_URL": f"{base}/abuseipdb/api/v2",
+        "VIRUSTOTAL_API_KEY": "benchmark",
+        "VIRUSTOTAL_BASE_URL": f"{base}/virustotal/api/v3",
+    })
+
+def load_offenses(count: int) -> list:
+    with open(SAMPLES_PATH) as f:
+        samples = json.load(f)
+    offenses = []
+    for i in range(count):
+        offense = dict(samples[i % len(samples)])
+        offense["offense_id"] = f"{offense.get('offense_id', 'bench')}-{i}"
+        offenses.append(offense)
+    return offenses
+
+def instrument(stage_samples: dict) -> None:
+    """Record raw per-stage wall times, which the metrics histograms only bucket."""
+    from app.agents import main_agent
+
+    run_stages = main_agent.run_stages
+    generate_incident_report = main_agent.generate_incident_report
+
+    async def timed_run_stages(*a, **k):
+        results = await run_stages(*a, **k)
+        for stage, seconds in results["_timings"].items():
+            stage_samples.setdefault(stage, []).append(seconds)
+        return results
+
+    async def timed_incident_report(*a, **k):
+        started = time.perf_counter()
+        try:
+            return await generate_incident_report(*a, **k)
+        finally:
+            stage_samples.setdefault("incident_report", []).append(time.perf_counter() - started)
+
+    main_agent.run_stages = timed_run_stages
+    main_agent.generate_incident_report = timed_incident_report
+
+async def run_direct(offenses: list, concurrency: int, latencies: list, outcomes: dict) -> None:
+    from app.agents.main_agent import handle_offense
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(offense):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                result = await handle_offense(offense)
+                outcomes[result.get("decision", "unknown")] = outcomes.get(result.get("decision", "unknown"), 0) + 1
+            except Exception as e:
+                outcomes["error"] = outcomes.get("error", 0) + 1
+                print(f"[Benchmark] handle_offense failed: {e}", file=sys.stderr)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(offense) for offense in offenses))
+
+async def run_http(offenses: list, concurrency: int, latencies: list, outcomes: dict) -> None:
+    import httpx
+    import uvicorn
+    from app.main import app
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=300, limits=limits) as client:
+        async def one(offense):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.post("/ingest-offense", json=offense)
+                    response.raise_for_status()
+                    decision = response.json().get("decision", "unknown")
+                    outcomes[decision] = outcomes.get(decision, 0) + 1
+                except Exception as e:
+                    outcomes["error"] = outcomes.get("error", 0) + 1
+                    print(f"[Benchmark] request failed: {e}", file=sys.stderr)
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(one(offense) for offense in offenses))
+
+    server.should_exit = True
+    await server_task
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="NuVex offense pipeline benchmark")
+    parser.add_argument("--mode", choices=("direct", "http"), default="direct")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=0, help="offenses to send (default: one per sample)")
+    parser.add_argument("--provider", choices=("openai", "gemini"), default="openai")
+    parser.add_argument("--latency", default="", help="stand-in latency per provider, e.g. openai=0.8,abuseipdb=0.1")
+    parser.add_argument("--jitter", type=float, default=0.25)
+    parser.add_argument("--error-rate", default="", help="stand-in error probability per provider")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache", action="store_true", help="keep prompt and reputation caches enabled")
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument("--record", metavar="CASSETTE", help="record provider responses to this file")
+    cassette.add_argument("--replay", metavar="CASSETTE", help="replay a recording instead of using stand-ins")
+    parser.add_argument("--replay-latency", type=float, default=1.0, help="scale for recorded latencies on replay")
+    parser.add_argument("--output", help="also write the JSON result to this file")
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output) if args.output else None
+    workdir = tempfile.mkdtemp(prefix="nuvex-bench-")
+    stubs_proc, stubs = start_stubs(args, workdir) if not args.replay else (None, None)
+    try:
+        configure_environment(args, stubs, workdir)
+        sys.path.insert(0, REPO_ROOT)
+        with open(SAMPLES_PATH) as f:
+            count = args.requests or len(json.load(f))
+        offenses = load_offenses(count)
+
+        stage_samples, latencies, outcomes = {}, [], {}
+        instrument(stage_samples)
+        runner = run_direct if args.mode == "direct" else run_http
+        started = time.perf_counter()
+        # The service logs with print(); keep stdout for the JSON result
+        with contextlib.redirect_stdout(sys.stderr):
+            asyncio.run(runner(offenses, max(1, args.concurrency), latencies, outcomes))
+        wall = time.perf_counter() - started
+
+        stub_calls = None
+        if stubs is not None:
+            import httpx
+            stub_calls = httpx.get(f"http://127.0.0.1:{stubs['http_port']}/stats").json()
+    finally:
+        if stubs_proc is not None:
+            stubs_proc.terminate()
+            stubs_proc.wait(timeout=10)
+
+    result = {
+        "mode": args.mode,
+        "provider": args.provider,
+        "concurrency": args.concurrency,
+        "requests": count,
+        "cache": args.cache,
+        "embedding_backend": os.environ["MEMORY_EMBEDDING_BACKEND"],
+        "stand_in": {"latency": args.latency or "defaults", "jitter": args.jitter, "error_rate": args.error_rate or "none"}
+                    if stubs is not None else None,
+        "cassette": {"mode": "record" if args.record else "replay", "path": args.record or args.replay}
+                    if args.record or args.replay else None,
+        "wall_seconds": round(wall, 3),
+        "throughput_per_second": round(count / wall, 3) if wall else 0.0,
+        "outcomes": outcomes,
+        "end_to_end_seconds": summarize(latencies),
+        "stage_seconds": {stage: summarize(values) for stage, values in sorted(stage_samples.items())},
+        "stand_in_calls": stub_calls,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+    text = json.dumps(result, indent=2)
+    print(text)
+    if output_path:
+        with open(output_path, "w") as f:
+            f.write(text + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+# benchmarks/stub_providers.py
+"""
+Local stand-ins for OpenAI, Gemini, AbuseIPDB and VirusTotal.
+
+    python -m benchmarks.stub_providers --http-port 9100 --grpc-port 9101 --cert-dir /tmp/stubs \\
+        [--latency openai=0.8,gemini=0.6,abuseipdb=0.15,virustotal=0.2] [--jitter 0.25] \\
+        [--error-rate openai=0.02]
+
+OpenAI, AbuseIPDB and VirusTotal are served over HTTP under /openai/v1,
+/abuseipdb/api/v2 and /virustotal/api/v3. Gemini is served over gRPC with
+TLS (the SDK's async client only speaks gRPC); a self-signed certificate
+is written to --cert-dir/stub-cert.pem for the client to trust through
+GRPC_DEFAULT_SSL_ROOTS_FILE_PATH. Responses are deterministic per prompt or
+IOC; latency is drawn uniformly from latency * (1 +/- jitter). Prints one
+JSON line once both servers are listening.
+"""
+
+import argparse
+import asyncio
+import datetime
+import hashlib
+import ipaddress
+import json
+import os
+import random
+import time
+
+DEFAULT_LATENCY = {"openai": 0.8, "gemini": 0.6, "abuseipdb": 0.15, "virustotal": 0.2}
+
+def parse_rates(text: str, defaults: dict = None) -> dict:
+    """'openai=0.8,gemini=0.5' -> {"openai": 0.8, "gemini": 0.5} on top of `defaults`."""
+    rates = dict(defaults or {})
+    for item in filter(None, (text or "").split(",")):
+        name, _, value = item.partition("=")
+        rates[name.strip()] = float(value)
+    return rates
+
+def _digest(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "big")
+
+class Behaviour:
+    """Latency, jitter and error injection shared by every stub endpoint."""
+
+    def __init__(self, latency: dict, jitter: float, error_rate: dict, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.stats = {}
+
+    async def delay(self, provider: str) -> bool:
+        """Sleep for the provider's latency; True if this call should fail."""
+        base = self.latency.get(provider, 0.0)
+        await asyncio.sleep(max(0.0, base * (1 + self.random.uniform(-self.jitter, self.jitter))))
+        failed = self.random.random() < self.error_rate.get(provider, 0.0)
+        stats = self.stats.setdefault(provider, {"calls": 0, "errors": 0})
+        stats["calls"] += 1
+        stats["errors"] += failed
+        return failed
+
+def completion_text(prompt: str) -> str:
+    """Canned answer shaped like what each call site expects."""
+    if "offense type" in prompt:
+        return ["Brute Force Attack", "Port Scanning Activity", "Malware Beaconing", "Data Exfiltration Attempt"][_digest(prompt) % 4]
+    if "numbered list" in prompt:
+        return "\n".join(f"{i}. Stand-in recommendation {i}" for i in range(1, 6))
+    return ("Stand-in analysis: the activity is consistent with the reported offense. "
+            "Correlate the source addresses with authentication and proxy logs before closing.")
+
+def create_http_app(behaviour: Behaviour):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse
+
+    app = FastAPI(title="NuVex provider stand-ins")
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        if await behaviour.delay("openai"):
+            return JSONResponse(status_code=503, content={"error": {"message": "stand-in injected error", "type": "server_error"}})
+        prompt = body["messages"][-1]["content"]
+        text = completion_text(prompt)
+        prompt_tokens, completion_tokens = max(1, len(prompt) // 4), max(1, len(text) // 4)
+        return {
+            "id": f"chatcmpl-{_digest(prompt):08x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stand-in"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    @app.get("/abuseipdb/api/v2/check")
+    async def abuseipdb_check(ipAddress: str):
+        if await behaviour.delay("abuseipdb"):
+            return JSONResponse(status_code=503, content={"errors": [{"detail": "stand-in injected error"}]})
+        score = _digest(ipAddress) % 101
+        return {"data": {"ipAddress": ipAddress, "abuseConfidenceScore": score, "totalReports": score // 5,
+                         "countryCode": "ZZ", "isp": "Stand-in ISP"}}
+
+    @app.get("/virustotal/api/v3/ip_addresses/{ioc}")
+    @app.get("/virustotal/api/v3/urls")
+    async def virustotal(ioc: str = "url"):
+        if await behaviour.delay("virustotal"):
+            return JSONResponse(status_code=503, content={"error": {"code": "TransientError"}})
+        malicious = _digest(ioc) % 12
+        return {"data": {"attributes": {"last_analysis_stats": {"malicious": malicious, "suspicious": malicious // 3}}}}
+
+    @app.get("/stats")
+    async def stats():
+        return behaviour.stats
+
+    return app
+
+def write_certificate(cert_dir: str):
+    """Self-signed certificate for localhost/127.0.0.1; returns (cert_pem, key_pem, cert_path)."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1)).not_valid_after(now + datetime.timedelta(days=7))
+        .add_extension(x509.SubjectAlternativeName(
+            [x509.DNSName("localhost"), x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    cert_pem = cert.public_bytes(serialization.Encoding.PEM)
+    key_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                serialization.NoEncryption())
+    os.makedirs(cert_dir, exist_ok=True)
+    cert_path = os.path.join(cert_dir, "stub-cert.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert_pem)
+    return cert_pem, key_pem, cert_path
+
+async def start_gemini_server(behaviour: Behaviour, port: int, cert_pem: bytes, key_pem: bytes):
+    import grpc
+    from google.ai import generativelanguage_v1beta as glm
+
+    async def generate_content(request, context):
+        prompt = " ".join(part.text for content in request.contents for part in content.parts)
+        if await behaviour.delay("gemini"):
+            await context.abort(grpc.StatusCode.UNAVAILABLE, "stand-in injected error")
+        text = completion_text(prompt)
+        return glm.GenerateContentResponse(
+            candidates=[glm.Candidate(content=glm.Content(parts=[glm.Part(text=text)], role="model"),
+                                      finish_reason=glm.Candidate.FinishReason.STOP, index=0)],
+            usage_metadata=glm.GenerateContentResponse.UsageMetadata(
+                prompt_token_count=max(1, len(prompt) // 4), candidates_token_count=max(1, len(text) // 4)),
+        )
+
+    server = grpc.aio.server()
+    server.add_generic_rpc_handlers((grpc.method_handlers_generic_handler(
+        "google.ai.generativelanguage.v1beta.GenerativeService",
+        {"GenerateContent": grpc.unary_unary_rpc_method_handler(
+            generate_content,
+            request_deserializer=glm.GenerateContentRequest.deserialize,
+            response_serializer=glm.GenerateContentResponse.serialize,
+        )},
+    ),))
+    server.add_secure_port(f"127.0.0.1:{port}", grpc.ssl_server_credentials([(key_pem, cert_pem)]))
+    await server.start()
+    return server
+
+async def serve(args) -> None:
+    import uvicorn
+
+    behaviour = Behaviour(parse_rates(args.latency, DEFAULT_LATENCY), args.jitter, parse_rates(args.error_rate), args.seed)
+    cert_pem, key_pem, cert_path = write_certificate(args.cert_dir)
+    grpc_server = await start_gemini_server(behaviour, args.grpc_port, cert_pem, key_pem)
+    http_server = uvicorn.Server(uvicorn.Config(create_http_app(behaviour), host="127.0.0.1",
+                                                port=args.http_port, log_level="warning"))
+    http_task = asyncio.create_task(http_server.serve())
+    while not http_server.started:
+        if http_task.done():
+            raise RuntimeError("stand-in HTTP server failed to start")
+        await asyncio.sleep(0.05)
+
+    print(json.dumps({"ready": True, "http_port": args.http_port, "grpc_port": args.grpc_port,
+                      "cert_path": cert_path}), flush=True)
+    try:
+        await http_task
+    finally:
+        await grpc_server.stop(0)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local provider stand-ins for benchmarks")
+    parser.add_argument("--http-port", type=int, required=True)
+    parser.add_argument("--grpc-port", type=int, required=True)
+    parser.add_argument("--cert-dir", required=True)
+    parser.add_argument("--latency", default="", help="per-provider base latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.25, help="latency varies by +/- this fraction")
+    parser.add_argument("--error-rate", default="", help="per-provider probability of an injected error")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(serve(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# benchmarks/triage_rules.py
+"""
+Triage rule engine throughput: one offense at a time vs. one batch.
+
+    python -m benchmarks.triage_rules [--offenses 10000] [--ips 5] [--batch 1000]
+
+Offenses are synthesized from dummy_data/offense_samples.json with random
+reputation scores and scored with the rules in TRIAGE_RULES_PATH. Prints
+JSON with microseconds per offense for each path and the escalation rate.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLES_PATH = os.path.join(REPO_ROOT, "dummy_data", "offense_samples.json")
+
+def synthesize(count: int, ips: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    with open(SAMPLES_PATH) as f:
+        samples = json.load(f)
+    items = []
+    for i in range(count):
+        offense = dict(samples[i % len(samples)], offense_id=str(i))
+        reputation = [{
+            "ioc": f"10.{i % 256}.{j}.{rng.randrange(256)}",
+            "abuseipdb": {"abuse_confidence": rng.choice([0, 0, 0, 10, 30, 60, 90])},
+            "virustotal": {"malicious_votes": rng.choice([0, 0, 0, 1, 2, 8])},
+        } for j in range(ips)]
+        cases = [{"tags": ["Data Exfiltration"]}] if rng.random() < 0.05 else []
+        items.append((offense, reputation, cases))
+    return items
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="NuVex triage rule engine benchmark")
+    parser.add_argument("--offenses", type=int, default=10000)
+    parser.add_argument("--ips", type=int, default=5, help="reputation results per offense")
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_ROOT)
+    from app.agents.rule_engine import RuleEngine, TRIAGE_RULES_PATH
+
+    engine = RuleEngine(TRIAGE_RULES_PATH, reload_interval=0)
+    items = synthesize(args.offenses, args.ips)
+
+    started = time.perf_counter()
+    single = [engine.evaluate(*item) for item in items]
+    single_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batched = []
+    for i in range(0, len(items), args.batch):
+        batched.extend(engine.evaluate_batch(items[i:i + args.batch]))
+    batch_seconds = time.perf_counter() - started
+
+    assert [r["decision"] for r in single] == [r["decision"] for r in batched]
+    print(json.dumps({
+        "offenses": args.offenses,
+        "ips_per_offense": args.ips,
+        "batch_size": args.batch,
+        "single_us_per_offense": round(single_seconds / args.offenses * 1e6, 2),
+        "batch_us_per_offense": round(batch_seconds / args.offenses * 1e6, 2),
+        "escalation_rate": round(sum(r["decision"] == "escalate" for r in batched) / args.offenses, 3),
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# tests/conftest.py
+
+import asyncio
+import pytest
+from app.agents import main_agent
+
+class PipelineStubs:
+    """
+    What the stubbed offense pipeline called, and how it should answer:
+    reputation scores every IP at `abuse_confidence`, each LLM call site
+    returns `responses[site]` (an exception is raised) or its own name, and
+    every stub sleeps `delay` seconds first.
+    """
+
+    LLM_SITES = {
+        "infer_offense_type": "offense_type",
+        "generate_offense_summary": "summary",
+        "generate_log_instructions": "log_instructions",
+        "justify_false_positive": "decision_justification",
+    }
+
+    def __init__(self):
+        self.abuse_confidence = 90
+        self.delay = 0.0
+        self.responses = {}
+        self.sites = []
+
+@pytest.fixture
+def pipeline_stubs(monkeypatch):
+    """Stub reputation, similar cases, LLM calls and every write of the offense pipeline."""
+    stubs = PipelineStubs()
+
+    async def reputations(ips):
+        await asyncio.sleep(stubs.delay)
+        return [{"ioc": ip, "ip": ip, "abuse_confidence": stubs.abuse_confidence} for ip in ips]
+
+    async def no_cases(offense):
+        return []
+
+    def llm(site):
+        async def call(*args, **kwargs):
+            stubs.sites.append(site)
+            await asyncio.sleep(stubs.delay)
+            response = stubs.responses.get(site, site)
+            if isinstance(response, Exception):
+                raise response
+            return response
+        return call
+
+    async def report(offense_id, offense, analysis):
+        return None, f"report {offense_id}"
+
+    monkeypatch.setattr(main_agent, "get_reputations", reputations)
+    monkeypatch.setattr(main_agent, "find_similar_cases", no_cases)
+    for name, site in PipelineStubs.LLM_SITES.items():
+        monkeypatch.setattr(main_agent, name, llm(site))
+    monkeypatch.setattr(main_agent, "generate_incident_report", report)
+    monkeypatch.setattr(main_agent, "save_log_instructions", lambda *args: None)
+    monkeypatch.setattr(main_agent, "MEMORY_WRITE_BACK", False)
+    monkeypatch.setattr(main_agent, "TEXT_EXPORT", False)
+    monkeypatch.setattr(main_agent, "RESULT_STORE_ENABLED", False)
+    return stubs
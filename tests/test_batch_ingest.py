@@ -0,0 +1,99 @@
+# tests/test_batch_ingest.py
+
+import asyncio
+import json
+import httpx
+import pytest
+from fastapi import FastAPI
+from app import offense_router
+
+def offense(offense_id, delay=0.0):
+    return {"offense_id": offense_id, "source_ips": ["10.0.0.1"], "description": "Port scan", "magnitude": delay * 100}
+
+@pytest.fixture
+def client(monkeypatch):
+    calls = {"active": 0, "peak": 0, "order": []}
+
+    async def fake_handle_offense(data):
+        calls["active"] += 1
+        calls["peak"] = max(calls["peak"], calls["active"])
+        try:
+            await asyncio.sleep(data["magnitude"] / 100)
+            if data["offense_id"] == "boom":
+                raise RuntimeError("pipeline failed")
+            calls["order"].append(data["offense_id"])
+            return {"offense_id": data["offense_id"], "decision": "escalate"}
+        finally:
+            calls["active"] -= 1
+
+    monkeypatch.setattr(offense_router, "handle_offense", fake_handle_offense)
+    app = FastAPI()
+    app.include_router(offense_router.router)
+    transport = httpx.ASGITransport(app=app)
+    return httpx.AsyncClient(transport=transport, base_url="http://test"), calls
+
+def lines(response) -> list:
+    return [json.loads(line) for line in response.text.splitlines()]
+
+@pytest.mark.asyncio
+async def test_json_array_body(client):
+    http, _ = client
+    async with http:
+        response = await http.post("/ingest-offenses", json=[offense(1), offense(2), offense(3)])
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = sorted(lines(response), key=lambda r: r["index"])
+    assert [(r["index"], r["offense_id"], r["status"]) for r in records] == [(0, "1", "ok"), (1, "2", "ok"), (2, "3", "ok")]
+    assert records[0]["result"]["decision"] == "escalate"
+
+@pytest.mark.asyncio
+async def test_ndjson_reports_bad_lines_per_item(client):
+    http, _ = client
+    body = "\n".join([
+        json.dumps(offense("a")),
+        "{not json",
+        json.dumps({"offense_id": "b"}),
+        json.dumps(offense("boom")),
+        "",
+        json.dumps(offense("c")),
+    ])
+    async with http:
+        response = await http.post("/ingest-offenses", content=body, headers={"content-type": "application/x-ndjson"})
+
+    assert response.status_code == 200
+    status = {r["index"]: r["status"] for r in lines(response)}
+    assert status == {0: "ok", 1: "invalid", 2: "invalid", 3: "error", 4: "ok"}
+    failed = next(r for r in lines(response) if r["status"] == "error")
+    assert failed["offense_id"] == "boom" and "pipeline failed" in failed["error"]
+
+@pytest.mark.asyncio
+async def test_invalid_json_array_is_a_400(client):
+    http, _ = client
+    async with http:
+        response = await http.post("/ingest-offenses", content=b"[{", headers={"content-type": "application/json"})
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_concurrency_is_clamped_to_the_maximum(client, monkeypatch):
+    http, calls = client
+    monkeypatch.setattr(offense_router, "BATCH_MAX_CONCURRENCY", 2)
+    async with http:
+        response = await http.post("/ingest-offenses?concurrency=100", json=[offense(i, 0.02) for i in range(6)])
+        assert len(lines(response)) == 6
+        assert calls["peak"] == 2
+
+        calls["peak"] = 0
+        response = await http.post("/ingest-offenses?concurrency=0", json=[offense(i, 0.01) for i in range(3)])
+    assert len(lines(response)) == 3
+    assert calls["peak"] == 1
+
+@pytest.mark.asyncio
+async def test_results_stream_in_completion_order(client):
+    http, _ = client
+    async with http:
+        response = await http.post("/ingest-offenses?concurrency=3",
+                                   json=[offense("slow", 0.3), offense("medium", 0.15), offense("fast", 0.0)])
+
+    assert [r["offense_id"] for r in lines(response)] == ["fast", "medium", "slow"]
+    assert [r["index"] for r in lines(response)] == [2, 1, 0]
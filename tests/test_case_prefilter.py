@@ -0,0 +1,62 @@
+# tests/test_case_prefilter.py
+
+import numpy as np
+from app.agents import memory_agent
+from app.agents.case_prefilter import CasePrefilter, IPPrefixIndex
+from app.agents.memory_index import BruteForceIndex, case_metadata
+
+CASES = {
+    "exact": {"source_ips": ["192.168.23.13"], "destination_ips": [], "log_source": "FW", "tags": ["Malware"]},
+    "subnet": {"source_ips": ["192.168.23.99"], "destination_ips": [], "log_source": "PROXY", "tags": []},
+    "cidr": {"source_ips": [], "destination_ips": ["10.0.0.0/16"], "log_source": "FW", "tags": ["Recon"]},
+    "other": {"source_ips": ["8.8.8.8"], "destination_ips": [], "log_source": "O365", "tags": ["Malware"]},
+}
+
+def _prefilter():
+    prefilter = CasePrefilter()
+    for case_id, entry in CASES.items():
+        prefilter.add(case_id, entry)
+    return prefilter
+
+def test_ip_prefix_levels():
+    index = IPPrefixIndex()
+    for case_id, entry in CASES.items():
+        index.add(case_id, entry["source_ips"] + entry["destination_ips"])
+    assert index.match(["192.168.23.13"]) == {"exact": 1.0, "subnet": 0.6}
+    assert index.match(["10.0.44.1"]) == {"cidr": 0.3}
+    assert index.match(["not-an-ip", "2001:db8::1"]) == {}
+
+def test_structured_score_combines_ip_and_log_source():
+    scores = _prefilter().match({"source_ips": ["192.168.23.13"], "destination_ips": [], "log_sources": ["FW"]})
+    assert scores["exact"] == 1.0
+    assert round(scores["subnet"], 3) == 0.42
+    assert scores["cidr"] == 0.3
+    assert "other" not in scores
+
+def test_allowed_filters():
+    prefilter = _prefilter()
+    assert prefilter.allowed() is None
+    assert prefilter.allowed(log_sources=["FW"]) == {"exact", "cidr"}
+    assert prefilter.allowed(log_sources=["FW"], tags=["Malware"]) == {"exact"}
+
+def test_hybrid_search_narrows_to_structured_candidates(tmp_path, monkeypatch):
+    index = BruteForceIndex()
+    vectors = {"exact": [0, 1], "subnet": [0.6, 0.8], "cidr": [1, 0], "other": [1, 0]}
+    index.add(list(vectors), np.array(list(vectors.values()), dtype=np.float32),
+              [case_metadata(CASES[i]) for i in vectors])
+    monkeypatch.setattr(memory_agent, "memory_index", index)
+    monkeypatch.setattr(memory_agent, "memory_cases", dict(CASES))
+    monkeypatch.setattr(memory_agent, "case_prefilter", _prefilter())
+    monkeypatch.setattr(memory_agent, "MEMORY_APPEND_PATH", str(tmp_path / "cases.jsonl"))
+    monkeypatch.setattr(memory_agent, "MEMORY_PREFILTER_MIN_CANDIDATES", 2)
+
+    searched = []
+    monkeypatch.setattr(index, "search", lambda *a, **k: searched.append(a) or [])
+
+    offense = {"description": "x", "source_ips": ["192.168.23.13"], "destination_ips": [], "log_sources": ["FW"]}
+    hits = memory_agent.search_similar_cases(offense, top_k=2, query_embedding=np.array([1, 0], dtype=np.float32))
+    assert not searched  # three structured candidates, so no corpus-wide scan
+    # "other" is semantically identical but shares no infrastructure
+    assert [h["structured_score"] for h in hits] == [0.3, 0.42]
+    assert hits[0]["semantic_score"] == 1.0
+    assert hits[0]["similarity_score"] > hits[1]["similarity_score"]
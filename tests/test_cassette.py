@@ -0,0 +1,60 @@
+# tests/test_cassette.py
+
+import pytest
+from app.agents import model_router
+from app.utils import cassette
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = cassette.CassetteStore(str(tmp_path / "cassette.db"))
+    monkeypatch.setattr(cassette, "_store", store)
+    yield store
+    store.close()
+
+@pytest.mark.asyncio
+async def test_record_then_replay(store, monkeypatch):
+    calls = []
+
+    async def live():
+        calls.append(1)
+        return {"ioc": "1.2.3.4", "score": 42}
+
+    key = cassette.fingerprint("reputation", "1.2.3.4")
+    monkeypatch.setattr(cassette, "CASSETTE_MODE", "record")
+    assert await cassette.through_cassette("reputation", key, {"ioc": "1.2.3.4"}, live) == {"ioc": "1.2.3.4", "score": 42}
+    assert store.count() == {"reputation": 1}
+
+    monkeypatch.setattr(cassette, "CASSETTE_MODE", "replay")
+    assert await cassette.through_cassette("reputation", key, {"ioc": "1.2.3.4"}, live) == {"ioc": "1.2.3.4", "score": 42}
+    assert calls == [1]
+
+    with pytest.raises(cassette.CassetteMiss):
+        await cassette.through_cassette("reputation", "unknown", {"ioc": "x"}, live)
+
+@pytest.mark.asyncio
+async def test_replay_miss_can_fall_through_to_live(store, monkeypatch):
+    async def live():
+        return "live"
+
+    monkeypatch.setattr(cassette, "CASSETTE_MODE", "replay")
+    monkeypatch.setattr(cassette, "CASSETTE_ON_MISS", "live")
+    assert await cassette.through_cassette("llm", "k", {}, live) == "live"
+    assert store.get_stats()["misses"] == 1
+
+@pytest.mark.asyncio
+async def test_try_provider_replays_without_calling_agent(store, monkeypatch):
+    calls = []
+
+    async def fake_call(provider, prompt):
+        calls.append(prompt)
+        return f"answer to {prompt}"
+
+    monkeypatch.setattr(model_router, "call_provider", fake_call)
+    monkeypatch.setattr(cassette, "CASSETTE_MODE", "record")
+    assert await model_router.try_provider("openai", "hello") == "answer to hello"
+
+    monkeypatch.setattr(cassette, "CASSETTE_MODE", "replay")
+    assert await model_router.try_provider("openai", "hello") == "answer to hello"
+    assert calls == ["hello"]
+    # Unrecorded prompts surface as provider errors, so fallback logic still applies
+    assert (await model_router.try_provider("openai", "other")).startswith("Error:")
@@ -0,0 +1,27 @@
+# tests/test_embedding_backends.py
+
+import numpy as np
+from app.agents.embedding_backends import HashingBackend, SentenceTransformerBackend, create_backend
+
+def test_hashing_backend_is_normalized_and_deterministic():
+    backend = HashingBackend(dim=256)
+    texts = ["Port scan from 192.168.1.10 | LogSource: FW", ""]
+    first = backend.encode(texts)
+    assert first.shape == (2, 256)
+    assert abs(np.linalg.norm(first[0]) - 1) < 1e-5
+    assert not first[1].any()
+    assert np.array_equal(first, HashingBackend(dim=256).encode(texts))
+
+def test_hashing_backend_ranks_similar_text_higher():
+    backend = HashingBackend()
+    query, near, far = backend.encode([
+        "Reconnaissance activity detected Source: 192.168.23.13 | LogSource: HDC-PA-FW-PRI",
+        "Simulated offense: Reconnaissance activity detected Source: 192.168.23.14 | LogSource: HDC-PA-FW-PRI",
+        "Phishing email delivered Source: 8.8.8.8 | LogSource: O365",
+    ])
+    assert query @ near > query @ far
+
+def test_create_backend_selection():
+    assert isinstance(create_backend("hashing"), HashingBackend)
+    assert isinstance(create_backend("unknown"), SentenceTransformerBackend)
+    assert create_backend("hashing").key.startswith("hashing-")
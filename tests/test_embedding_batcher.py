@@ -0,0 +1,65 @@
+# tests/test_embedding_batcher.py
+
+import asyncio
+import numpy as np
+import pytest
+from app.utils.embedding_batcher import EmbeddingBatcher
+
+def _encoder(calls):
+    def encode(texts):
+        calls.append(list(texts))
+        return np.array([[len(t), 1.0] for t in texts], dtype=np.float32)
+    return encode
+
+@pytest.mark.asyncio
+async def test_concurrent_queries_share_one_batch():
+    calls = []
+    batcher = EmbeddingBatcher(_encoder(calls), max_batch=32, max_wait_ms=20)
+    vectors = await asyncio.gather(*(batcher.embed("x" * n) for n in (1, 2, 3, 2)))
+    assert len(calls) == 1
+    assert sorted(calls[0]) == ["x", "xx", "xxx"]
+    assert [v[0] for v in vectors] == [1, 2, 3, 2]
+
+@pytest.mark.asyncio
+async def test_full_batch_flushes_without_waiting():
+    calls = []
+    batcher = EmbeddingBatcher(_encoder(calls), max_batch=2, max_wait_ms=10_000)
+    await asyncio.wait_for(asyncio.gather(batcher.embed("a"), batcher.embed("bb")), timeout=2)
+    assert calls == [["a", "bb"]]
+
+@pytest.mark.asyncio
+async def test_repeated_queries_hit_lru():
+    calls = []
+    batcher = EmbeddingBatcher(_encoder(calls), max_wait_ms=0, cache_size=1)
+    await batcher.embed("a")
+    vector = await batcher.embed("a")
+    assert len(calls) == 1
+    assert not vector.flags.writeable
+
+    await batcher.embed("b")  # evicts "a"
+    await batcher.embed("a")
+    assert len(calls) == 3
+    assert batcher.get_stats()["hits"] == 1
+
+@pytest.mark.asyncio
+async def test_encoder_failure_reaches_every_waiter():
+    def fail(texts):
+        raise RuntimeError("model unavailable")
+
+    batcher = EmbeddingBatcher(fail, max_wait_ms=5)
+    results = await asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+@pytest.mark.asyncio
+async def test_close_waits_for_in_flight_batches():
+    calls = []
+    batcher = EmbeddingBatcher(_encoder(calls), max_wait_ms=10_000)
+    waiter = asyncio.ensure_future(batcher.embed("abc"))
+    await asyncio.sleep(0)
+    assert calls == [] and not batcher._tasks
+
+    await batcher.close()
+
+    assert calls == [["abc"]]
+    assert batcher._tasks == set()
+    assert (await waiter)[0] == 3
@@ -0,0 +1,123 @@
+# tests/test_event_columns.py
+
+import tracemalloc
+import pytest
+from app.agents.rule_engine import RuleEngine, TRIAGE_RULES_PATH
+from app.utils.event_columns import (EventColumns, EventFeatures, compute_event_features,
+                                     describe_event_features, new_categories)
+
+def scan_events(count: int) -> list:
+    # 10.0.0.1 sweeps ports 1..count; everyone else talks to 443
+    events = [{"source_ip": "10.0.0.1", "destination_ip": "192.168.1.5", "destination_port": port,
+               "protocol": "TCP", "event_type": "Port Scan", "start_time": f"2025-07-04T01:00:{port % 60:02d}"}
+              for port in range(1, count + 1)]
+    events += [{"source_ip": f"10.0.1.{i}", "destination_ip": "192.168.1.6", "destination_port": 443,
+                "protocol": "UDP", "event_type": "DNS Query", "start_time": "2025-07-04T01:05:00Z"}
+               for i in range(10)]
+    return events
+
+def test_columns_round_trip_and_pack_addresses():
+    events = [
+        {"source_ip": "10.1.2.3", "destination_address": "2001:db8::1", "destination_port": "443", "qid": 7,
+         "protocol": "TCP", "event_type": "Login", "username": "alice", "start_time": "2025-07-04T01:07:37"},
+        {"source_ip": None, "destination_port": "n/a", "start_time": 1751591257000},
+    ]
+
+    columns = EventColumns.from_events(events)
+
+    assert len(columns) == 2
+    assert columns["source_ip"][0] == (10 << 24) + (1 << 16) + (2 << 8) + 3
+    assert columns.row(0) == {
+        "source_ip": "10.1.2.3", "destination_ip": "2001:db8::1", "source_port": None, "destination_port": 443,
+        "qid": 7, "event_type": "Login", "protocol": "TCP", "username": "alice",
+        "start_time": "2025-07-04T01:07:37+00:00",
+    }
+    second = columns.row(1)
+    assert second["source_ip"] is None and second["destination_port"] is None
+    assert second["event_type"] == "Unknown" and second["username"] is None
+    assert second["start_time"] == "2025-07-04T01:07:37+00:00"
+
+def test_features_match_a_dict_computation():
+    events = scan_events(150)
+
+    features = compute_event_features(events)
+
+    assert features["event_count"] == 160
+    assert features["unique_source_ips"] == len({e["source_ip"] for e in events}) == 11
+    assert features["unique_destination_ips"] == 2
+    assert features["unique_destination_ports"] == 151
+    assert features["max_port_fanout"] == 150
+    assert features["protocol_mix"] == {"TCP": 0.938, "UDP": 0.062}
+    # 150 events inside 01:00, 10 at 01:05 (the Z suffix is UTC)
+    assert features["burst_events_per_minute"] == 150
+    assert features["duration_seconds"] == 300
+    assert "max 150 ports from one source" in describe_event_features(features)
+    assert describe_event_features({"event_count": 0}) == ""
+
+def test_chunked_updates_equal_one_pass():
+    events = scan_events(500)
+
+    assert compute_event_features(events, chunk_size=7) == compute_event_features(events, chunk_size=10000)
+
+def test_unique_cap_marks_features_approximate():
+    features, categories = EventFeatures(max_unique=4), new_categories()
+    events = [{"source_ip": f"10.0.0.{i}", "destination_port": 80} for i in range(10)]
+
+    for i in range(0, 10, 2):
+        features.update(EventColumns.from_events(events[i:i + 2], categories))
+    summary = features.summary()
+
+    assert summary["approximate"] is True
+    assert summary["unique_source_ips"] <= 6
+
+def test_columns_use_far_less_memory_than_dicts():
+    tracemalloc.start()
+    events = [{"source_ip": f"10.0.{i % 256}.{i % 200}", "destination_ip": "192.168.1.5", "destination_port": i % 1024,
+               "protocol": "TCP", "event_type": "Firewall Deny", "qid": 5000123,
+               "start_time": f"2025-07-04T01:{i // 60 % 60:02d}:{i % 60:02d}"} for i in range(20000)]
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    columns = EventColumns.from_events(events)
+
+    assert columns.nbytes * 5 < dict_bytes
+
+@pytest.mark.parametrize("fanout, burst, expected", [(5, 10, []), (150, 10, ["port_sweep"]),
+                                                     (25, 700, ["port_fanout", "high_event_burst"])])
+def test_event_features_feed_risk_rules(fanout, burst, expected):
+    engine = RuleEngine(TRIAGE_RULES_PATH, reload_interval=0)
+    offense = {"magnitude": 1, "event_count": 1,
+               "event_features": {"max_port_fanout": fanout, "burst_events_per_minute": burst, "unique_source_ips": 1}}
+
+    result = engine.evaluate(offense, [])
+
+    assert [rule for rule in result["fired_rules"] if rule not in ("magnitude",)] == expected
+
+@pytest.mark.asyncio
+async def test_stream_features_cover_every_event():
+    import json
+    from app.utils.event_stream import read_offense_stream
+
+    body = json.dumps({"offense_id": 1, "events": scan_events(3000)}).encode("utf-8")
+
+    async def chunks():
+        for i in range(0, len(body), 8192):
+            yield body[i:i + 8192]
+
+    offense = await read_offense_stream(chunks(), sample_size=10, seed=0)
+
+    assert len(offense["events"]) == 10
+    assert offense["event_features"] == compute_event_features(scan_events(3000))
+    assert offense["event_features"]["max_port_fanout"] == 3000
+
+def test_digit_strings_are_epoch_times():
+    seconds = [{"start_time": str(1700000000 + i)} for i in range(5)]
+    millis = [{"start_time": str((1700000000 + i) * 1000)} for i in range(5)]
+
+    for events in (seconds, millis):
+        columns = EventColumns.from_events(events)
+        features = compute_event_features(events)
+
+        assert columns["time"].tolist() == [1700000000.0 + i for i in range(5)]
+        assert features["duration_seconds"] == 4
+        assert features["burst_events_per_minute"] == 5
@@ -0,0 +1,90 @@
+# tests/test_event_stream.py
+
+import json
+import tracemalloc
+import pytest
+from app.utils.event_stream import EventAggregates, EventReservoir, OffenseStreamParser, read_offense_stream
+
+def offense_body(events: int) -> bytes:
+    offense = {
+        "offense_id": 42, "description": "Port scan é", "magnitude": 7, "source_ips": ["10.0.0.1"],
+        "events": [{"event_type": "Scan" if i % 100 else "Exfil", "destination_port": 443 if i % 3 else 22,
+                    "source_ip": f"10.0.{i % 7}.1", "protocol": "TCP", "start_time": f"2025-07-04T00:{i % 60:02d}:00"}
+                   for i in range(events)],
+        "event_count": 12.5e1, "flag": True, "note": None,
+    }
+    return json.dumps(offense, ensure_ascii=False).encode("utf-8")
+
+def parse(body: bytes, chunk: int) -> tuple:
+    parser, items = OffenseStreamParser(), []
+    for i in range(0, len(body), chunk):
+        items.extend(parser.feed(body[i:i + chunk]))
+    items.extend(parser.close())
+    fields = {item[1]: item[2] for item in items if item[0] == "field"}
+    events = [item[1] for item in items if item[0] == "event"]
+    return fields, events
+
+@pytest.mark.parametrize("chunk", [1, 7, 4096])
+def test_parser_matches_json_loads_at_any_chunk_size(chunk):
+    body = offense_body(300)
+    expected = json.loads(body)
+
+    fields, events = parse(body, chunk)
+
+    assert events == expected.pop("events")
+    assert fields == expected
+
+@pytest.mark.parametrize("body", [b'[1, 2]', b'{"a": 1', b'{"events": [1]}', b'{"a": 1} x', b'{"a" 1}'])
+def test_parser_rejects_malformed_bodies(body):
+    with pytest.raises(ValueError):
+        parse(body, 3)
+
+def test_reservoir_keeps_rare_strata_and_interleaves():
+    reservoir = EventReservoir(size=10, seed=1)
+    for i in range(10000):
+        reservoir.add({"event_type": "Scan", "destination_port": 443, "i": i})
+    reservoir.add({"event_type": "Exfil", "destination_port": 22, "i": -1})
+
+    sample = reservoir.sample()
+
+    assert len(sample) == 10
+    assert sample[1]["event_type"] == "Exfil"
+    # The common stratum is a uniform sample, not the first events
+    assert max(e["i"] for e in sample) > 1000
+
+def test_aggregates_cover_every_event():
+    aggregates = EventAggregates(max_keys=2)
+    for port in (22, 22, 80, 443):
+        aggregates.add({"event_type": "Scan", "destination_port": port, "source_ip": "10.0.0.1", "start_time": f"2025-01-0{port % 9}"})
+
+    summary = aggregates.summary()
+
+    assert summary["event_count"] == 4
+    assert summary["destination_ports"] == [["22", 2], ["80", 1]]
+    assert aggregates.destination_ports.overflow == 1
+    assert summary["unique_source_ips"] == 1
+    assert (summary["first_seen"], summary["last_seen"]) == ("2025-01-02", "2025-01-08")
+
+@pytest.mark.asyncio
+async def test_stream_memory_stays_flat_as_events_grow():
+    async def chunks(body):
+        for i in range(0, len(body), 65536):
+            yield body[i:i + 65536]
+
+    peaks = []
+    for events in (2000, 20000):
+        body = offense_body(events)
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        offense = await read_offense_stream(chunks(body), sample_size=20, seed=0)
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+        tracemalloc.stop()
+        del body
+
+        assert offense["event_aggregates"]["event_count"] == events
+        assert offense["event_count"] == events
+        assert len(offense["events"]) == 20
+        assert {e["event_type"] for e in offense["events"]} == {"Scan", "Exfil"}
+
+    # Ten times the events must not mean anywhere near ten times the memory
+    assert peaks[1] < peaks[0] * 2
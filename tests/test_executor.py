@@ -0,0 +1,71 @@
+# tests/test_executor.py
+
+import asyncio
+import threading
+import time
+import pytest
+from app.agents import main_agent
+from app.utils import executor
+from app.utils.executor import run_cpu_bound, shutdown_executor
+
+@pytest.mark.asyncio
+async def test_cpu_bound_work_runs_off_the_event_loop():
+    loop_thread = threading.current_thread()
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    def blocking(seconds):
+        time.sleep(seconds)
+        return threading.current_thread()
+
+    task = asyncio.ensure_future(ticker())
+    worker = await run_cpu_bound(blocking, 0.2)
+    task.cancel()
+
+    assert worker is not loop_thread
+    assert worker.name.startswith("nuvex-cpu")
+    # The loop kept running while the worker slept
+    assert ticks >= 5
+
+@pytest.mark.asyncio
+async def test_executor_is_recreated_after_shutdown():
+    first = executor.get_executor()
+    shutdown_executor()
+
+    assert await run_cpu_bound(sum, [1, 2, 3]) == 6
+    assert executor.get_executor() is not first
+
+@pytest.mark.asyncio
+async def test_handle_offense_runs_end_to_end_concurrently(pipeline_stubs, monkeypatch):
+    feature_threads = []
+    compute = main_agent.compute_event_features
+
+    def features(events):
+        feature_threads.append(threading.current_thread())
+        return compute(events)
+
+    pipeline_stubs.delay = 0.1
+    monkeypatch.setattr(main_agent, "compute_event_features", features)
+    monkeypatch.setattr(main_agent, "EVENT_CHUNK_SIZE", 2)
+    monkeypatch.setattr(main_agent, "OFFENSE_COALESCING", False)
+
+    events = [{"source_ip": "203.0.113.9", "destination_port": port} for port in range(5)]
+    offenses = [{"offense_id": str(i), "description": f"Port scan {i}", "source_ips": ["203.0.113.9"],
+                 "events": events} for i in range(10)]
+    started = time.perf_counter()
+    analyses = await asyncio.gather(*(main_agent.handle_offense(offense) for offense in offenses))
+    elapsed = time.perf_counter() - started
+
+    # Each offense waits 0.3s on its critical path; run one by one they would take 3s
+    assert elapsed < 1.5
+    assert [a["offense_id"] for a in analyses] == [str(i) for i in range(10)]
+    assert all(a["decision"] == "escalate" and a["enrichment_status"] == "success" for a in analyses)
+    assert all(a["event_features"]["unique_destination_ports"] == 5 for a in analyses)
+    # Offenses with more than EVENT_CHUNK_SIZE events compute features on the CPU executor
+    assert len(feature_threads) == 10
+    assert all(thread.name.startswith("nuvex-cpu") for thread in feature_threads)
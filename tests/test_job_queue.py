@@ -0,0 +1,115 @@
+# tests/test_job_queue.py
+
+import asyncio
+import pytest
+from app.utils.job_queue import JobQueue, JobStore
+
+@pytest.mark.asyncio
+async def test_jobs_run_in_background_and_report_status(tmp_path):
+    async def handler(offense):
+        await asyncio.sleep(0.05)
+        if offense["offense_id"] == "bad":
+            raise RuntimeError("boom")
+        return {"offense_id": offense["offense_id"], "decision": "escalate"}
+
+    queue = JobQueue(handler, JobStore(str(tmp_path / "jobs.db")), workers=2)
+    good = await queue.submit({"offense_id": "1001"})
+    bad = await queue.submit({"offense_id": "bad"})
+    assert good["status"] == "queued"
+
+    await queue.join()
+    done = await queue.get(good["job_id"])
+    failed = await queue.get(bad["job_id"])
+    assert done["status"] == "completed"
+    assert done["result"]["decision"] == "escalate"
+    assert failed["status"] == "failed" and "boom" in failed["error"]
+    assert await queue.get("missing") is None
+    await queue.stop()
+
+@pytest.mark.asyncio
+async def test_unfinished_jobs_are_recovered_on_start(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    store = JobStore(path)
+    queued = store.create({"offense_id": "1002"})
+    running = store.create({"offense_id": "1003"})
+    store.update(running["job_id"], "running")
+    store.close()
+
+    handled = []
+
+    async def handler(offense):
+        handled.append(offense["offense_id"])
+        return {"ok": True}
+
+    queue = JobQueue(handler, JobStore(path), workers=1)
+    await queue.start()
+    await queue.join()
+
+    assert handled == ["1002", "1003"]
+    assert (await queue.get(queued["job_id"]))["status"] == "completed"
+    await queue.stop()
+
+@pytest.mark.asyncio
+async def test_live_workers_jobs_are_not_taken_over(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    handled = []
+
+    async def slow(offense):
+        handled.append(offense["offense_id"])
+        await asyncio.sleep(0.5)
+        return {"ok": True}
+
+    # Short lease, renewed by the heartbeat every 0.1s while the job runs
+    first = JobQueue(slow, JobStore(path), workers=1, lease=0.3)
+    job = await first.submit({"offense_id": "1004"})
+    await asyncio.sleep(0.05)
+
+    # A second worker process starting up (and its heartbeat) must leave it alone
+    second = JobQueue(slow, JobStore(path), workers=1, lease=0.3)
+    await second.start()
+    await first.join()
+    await asyncio.sleep(0.2)
+
+    assert handled == ["1004"]
+    assert (await first.get(job["job_id"]))["status"] == "completed"
+    await first.stop()
+    await second.stop()
+
+@pytest.mark.asyncio
+async def test_expired_leases_are_recovered_once(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    dead = JobStore(path)
+    job = dead.create({"offense_id": "1005"}, owner="dead-worker", lease=0.01)
+    assert dead.claim(job["job_id"], "dead-worker", lease=0.01)
+    assert not dead.claim(job["job_id"], "dead-worker")
+    await asyncio.sleep(0.05)
+
+    handled = []
+
+    async def handler(offense):
+        handled.append(offense["offense_id"])
+        return {"ok": True}
+
+    queues = [JobQueue(handler, JobStore(path), workers=1) for _ in range(2)]
+    await asyncio.gather(*(queue.start() for queue in queues))
+    for queue in queues:
+        await queue.join()
+
+    assert handled == ["1005"]
+    # The original owner can no longer report on (or call back for) the job
+    assert not dead.update(job["job_id"], "completed", owner="dead-worker")
+    assert (await queues[0].get(job["job_id"]))["status"] == "completed"
+    for queue in queues:
+        await queue.stop()
+    dead.close()
+
+def test_claim_requires_ownership(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    job = store.create({"offense_id": "1006"}, owner="a")
+
+    assert not store.claim(job["job_id"], "b")
+    assert store.claim(job["job_id"], "a")
+    assert store.recover("b") == []
+    assert store.release("a") == 1
+    assert [job_id for job_id, _, _ in store.recover("b")] == [job["job_id"]]
+    store.close()
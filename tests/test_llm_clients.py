@@ -0,0 +1,95 @@
+# tests/test_llm_clients.py
+
+import asyncio
+import httpx
+import pytest
+from app.agents import llm_clients
+
+@pytest.mark.asyncio
+async def test_openai_clients_are_reused_per_key():
+    first = llm_clients.get_openai_client("sk-test-a")
+    assert llm_clients.get_openai_client("sk-test-a") is first
+    assert llm_clients.get_openai_client("sk-test-b") is not first
+
+    stats = llm_clients.get_client_stats()
+    assert stats["reuses"] >= 1
+    assert all(pool["requests"] == pool["in_flight"] == 0 for pool in stats["openai_clients"])
+
+    await llm_clients.close_clients()
+    assert llm_clients.get_client_stats()["openai_clients"] == []
+
+def test_gemini_models_are_reused_per_config():
+    config = {"temperature": 0.5, "max_output_tokens": 300}
+    model = llm_clients.get_gemini_model("test-key", "gemini-1.5-flash", config, {})
+    assert llm_clients.get_gemini_model("test-key", "gemini-1.5-flash", dict(config), {}) is model
+    assert llm_clients.get_gemini_model("test-key", "gemini-1.5-flash", {"temperature": 0.9}, {}) is not model
+
+@pytest.mark.asyncio
+async def test_transport_counts_requests_and_errors():
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def handler(request):
+        if request.url.path == "/fail":
+            raise httpx.ConnectError("refused")
+        started.set()
+        await release.wait()
+        return httpx.Response(200, json={})
+
+    transport = llm_clients._CountingTransport(httpx.MockTransport(handler))
+    async with httpx.AsyncClient(transport=transport, base_url="http://llm.test") as client:
+        pending = asyncio.ensure_future(client.get("/ok"))
+        await started.wait()
+        assert transport.stats()["in_flight"] == 1
+        release.set()
+        await pending
+        with pytest.raises(httpx.ConnectError):
+            await client.get("/fail")
+
+    stats = transport.stats()
+    assert (stats["requests"], stats["in_flight"], stats["peak_in_flight"], stats["errors"]) == (2, 0, 1, 1)
+
+def test_a_new_gemini_key_reconfigures_and_rebuilds(monkeypatch):
+    configured = []
+    monkeypatch.setattr(llm_clients.genai, "configure", lambda **kwargs: configured.append(kwargs["api_key"]))
+    monkeypatch.setattr(llm_clients, "_gemini_configured_key", None)
+    monkeypatch.setattr(llm_clients, "_gemini_models", {})
+
+    first = llm_clients.get_gemini_model("key-a", "gemini-1.5-flash", {}, {})
+    assert llm_clients.get_gemini_model("key-a", "gemini-1.5-flash", {}, {}) is first
+    second = llm_clients.get_gemini_model("key-b", "gemini-1.5-flash", {}, {})
+
+    assert second is not first
+    assert configured == ["key-a", "key-b"]
+
+def test_openai_clients_of_closed_loops_are_closed():
+    async def client():
+        return llm_clients.get_openai_client("sk-test-loop")
+
+    first = asyncio.run(client())
+    second = asyncio.run(client())
+
+    assert second is not first
+    assert first.is_closed()
+    asyncio.run(llm_clients.close_clients())
+    assert second.is_closed()
+
+@pytest.mark.asyncio
+async def test_gemini_calls_are_bounded_by_llm_timeout(monkeypatch):
+    from app.agents import gemini_agent
+
+    seen = {}
+
+    class HangingModel:
+        async def generate_content_async(self, prompt, request_options=None):
+            seen["request_options"] = request_options
+            await asyncio.sleep(10)
+
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(gemini_agent, "LLM_TIMEOUT", 0.05)
+    monkeypatch.setattr(gemini_agent, "get_gemini_model", lambda *args: HangingModel())
+
+    response = await asyncio.wait_for(gemini_agent.generate_response("hello"), timeout=2)
+
+    assert response.startswith("Error: Gemini request timed out")
+    assert seen["request_options"] == {"timeout": 0.05}
@@ -0,0 +1,65 @@
+# tests/test_memory_embeddings.py
+
+import numpy as np
+from app.agents import memory_agent
+from app.agents.case_prefilter import CasePrefilter
+from app.agents.memory_index import BruteForceIndex, case_metadata
+
+def test_corpus_embeddings_persisted(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_encode(texts):
+        calls.append(len(texts))
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+    monkeypatch.setattr(memory_agent, "EMBEDDING_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(memory_agent, "encode_texts", fake_encode)
+
+    first = memory_agent.load_corpus_embeddings(["a", "b"])
+    second = memory_agent.load_corpus_embeddings(["a", "b"])
+    assert calls == [2]
+    assert isinstance(second, np.memmap)
+    assert np.array_equal(first, second)
+
+    # A different corpus gets its own cache file
+    memory_agent.load_corpus_embeddings(["a", "c"])
+    assert calls == [2, 2]
+
+def test_index_adopts_mapped_embeddings_then_grows(tmp_path):
+    path = tmp_path / "seed.npy"
+    np.save(path, np.eye(2, 3, dtype=np.float32))
+    seed = np.load(path, mmap_mode="r")
+
+    index = BruteForceIndex()
+    meta = {"log_source": "X", "tags": []}
+    index.add(["a", "b"], seed, [meta, meta])
+    index.add(["c"], np.eye(1, 3, 2, dtype=np.float32), [case_metadata(meta)])
+    assert len(index) == 3
+    assert index.search(np.array([0, 0, 1], dtype=np.float32), 1)[0][0] == "c"
+
+def test_index_cases_keeps_mapped_embeddings_mapped(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory_agent, "memory_cases", {})
+    monkeypatch.setattr(memory_agent, "case_prefilter", CasePrefilter())
+    entries = [{"description": f"case {i}", "source_ips": [f"10.0.0.{i}"], "destination_ips": [],
+                "log_source": "FW", "tags": []} for i in range(3)]
+    path = tmp_path / "seed.npy"
+    np.save(path, np.eye(3, 4, dtype=np.float32))
+    seed = np.load(path, mmap_mode="r")
+
+    index = BruteForceIndex()
+    assert memory_agent.index_cases(entries, seed, index) == 3
+    # Every row was needed, so the index uses the mapped file without copying it
+    assert np.shares_memory(index._matrix, seed)
+
+    # Only the changed case is re-embedded, from a copy of its row
+    entries[1] = dict(entries[1], description="case 1, changed")
+    assert memory_agent.index_cases(entries, seed, index) == 1
+    assert not np.shares_memory(index._matrix, seed)
+
+def test_readiness_reports_cold_model(monkeypatch):
+    monkeypatch.setattr(memory_agent, "memory_index", None)
+    monkeypatch.setattr(memory_agent, "_model_status", {"state": "cold", "error": None, "load_seconds": None})
+    status = memory_agent.readiness()
+    assert status["semantic_search"] is False
+    assert status["model_state"] == "cold"
+    assert status["indexed_cases"] == 0
@@ -0,0 +1,48 @@
+# tests/test_memory_index.py
+
+import numpy as np
+import pytest
+from app.agents.memory_index import BruteForceIndex, ChromaIndex, case_metadata
+
+CASES = [
+    {"log_source": "VPN-GW", "tags": ["Data Exfiltration"]},
+    {"log_source": "VPN-GW", "tags": ["Reconnaissance"]},
+    {"log_source": "SIEM-LOG", "tags": ["Malware", "Reconnaissance"]},
+]
+
+def _vectors():
+    vectors = np.array([[1, 0, 0], [0.8, 0.6, 0], [0, 1, 0]], dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def _check_index(index):
+    index.add(["a", "b", "c"], _vectors(), [case_metadata(c) for c in CASES])
+    assert index.missing(["a", "z"]) == ["z"]
+
+    query = np.array([1, 0, 0], dtype=np.float32)
+    hits = index.search(query, 2)
+    assert [h[0] for h in hits] == ["a", "b"]
+    assert hits[0][1] == pytest.approx(1.0, abs=1e-3)
+
+    assert [h[0] for h in index.search(query, 3, log_sources=["SIEM-LOG"])] == ["c"]
+    assert [h[0] for h in index.search(query, 3, tags=["Reconnaissance"])] == ["b", "c"]
+    assert [h[0] for h in index.search(query, 3, log_sources=["VPN-GW"], tags=["Reconnaissance", "Malware"])] == ["b"]
+
+def test_bruteforce_index():
+    index = BruteForceIndex()
+    _check_index(index)
+    # Re-adding an existing id is a no-op
+    index.add(["a"], _vectors()[:1], [case_metadata(CASES[0])])
+    assert len(index) == 3
+
+def test_bruteforce_append_grows_buffer():
+    index = BruteForceIndex()
+    for i in range(200):
+        index.add([str(i)], np.eye(1, 4, i % 4, dtype=np.float32), [{"log_source": "X", "tags": []}])
+    assert len(index) == 200
+    assert index.search(np.eye(1, 4, 3, dtype=np.float32)[0], 1)[0][1] == pytest.approx(1.0)
+
+def test_chroma_index(tmp_path):
+    pytest.importorskip("chromadb")
+    _check_index(ChromaIndex(path=str(tmp_path / "chroma"), collection="test_cases"))
+    # The collection persists across instances
+    assert len(ChromaIndex(path=str(tmp_path / "chroma"), collection="test_cases")) == 3
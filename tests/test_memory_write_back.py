@@ -0,0 +1,236 @@
+# tests/test_memory_write_back.py
+
+import hashlib
+import json
+import subprocess
+import sys
+import threading
+import numpy as np
+import pytest
+from app.agents import memory_agent
+from app.agents.case_prefilter import CasePrefilter
+from app.agents.memory_index import BruteForceIndex
+
+def fake_encode(texts):
+    vectors = np.array([np.frombuffer(hashlib.sha256(t.encode("utf-8")).digest(), dtype=np.uint8)
+                        for t in texts], dtype=np.float32) + 1
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+@pytest.fixture
+def memory(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory_agent, "memory_index", BruteForceIndex())
+    monkeypatch.setattr(memory_agent, "memory_cases", {})
+    monkeypatch.setattr(memory_agent, "case_prefilter", CasePrefilter())
+    monkeypatch.setattr(memory_agent, "encode_texts", fake_encode)
+    monkeypatch.setattr(memory_agent, "MEMORY_APPEND_PATH", str(tmp_path / "cases.jsonl"))
+    monkeypatch.setattr(memory_agent, "_store_offset", 0)
+    monkeypatch.setattr(memory_agent, "_vector_offset", 0)
+    monkeypatch.setattr(memory_agent, "_case_offsets", {})
+    monkeypatch.setattr(memory_agent, "_ann_unavailable", False)
+    return memory_agent
+
+def offense(offense_id, description="Port scan", ip="10.0.0.1"):
+    return {"offense_id": offense_id, "description": description, "source_ips": [ip],
+            "destination_ips": ["192.168.1.5"], "log_sources": ["FW"]}
+
+def stored_lines(memory):
+    with open(memory.MEMORY_APPEND_PATH) as f:
+        return [json.loads(line) for line in f]
+
+def test_add_case_writes_store_and_index(memory):
+    entry = memory.add_case(offense(1), "escalate", ["Recon"])
+
+    assert stored_lines(memory) == [entry]
+    assert len(memory.memory_index) == 1
+    assert memory.memory_cases["offense-1"]["tags"] == ["Recon"]
+    hits = memory.search_similar_cases(offense(1), top_k=3)
+    assert [hit["offense_id"] for hit in hits] == ["1"]
+
+def test_refired_offense_replaces_its_case(memory):
+    memory.add_case(offense(1), "false_positive")
+    memory.add_case(offense(1), "escalate", ["Data Exfiltration"])
+    memory.add_case(offense(1, "Port scan, again", ip="10.9.9.9"), "escalate", ["Data Exfiltration"])
+
+    assert len(stored_lines(memory)) == 3
+    assert len(memory.memory_index) == 1
+    assert memory.memory_cases["offense-1"]["description"] == "Port scan, again"
+    # The replaced case is no longer found under its old IP
+    assert memory.case_prefilter.match({"source_ips": ["10.0.0.1"]}) == {}
+    hits = memory.search_similar_cases(offense(1, "Port scan, again", ip="10.9.9.9"), top_k=3)
+    assert [(hit["offense_id"], hit["decision"]) for hit in hits] == [("1", "escalate")]
+
+@pytest.mark.asyncio
+async def test_remember_case_runs_off_the_loop(memory):
+    entry = await memory.remember_case(offense(7), "escalate")
+
+    assert entry["offense_id"] == "7"
+    assert "offense-7" in memory.memory_cases
+
+def test_sync_picks_up_other_processes_and_waits_for_partial_lines(memory):
+    other = json.dumps(memory.build_case(offense(2), "escalate"))
+    partial = json.dumps(memory.build_case(offense(3), "escalate"))
+    script = (f"import sys\nwith open(sys.argv[1], 'a') as f:\n"
+              f"    f.write({other!r} + '\\n' + {partial[:20]!r})\n")
+    subprocess.run([sys.executable, "-c", script, memory.MEMORY_APPEND_PATH], check=True)
+
+    assert memory.sync_from_store() == 1
+    assert set(memory.memory_cases) == {"offense-2"}
+
+    with open(memory.MEMORY_APPEND_PATH, "a") as f:
+        f.write(partial[20:] + "\n")
+    assert memory.sync_from_store() == 1
+    assert set(memory.memory_cases) == {"offense-2", "offense-3"}
+
+def test_crash_between_store_and_index_is_recovered(memory, monkeypatch):
+    # The line reached the store but indexing failed (or the process died)
+    memory._append_to_store(memory.build_case(offense(4), "escalate"))
+
+    def broken(texts):
+        raise RuntimeError("model crashed")
+
+    monkeypatch.setattr(memory_agent, "encode_texts", broken)
+    with pytest.raises(RuntimeError):
+        memory.sync_from_store()
+    assert memory._store_offset == 0
+
+    monkeypatch.setattr(memory_agent, "encode_texts", fake_encode)
+    assert memory.sync_from_store() == 1
+    assert len(memory.memory_index) == 1
+
+def test_searches_during_adds_see_whole_cases(memory):
+    memory.add_case(offense(0), "escalate")
+    errors, stop = [], threading.Event()
+
+    def search():
+        while not stop.is_set():
+            try:
+                for hit in memory.search_similar_cases(offense(0), top_k=5):
+                    assert hit["offense_id"] and hit["description"]
+            except Exception as e:
+                errors.append(e)
+                return
+
+    threads = [threading.Thread(target=search) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for i in range(1, 60):
+        memory.add_case(offense(i % 20, f"Port scan {i}", ip=f"10.0.{i}.1"), "escalate")
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(memory.memory_index) == len(memory.memory_cases) == 20
+
+def restart(memory, monkeypatch):
+    """Forget everything in memory, as a new process would."""
+    monkeypatch.setattr(memory_agent, "memory_index", BruteForceIndex())
+    monkeypatch.setattr(memory_agent, "memory_cases", {})
+    monkeypatch.setattr(memory_agent, "case_prefilter", CasePrefilter())
+    monkeypatch.setattr(memory_agent, "_store_offset", 0)
+    monkeypatch.setattr(memory_agent, "_vector_offset", 0)
+    monkeypatch.setattr(memory_agent, "_case_offsets", {})
+
+def test_restart_reuses_saved_vectors(memory, monkeypatch):
+    for i in range(5):
+        memory.add_case(offense(i, f"Port scan {i}"), "escalate")
+    memory.add_case(offense(2, "Port scan 2, again"), "escalate")
+    before = memory.search_similar_cases(offense(3, "Port scan 3"), top_k=2)
+
+    restart(memory, monkeypatch)
+    encoded = []
+    monkeypatch.setattr(memory_agent, "encode_texts", lambda texts: encoded.append(texts) or fake_encode(texts))
+
+    memory.sync_from_store()
+
+    assert encoded == []
+    assert len(memory.memory_index) == 5
+    assert memory.memory_cases["offense-2"]["description"] == "Port scan 2, again"
+    assert memory.search_similar_cases(offense(3, "Port scan 3"), top_k=2) == before
+
+def test_store_without_vectors_is_embedded_once(memory, monkeypatch):
+    # Lines written before vectors were saved (or whose vector was lost)
+    for i in range(3):
+        memory._append_to_store(memory.build_case(offense(i, f"Port scan {i}"), "escalate"))
+    assert memory.sync_from_store() == 3
+
+    restart(memory, monkeypatch)
+    encoded = []
+    monkeypatch.setattr(memory_agent, "encode_texts", lambda texts: encoded.append(texts) or fake_encode(texts))
+    memory.sync_from_store()
+
+    assert encoded == []
+    assert len(memory.memory_index) == 3
+
+def test_add_case_does_not_wait_for_a_store_sync(memory):
+    memory.ensure_index()
+    with memory._store_lock:
+        done = threading.Event()
+        thread = threading.Thread(target=lambda: (memory.add_case(offense(1), "escalate"), done.set()))
+        thread.start()
+        assert done.wait(timeout=2)
+    thread.join()
+    assert "offense-1" in memory.memory_cases
+
+def test_an_older_line_never_replaces_a_newer_case(memory):
+    memory.add_case(offense(1, "first"), "false_positive")
+    memory.add_case(offense(1, "second"), "escalate")
+
+    # A sync that reads both lines applies them in store order
+    memory.sync_from_store()
+    memory.index_cases([memory.build_case(offense(1, "first"), "false_positive")], offsets=[0])
+
+    assert memory.memory_cases["offense-1"]["description"] == "second"
+
+class FakeAnnIndex(BruteForceIndex):
+    name = "chroma"
+
+def test_auto_backend_counts_the_store(memory, monkeypatch, tmp_path):
+    for i in range(10):
+        memory._append_to_store(memory.build_case(offense(i), "escalate"))
+    sizes = []
+
+    def create(backend="auto", corpus_size=0, collection=""):
+        sizes.append(corpus_size)
+        return BruteForceIndex()
+
+    monkeypatch.setattr(memory_agent, "create_index", create)
+    monkeypatch.setattr(memory_agent, "EMBEDDING_CACHE_DIR", str(tmp_path / "embeddings"))
+    monkeypatch.setattr(memory_agent, "memory_index", None)
+    memory.ensure_index()
+
+    assert sizes == [len(memory.memory_data) + 10]
+
+def test_index_moves_to_ann_backend_when_threshold_is_crossed(memory, monkeypatch):
+    created = []
+
+    def create(backend="auto", corpus_size=0, collection=""):
+        created.append(backend)
+        return FakeAnnIndex()
+
+    monkeypatch.setattr(memory_agent, "create_index", create)
+    monkeypatch.setattr(memory_agent, "MEMORY_INDEX_BACKEND", "auto")
+    monkeypatch.setattr(memory_agent, "MEMORY_ANN_THRESHOLD", 5)
+    for i in range(4):
+        memory.add_case(offense(i, f"Port scan {i}"), "escalate")
+    assert memory.memory_index.name == "bruteforce"
+    before = memory.search_similar_cases(offense(2, "Port scan 2"), top_k=3)
+
+    memory.add_case(offense(4, "Port scan 4"), "escalate")
+
+    assert created == ["chroma"]
+    assert memory.memory_index.name == "chroma" and len(memory.memory_index) == 5
+    assert memory.search_similar_cases(offense(2, "Port scan 2"), top_k=3) == before
+    memory.add_case(offense(5, "Port scan 5"), "escalate")
+    assert len(memory.memory_index) == 6 and created == ["chroma"]
+
+def test_missing_ann_backend_is_not_retried(memory, monkeypatch):
+    created = []
+    monkeypatch.setattr(memory_agent, "create_index", lambda backend, **kwargs: created.append(backend) or BruteForceIndex())
+    monkeypatch.setattr(memory_agent, "MEMORY_INDEX_BACKEND", "auto")
+    monkeypatch.setattr(memory_agent, "MEMORY_ANN_THRESHOLD", 2)
+    for i in range(4):
+        memory.add_case(offense(i), "escalate")
+
+    assert created == ["chroma"]
+    assert memory.memory_index.name == "bruteforce" and len(memory.memory_index) == 4
@@ -0,0 +1,41 @@
+# tests/test_metrics.py
+
+import pytest
+from app.agents.pipeline import Stage, run_stages
+from app.utils import metrics
+
+def test_counter_and_histogram_text_format():
+    counter = metrics.Counter("test_calls_total", "Calls.", ("site",))
+    counter.inc(site='a "quoted" site')
+    counter.inc(2, site="b")
+    histogram = metrics.Histogram("test_latency_seconds", "Latency.", ("site",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, site="b")
+    histogram.observe(0.5, site="b")
+    histogram.observe(5, site="b")
+
+    text = metrics.render()
+    assert "# TYPE test_calls_total counter" in text
+    assert 'test_calls_total{site="a \\"quoted\\" site"} 1' in text
+    assert 'test_calls_total{site="b"} 2' in text
+    assert 'test_latency_seconds_bucket{site="b",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{site="b",le="1.0"} 2' in text
+    assert 'test_latency_seconds_bucket{site="b",le="+Inf"} 3' in text
+    assert 'test_latency_seconds_count{site="b"} 3' in text
+
+def test_collectors_are_rendered():
+    metrics.register_collector(lambda: [("test_ratio", "gauge", "Ratio.", [({"cache": "x"}, 0.5)])])
+    assert 'test_ratio{cache="x"} 0.5' in metrics.render()
+
+@pytest.mark.asyncio
+async def test_run_stages_records_stage_metrics():
+    async def ok():
+        return 1
+
+    async def boom(metrics_ok):
+        raise RuntimeError("fail")
+
+    before = metrics.STAGE_SECONDS.count(stage="metrics_ok")
+    with pytest.raises(RuntimeError):
+        await run_stages([Stage("metrics_ok", ok), Stage("metrics_boom", boom, inputs=("metrics_ok",))])
+    assert metrics.STAGE_SECONDS.count(stage="metrics_ok") == before + 1
+    assert metrics.STAGE_ERRORS.value(stage="metrics_boom") == 1
@@ -0,0 +1,79 @@
+# tests/test_output_writer.py
+
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from app.utils.output_writer import OutputWriter
+
+def _append_notes(path, worker, count):
+    writer = OutputWriter(fsync="never", batch_wait_ms=1)
+    for i in range(count):
+        writer.append(path, f"worker {worker} note {i} " + "x" * 200 + "\n")
+    writer.close()
+
+def test_write_file_is_atomic_and_last_write_wins(tmp_path):
+    writer = OutputWriter(fsync="always", batch_wait_ms=50)
+    path = str(tmp_path / "reports" / "offense_1.txt")
+
+    first = writer.write_file(path, "draft")
+    second = writer.write_file(path, "final report")
+    assert second.result(timeout=5) == path
+    first.result(timeout=5)
+    writer.close()
+
+    assert open(path).read() == "final report"
+    assert os.listdir(tmp_path / "reports") == ["offense_1.txt"]
+
+def test_appends_from_many_threads_are_batched_and_intact(tmp_path):
+    writer = OutputWriter(fsync="batch", batch_wait_ms=20)
+    path = str(tmp_path / "notes.txt")
+
+    with ThreadPoolExecutor(8) as pool:
+        futures = list(pool.map(lambda i: writer.append(path, f"note {i}\n"), range(200)))
+    for future in futures:
+        future.result(timeout=5)
+    writer.close()
+
+    lines = open(path).read().splitlines()
+    assert sorted(lines) == sorted(f"note {i}" for i in range(200))
+    assert writer.stats["records"] == 200
+    assert writer.stats["batches"] < 200
+
+def test_rotates_notes_by_size(tmp_path):
+    writer = OutputWriter(fsync="never", batch_max=1, rotate_bytes=100)
+    path = str(tmp_path / "notes.txt")
+
+    for i in range(5):
+        writer.append(path, f"{i}" * 40 + "\n").result(timeout=5)
+    writer.close()
+
+    rotated = [name for name in os.listdir(tmp_path) if name.startswith("notes.2") and name.endswith(".txt")]
+    assert writer.stats["rotations"] == len(rotated) >= 2
+    contents = "".join(open(tmp_path / name).read() for name in rotated + ["notes.txt"])
+    assert sorted(contents.splitlines()) == [f"{i}" * 40 for i in range(5)]
+
+def test_write_errors_fail_the_future(tmp_path):
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("")
+    writer = OutputWriter(fsync="never")
+
+    future = writer.write_file(str(blocker / "offense_1.txt"), "report")
+    with pytest.raises(OSError):
+        future.result(timeout=5)
+    assert writer.flush(timeout=5)
+    writer.close()
+    assert writer.stats["errors"] == 1
+
+def test_appends_from_several_processes_do_not_interleave(tmp_path):
+    path = str(tmp_path / "notes.txt")
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=_append_notes, args=(path, w, 100)) for w in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+
+    lines = open(path).read().splitlines()
+    assert len(lines) == 300
+    assert all(line.endswith("x" * 200) and line.startswith("worker ") for line in lines)
@@ -0,0 +1,75 @@
+# tests/test_pipeline.py
+
+import asyncio
+import time
+import pytest
+from app.agents.pipeline import Stage, run_stages
+
+@pytest.mark.asyncio
+async def test_independent_stages_follow_critical_path():
+    async def slow(value):
+        await asyncio.sleep(0.2)
+        return value
+
+    async def a():
+        return await slow("a")
+
+    async def b():
+        return await slow("b")
+
+    async def c(a):
+        return await slow(a + "c")
+
+    async def d(b, c):
+        return b + c
+
+    start = time.perf_counter()
+    results = await run_stages([
+        Stage("d", d, inputs=("b", "c")),
+        Stage("c", c, inputs=("a",)),
+        Stage("a", a),
+        Stage("b", b),
+    ])
+    elapsed = time.perf_counter() - start
+
+    # Critical path is a -> c -> d (0.4s); the sequential sum would be 0.6s
+    assert results["d"] == "bac"
+    assert elapsed < 0.55
+    assert set(results["_timings"]) == {"a", "b", "c", "d"}
+
+@pytest.mark.asyncio
+async def test_context_inputs_and_validation():
+    async def double(x):
+        return x * 2
+
+    results = await run_stages([Stage("y", double, inputs=("x",))], context={"x": 21})
+    assert results["y"] == 42
+
+    with pytest.raises(ValueError):
+        await run_stages([Stage("y", double, inputs=("missing",))])
+
+    async def loop(other):
+        return other
+
+    with pytest.raises(ValueError):
+        await run_stages([Stage("p", loop, inputs=("q",)), Stage("q", loop, inputs=("p",))])
+
+@pytest.mark.asyncio
+async def test_when_skips_stage_after_inputs_are_ready():
+    calls = []
+
+    async def decide():
+        return "false_positive"
+
+    async def expensive(decision):
+        calls.append(decision)
+        return "report"
+
+    results = await run_stages([
+        Stage("decision", decide),
+        Stage("report", expensive, inputs=("decision",), when=lambda r: r["decision"] == "escalate"),
+    ])
+
+    assert results["report"] is None
+    assert results["_skipped"] == ["report"]
+    assert calls == []
@@ -0,0 +1,53 @@
+# tests/test_prompt_cache.py
+
+import pytest
+from app.agents import model_router
+from app.utils import prompt_cache
+from app.utils.prompt_cache import PromptCache, make_key
+
+def test_key_normalizes_whitespace_but_not_params():
+    params = {"temperature": 0.5}
+    assert make_key("openai", "gpt-4o-mini", params, "Offense:\n  Brute  Force ") == \
+        make_key("openai", "gpt-4o-mini", params, "Offense: Brute Force")
+    assert make_key("openai", "gpt-4o-mini", params, "x") != make_key("openai", "gpt-4o-mini", {"temperature": 0.9}, "x")
+    assert make_key("openai", "gpt-4o-mini", params, "x") != make_key("gemini", "gpt-4o-mini", params, "x")
+
+def test_router_key_changes_with_the_system_prompt(monkeypatch):
+    from app.agents import openai_agent
+
+    before = model_router.prompt_cache_key("openai", "Offense: Brute Force")
+    monkeypatch.setattr(openai_agent, "SYSTEM_PROMPT", "You are a senior threat hunter.")
+
+    assert model_router.prompt_cache_key("openai", "Offense: Brute Force") != before
+
+def test_errors_are_never_cached(tmp_path):
+    cache = PromptCache(path=str(tmp_path / "prompts.db"))
+    cache.put("k", "Error: OpenAI rate limit exceeded")
+    assert cache.get("k") is None
+    cache.put("k", "A real summary")
+    assert cache.get("k") == "A real summary"
+
+def test_ttl_and_disk_persistence(tmp_path):
+    path = str(tmp_path / "prompts.db")
+    PromptCache(path=path).put("k", "cached")
+    assert PromptCache(path=path).get("k") == "cached"
+
+    expired = PromptCache(path=str(tmp_path / "expired.db"), ttl=-1)
+    expired.put("k", "stale")
+    assert expired.get("k") is None
+
+@pytest.mark.asyncio
+async def test_router_cache_is_opt_in(tmp_path, monkeypatch):
+    monkeypatch.setattr(prompt_cache, "_cache", PromptCache(path=str(tmp_path / "prompts.db")))
+    calls = []
+
+    async def fake_try_provider(provider, prompt):
+        calls.append(provider)
+        return f"answer {len(calls)}"
+
+    monkeypatch.setattr(model_router, "try_provider", fake_try_provider)
+
+    assert await model_router.generate_dynamic_prompt("same prompt", cache=True) == "answer 1"
+    assert await model_router.generate_dynamic_prompt("same  prompt\n", cache=True) == "answer 1"
+    assert await model_router.generate_dynamic_prompt("same prompt") == "answer 2"
+    assert len(calls) == 2
@@ -0,0 +1,55 @@
+# tests/test_rate_limiter.py
+
+import time
+import pytest
+from app.utils.rate_limiter import MemoryBackend, RateLimiter, SQLiteBackend
+
+@pytest.mark.asyncio
+async def test_requests_are_spaced_to_the_rpm_budget():
+    # 600 RPM with no burst means one request every 0.1s
+    limiter = RateLimiter(MemoryBackend(), {"gemini": {"rpm": 600, "tpm": 0, "request_burst": 1}})
+    start = time.perf_counter()
+    for _ in range(4):
+        await limiter.acquire("gemini", "gemini-1.5-flash", "key")
+    elapsed = time.perf_counter() - start
+
+    assert 0.25 < elapsed < 0.6
+    assert limiter.get_stats()["gemini:gemini-1.5-flash"]["acquired"] == 4
+
+@pytest.mark.asyncio
+async def test_token_budget_is_separate_from_requests():
+    limiter = RateLimiter(MemoryBackend(), {"openai": {"rpm": 0, "tpm": 6000, "request_burst": 1}})
+    assert await limiter.acquire("openai", "gpt-4o-mini", tokens=6000) < 0.05
+    # Bucket is empty; 50 tokens refill at 100 tokens/s
+    assert await limiter.acquire("openai", "gpt-4o-mini", tokens=50) > 0.3
+
+@pytest.mark.asyncio
+async def test_unlimited_provider_does_not_wait():
+    limiter = RateLimiter(MemoryBackend(), {"openai": {"rpm": 0, "tpm": 0}})
+    assert await limiter.acquire("openai", "gpt-4o-mini", tokens=10**6) == 0
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "limits.db")
+    budgets = {"requests": (1.0, 1 / 60.0)}
+    first, second = SQLiteBackend(path), SQLiteBackend(path)
+
+    assert first.take("gemini:m:k", budgets, {"requests": 1}) == 0
+    # The second "process" sees the bucket the first one drained
+    assert second.take("gemini:m:k", budgets, {"requests": 1}) > 50
+    assert second.take("gemini:m:other", budgets, {"requests": 1}) == 0
+
+@pytest.mark.asyncio
+async def test_unconfigured_provider_fails_without_taking_budget(monkeypatch):
+    from app.agents import model_router
+    from app.utils import rate_limiter
+
+    limiter = RateLimiter(MemoryBackend(), {"gemini": {"rpm": 15, "tpm": 0, "request_burst": 1}})
+    monkeypatch.setattr(rate_limiter, "_limiter", limiter)
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+
+    start = time.perf_counter()
+    responses = [await model_router.call_provider("gemini", "hello") for _ in range(3)]
+
+    assert time.perf_counter() - start < 0.5
+    assert responses == ["Error: GEMINI_API_KEY not found in environment variables"] * 3
+    assert limiter.get_stats().get("gemini:gemini-1.5-flash", {}).get("acquired", 0) == 0
@@ -0,0 +1,73 @@
+# tests/test_reputation.py
+
+import asyncio
+import time
+import pytest
+from app.utils import reputation
+
+@pytest.mark.asyncio
+async def test_reputation_fan_out_is_concurrent(monkeypatch):
+    async def slow_abuseipdb(ip):
+        await asyncio.sleep(0.2)
+        return {"ip": ip, "abuse_confidence": 80, "reports": 3}
+
+    async def slow_virustotal(ioc):
+        await asyncio.sleep(0.2)
+        return {"ioc": ioc, "malicious_votes": 2, "suspicious_votes": 0}
+
+    monkeypatch.setattr(reputation, "check_ip_abuseipdb", slow_abuseipdb)
+    monkeypatch.setattr(reputation, "check_virustotal", slow_virustotal)
+
+    ips = [f"10.0.0.{i}" for i in range(10)]
+    start = time.perf_counter()
+    results = await reputation.get_reputations(ips)
+    elapsed = time.perf_counter() - start
+
+    # 10 IPs x 2 providers at 0.2s each would take 4s sequentially
+    assert elapsed < 1.0
+    assert [r["ioc"] for r in results] == ips
+    assert all(r["abuseipdb"]["abuse_confidence"] == 80 for r in results)
+
+@pytest.mark.asyncio
+async def test_reputation_deadline_keeps_finished_providers(monkeypatch):
+    async def hanging_abuseipdb(ip):
+        await asyncio.sleep(10)
+
+    async def fast_virustotal(ioc):
+        return {"ioc": ioc, "malicious_votes": 7, "suspicious_votes": 1}
+
+    monkeypatch.setattr(reputation, "check_ip_abuseipdb", hanging_abuseipdb)
+    monkeypatch.setattr(reputation, "check_virustotal", fast_virustotal)
+
+    start = time.perf_counter()
+    results = await reputation.get_reputations(["1.1.1.1", "1.1.1.1"], deadline=0.1)
+
+    assert time.perf_counter() - start < 1.0
+    expected = dict(reputation.empty_reputation("1.1.1.1"),
+                    virustotal={"ioc": "1.1.1.1", "malicious_votes": 7, "suspicious_votes": 1})
+    assert results == [expected] * 2
+
+@pytest.mark.asyncio
+async def test_reputation_deadline_with_no_answers_returns_placeholders(monkeypatch):
+    async def hanging(ioc):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(reputation, "check_ip_abuseipdb", hanging)
+    monkeypatch.setattr(reputation, "check_virustotal", hanging)
+
+    results = await reputation.get_reputations(["1.1.1.1"], deadline=0.05)
+
+    assert results == [reputation.empty_reputation("1.1.1.1")]
+
+def test_clients_of_closed_loops_are_closed():
+    async def client():
+        return reputation._get_client()[0]
+
+    first = asyncio.run(client())
+    second = asyncio.run(client())
+
+    assert second is not first
+    assert first.is_closed
+    assert list(reputation._clients.values())[0][0] is second
+    asyncio.run(reputation.close_client())
+    assert second.is_closed and reputation._clients == {}
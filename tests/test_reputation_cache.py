@@ -0,0 +1,45 @@
+# tests/test_reputation_cache.py
+
+import httpx
+import pytest
+from app.utils import reputation_cache
+from app.utils.reputation_cache import ReputationCache
+
+def test_disk_tier_survives_new_instance(tmp_path):
+    path = str(tmp_path / "rep.db")
+    cache = ReputationCache(path=path)
+    cache.put("abuseipdb", "1.2.3.4", {"ip": "1.2.3.4", "abuse_confidence": 90})
+    cache.close()
+
+    # A fresh instance (restart / other worker) starts with an empty LRU
+    fresh = ReputationCache(path=path)
+    assert fresh.get("abuseipdb", "1.2.3.4") == (True, False, {"ip": "1.2.3.4", "abuse_confidence": 90})
+    assert fresh.get("abuseipdb", "1.2.3.4")[0] is True
+    stats = fresh.get_stats()
+    assert stats["disk_hits"] == 1
+    assert stats["memory_hits"] == 1
+    assert fresh.get("virustotal", "1.2.3.4") == (False, False, None)
+    assert fresh.get_stats()["misses"] == 1
+
+def test_lru_eviction(tmp_path):
+    cache = ReputationCache(path=str(tmp_path / "rep.db"), memory_size=2)
+    for ip in ["1.1.1.1", "2.2.2.2", "3.3.3.3"]:
+        cache.put("virustotal", ip, {"ioc": ip})
+    assert cache.get_stats()["memory_entries"] == 2
+
+@pytest.mark.asyncio
+async def test_cached_lookup_caches_errors_negatively(tmp_path, monkeypatch):
+    monkeypatch.setattr(reputation_cache, "_cache", ReputationCache(path=str(tmp_path / "rep.db")))
+    calls = []
+
+    async def failing_fetch():
+        calls.append(1)
+        raise httpx.ConnectError("down")
+
+    fallback = {"ioc": "5.5.5.5", "malicious_votes": 0}
+    for _ in range(3):
+        result = await reputation_cache.cached_lookup("virustotal", "5.5.5.5", failing_fetch, fallback, (httpx.HTTPError,))
+        assert result == fallback
+
+    assert len(calls) == 1
+    assert reputation_cache.get_cache().get_stats()["negative_hits"] == 2
@@ -0,0 +1,86 @@
+# tests/test_result_store.py
+
+import pytest
+from app.utils.result_store import ResultStore, parse_time
+
+def analysis(offense_id, decision="false_positive", level="LOW", ips=("10.0.0.1",), log_sources=("VPN",)):
+    return {
+        "offense_id": offense_id,
+        "description": f"Offense {offense_id}",
+        "magnitude": 5,
+        "source_ips": list(ips),
+        "log_sources": list(log_sources),
+        "decision": decision,
+        "reasoning": ["because"],
+        "risk_assessment": f"{level} (Score: 3, Factors: None detected)",
+    }
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultStore(str(tmp_path / "results.db"))
+    yield store
+    store.close()
+
+def test_save_get_and_replace(store):
+    store.save(analysis(1001), processed_at=100.0)
+    assert store.get("1001")["analysis"]["decision"] == "false_positive"
+    assert store.get("missing") is None
+
+    store.save(analysis(1001, decision="escalate", ips=("10.9.9.9",)), report="REPORT", processed_at=200.0)
+    stored = store.get("1001")
+    assert stored["analysis"]["decision"] == "escalate"
+    assert stored["report"] == "REPORT"
+    assert store.query(source_ip="10.0.0.1")["results"] == []
+    assert [r["offense_id"] for r in store.query(source_ip="10.9.9.9")["results"]] == ["1001"]
+
+def test_query_filters_combine(store):
+    store.save(analysis("a", "escalate", "HIGH", log_sources=("Firewall",)), processed_at=100.0)
+    store.save(analysis("b", "escalate", "CRITICAL", log_sources=("VPN",)), processed_at=200.0)
+    store.save(analysis("c", "false_positive", "LOW", log_sources=("Firewall",)), processed_at=300.0)
+
+    page = store.query(decision="escalate", log_source="Firewall")
+    assert [r["offense_id"] for r in page["results"]] == ["a"]
+    assert page["results"][0]["risk_level"] == "HIGH" and page["results"][0]["risk_score"] == 3
+    assert [r["offense_id"] for r in store.query(risk_level="critical")["results"]] == ["b"]
+    assert [r["offense_id"] for r in store.query(since=150, until=300)["results"]] == ["b"]
+    assert "analysis" in store.query(decision="false_positive", full=True)["results"][0]
+
+def test_cursor_pagination_walks_newest_first(store):
+    for i in range(7):
+        store.save(analysis(f"o{i}"), processed_at=1000.0 + i // 2)
+
+    seen, cursor = [], None
+    while True:
+        page = store.query(limit=3, cursor=cursor)
+        seen.extend(r["offense_id"] for r in page["results"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == ["o6", "o5", "o4", "o3", "o2", "o1", "o0"]
+    with pytest.raises(ValueError):
+        store.query(cursor="not-a-cursor")
+
+def test_parse_time_accepts_iso_and_epoch():
+    assert parse_time("1700000000") == 1700000000.0
+    assert parse_time("2023-11-14T22:13:20Z") == 1700000000.0
+    assert parse_time("2023-11-14T22:13:20") == 1700000000.0
+
+def test_duplicates_point_to_their_owner(store):
+    store.save(analysis("owner", "escalate", "HIGH"), report="REPORT", processed_at=100.0)
+    store.save(dict(analysis("owner", "escalate", "HIGH"), offense_id="dup", duplicate_of="owner"), processed_at=110.0)
+
+    stored = store.get("dup")
+    assert stored["analysis"]["offense_id"] == "dup"
+    assert stored["analysis"]["duplicate_of"] == "owner"
+    assert stored["analysis"]["reasoning"] == ["because"]
+    assert stored["report"] == "REPORT"
+    assert "duplicate_of" not in store.get("owner")["analysis"]
+
+    page = store.query(decision="escalate", source_ip="10.0.0.1", full=True)
+    assert [(r["offense_id"], r["duplicate_of"]) for r in page["results"]] == [("dup", "owner"), ("owner", None)]
+    assert page["results"][0]["analysis"]["risk_assessment"].startswith("HIGH")
+
+    # Processing the duplicate's ID for real replaces the pointer
+    store.save(analysis("dup", "false_positive"), processed_at=120.0)
+    assert "duplicate_of" not in store.get("dup")["analysis"]
@@ -0,0 +1,71 @@
+# tests/test_rule_engine.py
+
+import json
+import os
+import pytest
+from app.agents.rule_engine import RuleEngine, RuleError, TRIAGE_RULES_PATH
+
+def reputation(ioc, abuse=0, malicious=0):
+    return {"ioc": ioc, "abuseipdb": {"ip": ioc, "abuse_confidence": abuse}, "virustotal": {"ioc": ioc, "malicious_votes": malicious}}
+
+def write_rules(path, threshold):
+    with open(path, "w") as f:
+        json.dump({
+            "escalation_rules": [{"name": "abuse", "scope": "ioc", "when": ["abuse_confidence", ">", threshold],
+                                  "reason": "Abuse {abuse_confidence} for {ioc}"}],
+            "risk_rules": [],
+        }, f)
+
+def test_default_rules_read_nested_reputation_results():
+    engine = RuleEngine(TRIAGE_RULES_PATH, reload_interval=0)
+
+    result = engine.evaluate({"offense_id": "1", "magnitude": 8, "event_count": 150},
+                             [reputation("203.0.113.5", abuse=90), reputation("198.51.100.7", malicious=3)])
+
+    assert result["decision"] == "escalate"
+    assert result["reasoning"] == ["Malicious score > 1 for 198.51.100.7", "AbuseIPDB confidence > 50 for 203.0.113.5"]
+    assert result["risk_score"] == 3 + 3 + 1 + 2
+    assert result["risk_level"] == "CRITICAL"
+    assert "High magnitude (8)" in result["risk_factors"]
+    assert {"virustotal_malicious", "abuseipdb_confidence", "high_risk_ip"} <= set(result["fired_rules"])
+
+def test_batch_matches_single_evaluation():
+    engine = RuleEngine(TRIAGE_RULES_PATH, reload_interval=0)
+    items = [
+        ({"magnitude": 3}, [], []),
+        ({"magnitude": 6, "event_count": 20}, [reputation("10.0.0.1", abuse=30)], []),
+        ({"magnitude": 9}, [reputation("10.0.0.2"), reputation("10.0.0.3", malicious=9)], [{"tags": ["Data Exfiltration"]}]),
+        ({}, [reputation("10.0.0.4")], [{"tags": ["Phishing"]}]),
+    ]
+
+    batch = engine.evaluate_batch(items)
+
+    assert batch == [engine.evaluate(*item) for item in items]
+    assert [r["decision"] for r in batch] == ["false_positive", "false_positive", "escalate", "false_positive"]
+    assert [r["risk_level"] for r in batch] == ["LOW", "HIGH", "CRITICAL", "LOW"]
+    assert "Similar past cases tagged as Data Exfiltration" in batch[2]["reasoning"]
+
+def test_hot_reload_and_bad_file_keeps_previous_rules(tmp_path):
+    path = str(tmp_path / "rules.json")
+    write_rules(path, 50)
+    engine = RuleEngine(path, reload_interval=0)
+    offense = ({}, [reputation("10.0.0.9", abuse=60)], [])
+    assert engine.evaluate(*offense)["reasoning"] == ["Abuse 60 for 10.0.0.9"]
+
+    write_rules(path, 70)
+    os.utime(path, ns=(0, 10 ** 18))
+    assert engine.reload()
+    assert engine.evaluate(*offense)["decision"] == "false_positive"
+
+    with open(path, "w") as f:
+        f.write('{"escalation_rules": [{"name": "x", "when": ["no_such_feature", ">", 1]}]}')
+    assert not engine.reload(force=True)
+    assert engine.stats["reload_errors"] == 1
+    assert engine.evaluate({}, [reputation("10.0.0.9", abuse=80)], [])["decision"] == "escalate"
+
+def test_invalid_rules_are_rejected(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text('{"escalation_rules": [{"name": "x", "when": ["magnitude", "~", 1]}]}')
+
+    with pytest.raises(RuleError):
+        RuleEngine(str(path))
@@ -0,0 +1,109 @@
+# tests/test_single_flight.py
+
+import asyncio
+import pytest
+from app.agents import main_agent
+from app.agents.main_agent import offense_fingerprint
+from app.utils.result_store import ResultStore
+from app.utils.single_flight import SingleFlight
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_sharing_a_key_run_once():
+    flight = SingleFlight(ttl=0)
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"decision": "escalate"}
+
+    results = await asyncio.gather(
+        flight.do(["id:1", "content:x"], "1", work),
+        flight.do(["id:1"], "1", work),
+        flight.do(["id:2", "content:x"], "2", work),
+    )
+
+    assert len(calls) == 1
+    assert [role for role, _, _ in results] == ["leader", "joined", "joined"]
+    assert all(owner == "1" for _, owner, _ in results)
+    assert flight.get_stats()["in_flight"] == 0
+
+@pytest.mark.asyncio
+async def test_results_are_cached_for_ttl_but_failures_are_not():
+    flight = SingleFlight(ttl=60)
+    attempts = []
+
+    async def failing():
+        attempts.append(1)
+        raise RuntimeError("provider down")
+
+    with pytest.raises(RuntimeError):
+        await flight.do(["k"], "a", failing)
+    role, _, value = await flight.do(["k"], "b", lambda: asyncio.sleep(0, result="ok"))
+    assert (role, value) == ("leader", "ok")
+
+    role, owner, value = await flight.do(["k"], "c", failing)
+    assert (role, owner, value) == ("cached", "b", "ok")
+    assert len(attempts) == 1
+
+@pytest.mark.asyncio
+async def test_waiters_take_over_when_the_leader_is_cancelled():
+    flight = SingleFlight(ttl=0)
+    started = asyncio.Event()
+
+    async def hang():
+        started.set()
+        await asyncio.sleep(10)
+
+    leader = asyncio.create_task(flight.do(["k"], "a", hang))
+    await started.wait()
+    waiter = asyncio.create_task(flight.do(["k"], "b", lambda: asyncio.sleep(0, result="done")))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await waiter == ("leader", "b", "done")
+
+def test_fingerprint_ignores_order_and_offense_id():
+    offense = {
+        "offense_id": "1", "description": "Brute Force ", "source_ips": ["10.0.0.1", "10.0.0.2"],
+        "destination_ips": ["192.168.1.5"], "log_sources": ["VPN", "Proxy"],
+        "events": [{"event_type": "Login Failure"}, {"event_type": "Login Failure"}],
+    }
+    reordered = dict(offense, offense_id="2", source_ips=["10.0.0.2", "10.0.0.1"], log_sources=["Proxy", "VPN"])
+
+    assert offense_fingerprint(offense) == offense_fingerprint(reordered)
+    assert offense_fingerprint(offense) != offense_fingerprint(dict(offense, source_ips=["10.0.0.3"]))
+
+@pytest.mark.asyncio
+async def test_handle_offense_coalesces_duplicates(monkeypatch, tmp_path):
+    calls = []
+
+    async def fake_analyze(offense):
+        calls.append(offense["offense_id"])
+        await asyncio.sleep(0.05)
+        return dict(offense, decision="false_positive")
+
+    monkeypatch.setattr(main_agent, "_analyze_offense", fake_analyze)
+    monkeypatch.setattr(main_agent, "offense_flight", SingleFlight(ttl=60))
+    monkeypatch.setattr(main_agent, "OFFENSE_COALESCING", True)
+    store = ResultStore(str(tmp_path / "results.db"))
+    monkeypatch.setattr(main_agent, "RESULT_STORE_ENABLED", True)
+    monkeypatch.setattr(main_agent, "get_result_store", lambda: store)
+    offense = {"offense_id": "501", "description": "Port scan", "source_ips": ["10.1.1.1"]}
+
+    first, same_id, same_content = await asyncio.gather(
+        main_agent.handle_offense(dict(offense)),
+        main_agent.handle_offense(dict(offense)),
+        main_agent.handle_offense(dict(offense, offense_id="502")),
+    )
+    repeat = await main_agent.handle_offense(dict(offense))
+
+    assert calls == ["501"]
+    assert first["offense_id"] == same_id["offense_id"] == repeat["offense_id"] == "501"
+    assert same_content["offense_id"] == "502" and same_content["duplicate_of"] == "501"
+    assert "duplicate_of" not in first
+    same_id["decision"] = "escalate"
+    assert first["decision"] == "false_positive"
+    # The duplicate is findable under its own ID (fake_analyze never saved the owner)
+    store.save(first)
+    assert store.get("502")["analysis"]["duplicate_of"] == "501"
@@ -0,0 +1,78 @@
+# tests/test_stage_policy.py
+
+import pytest
+from app.agents import main_agent
+from app.agents.main_agent import build_offense_stages, parse_stage_policy
+from app.agents.pipeline import run_stages
+
+def test_parse_stage_policy_overrides_defaults_and_ignores_invalid():
+    policy = parse_stage_policy("summary=always, log_instructions=never,unknown=always,offense_type=sometimes")
+
+    assert policy["summary"] == "always"
+    assert policy["log_instructions"] == "never"
+    assert policy["offense_type"] == "escalate"
+    assert "unknown" not in policy
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("abuse_confidence,expected_llm_sites", [
+    (0, ["decision_justification"]),
+    (90, ["offense_type", "summary", "log_instructions"]),
+])
+async def test_generation_runs_only_for_the_decision_that_needs_it(pipeline_stubs, abuse_confidence, expected_llm_sites):
+    pipeline_stubs.abuse_confidence = abuse_confidence
+
+    offense = {"offense_id": "7", "description": "Port scan", "source_ips": ["203.0.113.9"]}
+    results = await run_stages(build_offense_stages(offense, parse_stage_policy("")))
+
+    assert sorted(pipeline_stubs.sites) == sorted(expected_llm_sites)
+    assert results["decision"]["decision"] == ("escalate" if abuse_confidence else "false_positive")
+
+@pytest.mark.asyncio
+async def test_always_policy_restores_full_generation(pipeline_stubs):
+    policy = parse_stage_policy("offense_type=always,summary=always,log_instructions=always,decision_justification=always")
+    results = await run_stages(build_offense_stages({"offense_id": "8", "description": "x"}, policy))
+
+    assert len(pipeline_stubs.sites) == 4
+    assert results["_skipped"] == []
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("summary_error, instructions, expected_error", [
+    (None, "• Check firewall logs", None),
+    (RuntimeError("provider down"), "• Check firewall logs", "summary: Error: provider down"),
+    (None, main_agent.FALLBACK_HEADER + "\n• Check firewall logs", "log_instructions: AI generation failed"),
+])
+async def test_enrichment_status_follows_generation_results(pipeline_stubs, summary_error, instructions, expected_error):
+    if summary_error:
+        pipeline_stubs.responses["summary"] = summary_error
+    pipeline_stubs.responses["log_instructions"] = instructions
+
+    analysis = await main_agent._analyze_offense({"offense_id": "9", "description": "x", "source_ips": ["203.0.113.9"]})
+
+    assert analysis["decision"] == "escalate"
+    if expected_error is None:
+        assert analysis["enrichment_status"] == "success"
+        assert "enrichment_error" not in analysis
+    else:
+        assert analysis["enrichment_status"] == "failed"
+        assert analysis["enrichment_error"].startswith(expected_error)
+
+@pytest.mark.asyncio
+async def test_risk_and_decision_share_one_rule_evaluation(pipeline_stubs, monkeypatch):
+    from app.agents.rule_engine import get_engine
+
+    calls = []
+
+    class CountingEngine:
+        def evaluate(self, *args):
+            calls.append(args)
+            return get_engine().evaluate(*args)
+
+    monkeypatch.setattr(main_agent, "get_engine", CountingEngine)
+
+    offense = {"offense_id": "10", "description": "Port scan", "source_ips": ["203.0.113.9"], "magnitude": 8}
+    results = await run_stages(build_offense_stages(offense, parse_stage_policy(
+        "offense_type=never,summary=never,log_instructions=never,decision_justification=never")))
+
+    assert len(calls) == 1
+    assert results["decision"]["decision"] == "escalate"
+    assert results["risk_assessment"].startswith(results["triage"]["risk_level"])